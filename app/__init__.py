@@ -1,6 +1,14 @@
 from flask import Flask
+from flask.logging import default_handler
 from .utils.extensions import db, csrf, login_manager
+from .utils.functions.cache import annotator_context_cache, annotator_page_cache, researcher_cache
+from .utils.functions.codec import FastJSONProvider
+from .utils.functions.compression import asset_url, compress_response, load_asset_manifest
+from .utils.functions.logs import start_log_listener
+from .utils.functions.schema import add_missing_columns, add_missing_indexes
 from .views import *
+from .commands import (benchmark_json_command, build_static_command,
+                       expire_uploads_command, provision_sessions_command)
 from .config import DefaultConfig
 import logging, os
 import logging.handlers
@@ -10,7 +18,10 @@ def create_app(config=None):
     app = Flask(__name__, instance_relative_config=True)
     configure_app(app, config)
     configure_blueprints(app)
+    configure_commands(app)
     configure_extensions(app)
+    configure_caches(app)
+    configure_assets(app)
     configure_logging(app)
     configure_error_handlers(app)
     configure_db(app)
@@ -18,6 +29,7 @@ def create_app(config=None):
     return app
 
 def configure_app(app, config=None):
+    app.json = FastJSONProvider(app)
     app.config.from_object(DefaultConfig)
     
     app.config.from_pyfile('private.py', silent=True)
@@ -25,6 +37,13 @@ def configure_app(app, config=None):
     if config:
         app.config.from_object(config)
         
+def configure_commands(app):
+
+    app.cli.add_command(provision_sessions_command)
+    app.cli.add_command(benchmark_json_command)
+    app.cli.add_command(build_static_command)
+    app.cli.add_command(expire_uploads_command)
+    
 def configure_extensions(app):
     
     csrf.init_app(app)
@@ -33,6 +52,18 @@ def configure_extensions(app):
     
     login_manager.init_app(app)
     
+def configure_caches(app):
+
+    annotator_context_cache.configure(app.config['ANNOTATOR_CACHE_SIZE'], app.config['ANNOTATOR_CACHE_TTL'])
+    annotator_page_cache.configure(app.config['ANNOTATOR_CACHE_SIZE'], app.config['ANNOTATOR_CACHE_TTL'])
+    researcher_cache.configure(app.config['RESEARCHER_CACHE_SIZE'], app.config['RESEARCHER_CACHE_TTL'])
+    
+def configure_assets(app):
+
+    app.extensions['asset_manifest'] = load_asset_manifest(app.config['STATIC_BUILD_FOLDER_PATH'])
+    app.add_template_global(asset_url)
+    app.after_request(compress_response)
+    
 def configure_blueprints(app):
 
     app.register_blueprint(core)
@@ -41,6 +72,7 @@ def configure_blueprints(app):
     app.register_blueprint(projects, url_prefix='/admin')
     app.register_blueprint(presets, url_prefix='/admin')
     app.register_blueprint(sessions, url_prefix='/admin')
+    app.register_blueprint(library, url_prefix='/admin')
     app.register_blueprint(participant)
     app.register_blueprint(api, url_prefix='/api')
         
@@ -48,19 +80,24 @@ def configure_logging(app):
     if app.debug or app.testing:
         return
     
-    app.logger.setLevel(logging.INFO)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
 
     if not os.path.exists(app.config['LOGS_FOLDER_PATH']):
-        app.logger.debug(f"{app.config['LOGS_FOLDER_PATH']} does not exist. Creating directory.")
+        app.logger.debug("%s does not exist. Creating directory.", app.config['LOGS_FOLDER_PATH'])
         os.makedirs(app.config['LOGS_FOLDER_PATH'])
     info_log = os.path.join(app.config['LOGS_FOLDER_PATH'], 'info.log')
-    info_file_handler = logging.handlers.RotatingFileHandler(info_log, maxBytes=100000, backupCount=10)
+    info_file_handler = logging.handlers.RotatingFileHandler(info_log, maxBytes=app.config['LOG_MAX_BYTES'], backupCount=app.config['LOG_BACKUP_COUNT'], encoding='utf-8', delay=True)
     info_file_handler.setLevel(logging.INFO)
     info_file_handler.setFormatter(logging.Formatter(
         '%(asctime)s %(levelname)s: %(message)s '
         '[in %(pathname)s:%(lineno)d]')
     )
-    app.logger.addHandler(info_file_handler)
+
+    handlers = [info_file_handler]
+    if default_handler in app.logger.handlers:
+        app.logger.removeHandler(default_handler)
+        handlers.append(default_handler)
+    app.logger.addHandler(start_log_listener(*handlers))
 
     
 def configure_error_handlers(app):
@@ -71,4 +108,6 @@ def configure_error_handlers(app):
     
 def configure_db(app):
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        db.create_all()
+        add_missing_columns(db.engine, db.metadata)
+        add_missing_indexes(db.engine, db.metadata)
\ No newline at end of file
@@ -0,0 +1,131 @@
+import json
+import time
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from .models import Project
+from .utils.functions import codec
+from .utils.functions.compression import build_static_assets
+from .utils.functions.provision import (join_links_to_csv, parse_roster,
+                                        provision_sessions)
+from .utils.functions.upload import expire_uploads
+
+
+@click.command('provision-sessions')
+@click.argument('project_id', type=int)
+@click.argument('roster', type=click.File('r', encoding='utf-8-sig'))
+@click.option('--video', 'videos', multiple=True, help='Library video (ID, token or name) assigned to decoupled sessions whose rows list none. May be repeated.')
+@click.option('--output', type=click.File('w'), default='-', help='Where to write the CSV of join links. Defaults to stdout.')
+@click.option('--base-url', default='http://localhost:5000', show_default=True, help='Scheme and host to prefix each join link with.')
+@click.option('--batch-size', default=500, show_default=True, help='Number of sessions created per transaction.')
+@with_appcontext
+def provision_sessions_command(project_id, roster, videos, output, base_url, batch_size):
+    """
+    Provision sessions and participants for PROJECT_ID from a ROSTER CSV, using videos from the project
+    researcher's library, and write out their join links.
+    """
+    project = Project.query.get(project_id)
+    if not project:
+        raise click.ClickException(f"Project {project_id} does not exist.")
+
+    start = time.perf_counter()
+    try:
+        with current_app.test_request_context(base_url=base_url):
+            results = provision_sessions(project, parse_roster(roster), list(videos), batch_size)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    elapsed = time.perf_counter() - start
+
+    output.write(join_links_to_csv(results, base_url))
+    click.echo(f"Provisioned {len(results)} participants in {elapsed:.2f}s ({len(results) / max(elapsed, 1e-9):.0f} participants/s).", err=True)
+
+
+def build_synthetic_session(participants, videos, samples):
+    """
+    Build the submissions and the aggregate download of a synthetic session, for benchmarking.
+    """
+    submissions = []
+    for participant_id in range(participants):
+        annotations = {}
+        for video_id in range(videos):
+            annotations[str(video_id)] = {
+                "timestamp": [i * 33 for i in range(samples)],
+                "video_frame": list(range(samples)),
+                "slider_position": [((i * 7) % 15) - 7 for i in range(samples)],
+                "trigger": ["frame"] * samples
+            }
+        submissions.append({"annotations": annotations})
+
+    session_data = {
+        'Session ID': 1,
+        'Description': 'Synthetic session',
+        'Number of Participants': participants,
+        'Participants Data': [
+            {
+                "participant_internal_id": participant_id,
+                "videos": [
+                    {
+                        "video_id": video_id,
+                        "annotations": [
+                            {"timecode": i * 33, "frame_number": i, "slider_position": ((i * 7) % 15) - 7, "trigger": "frame"}
+                            for i in range(samples)
+                        ]
+                    }
+                    for video_id in range(videos)
+                ]
+            }
+            for participant_id in range(participants)
+        ]
+    }
+    return submissions, session_data
+
+@click.command('benchmark-json')
+@click.option('--participants', default=20, show_default=True, help='Number of participants in the synthetic session.')
+@click.option('--videos', default=2, show_default=True, help='Number of videos annotated by each participant.')
+@click.option('--samples', default=18000, show_default=True, help='Number of annotations per video (18000 is ten minutes at 30 fps).')
+def benchmark_json_command(participants, videos, samples):
+    """
+    Compare the app's JSON codec with the standard library on a large synthetic session: parsing every
+    participant's submission, and serializing the session's aggregate download.
+    """
+    submissions, session_data = build_synthetic_session(participants, videos, samples)
+    bodies = [json.dumps(submission).encode('utf-8') for submission in submissions]
+    click.echo(f"Synthetic session: {participants * videos * samples} annotations, {sum(map(len, bodies)) / 1e6:.1f} MB of submissions.")
+    if codec.orjson is None:
+        click.echo("orjson is not installed, so the app's codec falls back to the standard library.")
+
+    def measure(fn):
+        start = time.perf_counter()
+        fn()
+        return time.perf_counter() - start
+
+    results = [
+        ("parse submissions", measure(lambda: [json.loads(body) for body in bodies]), measure(lambda: [codec.loads(body) for body in bodies])),
+        ("serialize aggregate", measure(lambda: json.dumps(session_data, separators=(',', ':')).encode('utf-8')), measure(lambda: codec.dumps(session_data)))
+    ]
+    for name, stdlib_seconds, codec_seconds in results:
+        click.echo(f"{name}: json {stdlib_seconds:.3f}s, codec {codec_seconds:.3f}s ({stdlib_seconds / max(codec_seconds, 1e-9):.1f}x)")
+
+@click.command('build-static')
+@with_appcontext
+def build_static_command():
+    """
+    Write fingerprinted, precompressed copies of the static files, served with long-lived cache headers.
+    Restart the app afterwards for pages to link to the new copies.
+    """
+    build_folder_path = current_app.config.get('STATIC_BUILD_FOLDER_PATH')
+    manifest = build_static_assets(current_app.static_folder, build_folder_path)
+    click.echo(f"Built {len(manifest)} static files into {build_folder_path}.")
+
+@click.command('expire-uploads')
+@click.option('--max-age', type=float, default=None, help='Seconds an upload may sit idle before it is aborted. Defaults to UPLOAD_EXPIRY_SECONDS.')
+@with_appcontext
+def expire_uploads_command(max_age):
+    """
+    Abort chunked uploads that have been abandoned, freeing the disk space preallocated for them.
+    """
+    if max_age is None:
+        max_age = current_app.config.get('UPLOAD_EXPIRY_SECONDS')
+    click.echo(f"Aborted {expire_uploads(max_age)} idle uploads.")
@@ -10,9 +10,56 @@ class BaseConfig(object):
   TESTING = False
 
   LOGS_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'logs')
+  LOG_LEVEL = 'INFO'
+  LOG_MAX_BYTES = 10 * 1024 * 1024
+  LOG_BACKUP_COUNT = 5
+  LOG_PAYLOAD_LIMIT = 200
 
   MAX_CONTENT_LENGTH = 200 * 1024 * 1024
+  MAX_UPLOAD_SIZE = 20 * 1024 * 1024 * 1024
+  UPLOAD_EXPIRY_SECONDS = 24 * 60 * 60
   UPLOADS_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'uploads')
+
+  VIDEO_TRANSCODE_WORKERS = 2
+  VIDEO_FASTSTART = True
+  VIDEO_H264_RENDITION = False
+  VIDEO_H264_MAX_BITRATE = '2500k'
+  VIDEO_HLS = False
+  VIDEO_HLS_SEGMENT_SECONDS = 6
+  VIDEO_PREVIEW_WORKERS = 1
+  VIDEO_THUMBNAIL_WIDTH = 320
+  VIDEO_SPRITE_COLUMNS = 5
+  VIDEO_SPRITE_ROWS = 5
+  VIDEO_SPRITE_TILE_WIDTH = 160
+  VIDEO_PREVIEW_MAX_AGE = 3600
+
+  EXPORTS_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'exports')
+  EXPORT_WORKERS = 1
+
+  ANALYSIS_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'analyses')
+  ANALYSIS_JOBS = 1
+  ANALYSIS_WORKERS = 2
+  ANALYSIS_STALE_SECONDS = 3600
+
+  COLD_STORAGE_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'cold')
+
+  ADMIN_PAGE_SIZE = 20
+  ANNOTATIONS_PAGE_SIZE = 1000
+  ANNOTATIONS_MAX_PAGE_SIZE = 10000
+
+  MONITOR_POLL_SECONDS = 15
+  HEARTBEAT_FLUSH_SECONDS = 5
+
+  COMPRESS_MIMETYPES = ('application/json', 'application/x-ndjson')
+  COMPRESS_MIN_SIZE = 1024
+  COMPRESS_LEVEL = 6
+  STATIC_BUILD_FOLDER_PATH = os.path.join(INSTANCE_FOLDER_PATH, 'static')
+
+  ANNOTATOR_CACHE_SIZE = 1024
+  ANNOTATOR_CACHE_TTL = 300
+
+  RESEARCHER_CACHE_SIZE = 1024
+  RESEARCHER_CACHE_TTL = 60
   
 class DefaultConfig(BaseConfig):
 
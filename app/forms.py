@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
-from wtforms import (FieldList, FileField, FormField, IntegerField,
+from wtforms import (BooleanField, FieldList, FileField, FloatField,
+                     FormField, IntegerField, MultipleFileField,
                      PasswordField, SelectField, StringField, SubmitField)
 from wtforms.validators import (DataRequired, EqualTo, Length, NumberRange,
                                 ValidationError)
@@ -38,7 +39,7 @@ class LoginForm(FlaskForm):
 
 class SettingsForm(FlaskForm):
     method = SelectField('Annotation Method', validators=[DataRequired()],
-                         choices=[('CORAE', 'CORAE (Default)')], default='CORAE')
+                         choices=[('CORAE', 'CORAE (Default)'), ('CORAE-continuous', 'CORAE Continuous')], default='CORAE')
     capacity = IntegerField('Session Capacity', validators=[DataRequired(), NumberRange(min=1)])
     coupling = SelectField('Video Coupling', choices=[('coupled', 'Coupled (Default)'), ('decoupled', 'Decoupled')])
     ordering = SelectField('Video Sequencing', choices=[('random', 'Random (Default)'), ('ordered', 'Ordered')], default='random')
@@ -67,9 +68,26 @@ class PresetCreateForm(FlaskForm):
     settings = FormField(SettingsForm)
     submit = SubmitField('Save Preset')
 
+class ExportForm(FlaskForm):
+    format = SelectField('Format', choices=[('zip', 'ZIP'), ('tar.gz', 'TAR.GZ')], default='zip')
+    submit = SubmitField('Export Project')
+
+class AnalysisForm(FlaskForm):
+    rate = FloatField('Sampling Rate (Hz)', default=10.0, validators=[DataRequired(), NumberRange(min=0.1, max=100)])
+    smoothing = FloatField('Smoothing Window (s)', default=1.0, validators=[NumberRange(min=0, max=60)])
+    detrend = BooleanField('Remove Linear Trend', default=True)
+    zscore = BooleanField('Standardize Each Rater', default=True)
+    change_window = FloatField('Change Point Window (s)', default=5.0, validators=[DataRequired(), NumberRange(min=0.1, max=600)])
+    change_threshold = FloatField('Change Point Threshold (SD)', default=1.0, validators=[DataRequired(), NumberRange(min=0.1, max=10)])
+    submit = SubmitField('Run Analysis')
+
+class LibraryUploadForm(FlaskForm):
+    videos = MultipleFileField('Videos', validators=[DataRequired()])
+    submit = SubmitField('Upload Videos')
+
 class SessionCreateForm(FlaskForm):
     participants = FieldList(StringField('Participant Name', validators=[DataRequired()]))
-    videos = FieldList(FileField('Participant Video', validators=[DataRequired()]))
+    videos = FieldList(FileField('Participant Video'))
     general_videos = FileField('Session Videos', render_kw={"multiple": True})
     submit = SubmitField('Create Session')
 
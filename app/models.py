@@ -7,13 +7,13 @@ from flask_login import UserMixin
 from sqlalchemy.ext.associationproxy import association_proxy
 from werkzeug.security import check_password_hash, generate_password_hash
 
-from .utils.extensions import db, login_manager
+from .utils.extensions import db
 
 import uuid
 
 participant_video_association = db.Table('participant_video_association',
-    db.Column('participant_id', db.Integer, db.ForeignKey('participant.id'), primary_key=True),
-    db.Column('video_id', db.Integer, db.ForeignKey('video.id'), primary_key=True),
+    db.Column('participant_id', db.Integer, db.ForeignKey('participant.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('video_id', db.Integer, db.ForeignKey('video.id', ondelete='CASCADE'), primary_key=True),
     db.Column('order', db.Integer),
     db.Column('owner', db.Boolean, default=False)
 )
@@ -53,6 +53,7 @@ class Researcher(UserMixin, BaseModel):
     password_hash = db.Column(db.String(128))
     projects = db.relationship('Project', back_populates='researcher')
     presets = db.relationship('Preset', back_populates='researcher')
+    library = db.relationship('Video', back_populates='researcher', lazy='dynamic')
 
     @property
     def password(self):
@@ -68,10 +69,6 @@ class Researcher(UserMixin, BaseModel):
     def tokenize(self):
         self.token = self.generate_token()
         
-@login_manager.user_loader
-def load_user(researcher_id):
-    return Researcher.query.get(int(researcher_id))
-
 class Settings(BaseModel):
     __tablename__ = 'settings'
     id = db.Column(db.Integer, primary_key=True)
@@ -118,20 +115,16 @@ class Settings(BaseModel):
 class Project(BaseModel):
     __tablename__ = 'project'
     id = db.Column(db.Integer, primary_key=True)
-    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=False)
+    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=False, index=True)
     researcher = db.relationship('Researcher', back_populates='projects')
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200), nullable=False)
     settings_id = db.Column(db.Integer, db.ForeignKey('settings.id'))
-    sessions = db.relationship('Session', backref='project', lazy='dynamic', cascade='all, delete-orphan')
+    sessions = db.relationship('Session', backref='project', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True)
 
     def delete(self):
-        for session in self.sessions:
-            for participant in session.participants:
-                for video in participant.videos:
-                    video.delete_file()
-        db.session.delete(self)
-        db.session.commit()
+        from .utils.functions.deletion import delete_project
+        delete_project(self.id)
     
     def apply_preset(self, preset, settings_form_data=None):
         new_settings = Settings()
@@ -155,7 +148,7 @@ class Project(BaseModel):
 class Preset(BaseModel):
     __tablename__ = 'preset'
     id = db.Column(db.Integer, primary_key=True)
-    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=False)
+    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=False, index=True)
     researcher = db.relationship('Researcher', back_populates='presets')
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.String(200), nullable=False)
@@ -178,29 +171,41 @@ class Preset(BaseModel):
 class Session(BaseModel):
     __tablename__ = 'session'
     id = db.Column(db.Integer, primary_key=True)
-    project_id = db.Column(db.Integer, db.ForeignKey('project.id'))
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), index=True)
     description = db.Column(db.String(200))
     status = db.Column(db.Enum('active', 'archived', name='session_statuses'), default='active')
-    participants = db.relationship('Participant', backref='session', lazy=True, cascade='all, delete-orphan')
+    archive_path = db.Column(db.String(255), nullable=True)
+    participants = db.relationship('Participant', backref='session', lazy=True, cascade='all, delete-orphan', passive_deletes=True)
     
     def tokenize(self):
         self.token = self.generate_token()
-        
-    pass
+
+    def delete(self):
+        from .utils.functions.deletion import delete_session
+        delete_session(self.id)
+
+    def toggle_status(self):
+        from .utils.functions.archive import archive_session, rehydrate_session
+        if self.status == 'active':
+            archive_session(self.id)
+        else:
+            rehydrate_session(self.id)
 
 class Participant(BaseModel):
     __tablename__ = 'participant'
     id = db.Column(db.Integer, primary_key=True)
-    session_id = db.Column(db.Integer, db.ForeignKey('session.id'))
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id', ondelete='CASCADE'), index=True)
     name = db.Column(db.String(100), nullable=False)
     has_accessed = db.Column(db.Boolean, nullable=False, default=False)
     last_accessed = db.Column(db.DateTime, nullable=True)
     has_submitted = db.Column(db.Boolean, nullable=False, default=False)
+    progress = db.Column(db.Float, nullable=False, default=0)
+    current_video_id = db.Column(db.Integer, db.ForeignKey('video.id', ondelete='SET NULL'), nullable=True)
     
     videos = association_proxy('video_associations', 'video')
     video_ownership = association_proxy('video_associations', 'owner')
     video_order = association_proxy('video_associations', 'order')
-    video_associations = db.relationship('ParticipantVideoAssociation', back_populates='participant', cascade='all, delete-orphan')
+    video_associations = db.relationship('ParticipantVideoAssociation', back_populates='participant', cascade='all, delete-orphan', passive_deletes=True)
 
     
     def tokenize(self):
@@ -224,7 +229,11 @@ class Video(BaseModel):
     filepath = db.Column(db.String(255), nullable=False)
     duration = db.Column(db.Float, nullable=True)
     frame_rate = db.Column(db.Float, nullable=True)
-    video_associations = db.relationship('ParticipantVideoAssociation', back_populates='video', cascade='all, delete-orphan')
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
+    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=True, index=True)
+    researcher = db.relationship('Researcher', back_populates='library')
+    name = db.Column(db.String(255), nullable=True)
+    video_associations = db.relationship('ParticipantVideoAssociation', back_populates='video', cascade='all, delete-orphan', passive_deletes=True)
 
     @property
     def display_path(self):
@@ -235,28 +244,129 @@ class Video(BaseModel):
     @property
     def extension(self):
         return self.filepath.split('.')[-1]
+
+    @property
+    def size(self):
+        try:
+            return os.path.getsize(self.filepath)
+        except OSError:
+            return None
     
     def tokenize(self):
         self.token = self.generate_token()
     
+    @property
+    def in_library(self):
+        return self.researcher_id is not None
+
+    @property
+    def is_shared(self):
+        return db.session.query(Video.id).filter(Video.filepath == self.filepath, Video.id != self.id).first() is not None
+
     def delete_file(self):
+        from .utils.functions.transcode import delete_renditions
+        if self.is_shared:
+            current_app.logger.info(f"Video file {self.filepath} is still referenced by other videos. Skipping deletion.")
+            return
         try:
+            delete_renditions(self.filepath)
             os.remove(self.filepath)
         except Exception as e:
             current_app.logger.error(f"Error deleting video file {self.filepath}: {e}")
             
 class Annotation(BaseModel):
     __tablename__ = 'annotation'
+    __table_args__ = (db.Index('ix_annotation_video_participant_timecode', 'video_id', 'participant_id', 'timecode'),)
     id = db.Column(db.Integer, primary_key=True)
-    participant_id = db.Column(db.Integer, db.ForeignKey('participant.id'))
-    video_id = db.Column(db.Integer, db.ForeignKey('video.id'))
+    participant_id = db.Column(db.Integer, db.ForeignKey('participant.id', ondelete='CASCADE'))
+    video_id = db.Column(db.Integer, db.ForeignKey('video.id', ondelete='CASCADE'))
     timecode = db.Column(db.Float, nullable=False)
     frame_number = db.Column(db.Integer, nullable=False)
     slider_position = db.Column(db.Float, nullable=False)
     trigger = db.Column(db.String(50))
 
-    participant = db.relationship('Participant', backref=db.backref('annotations', cascade='all, delete-orphan'))
-    video = db.relationship('Video', backref=db.backref('annotations', cascade='all, delete-orphan'))
+    participant = db.relationship('Participant', backref=db.backref('annotations', cascade='all, delete-orphan', passive_deletes=True))
+    video = db.relationship('Video', backref=db.backref('annotations', cascade='all, delete-orphan', passive_deletes=True))
+
+class Export(BaseModel):
+    __tablename__ = 'export'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False)
+    project = db.relationship('Project', backref=db.backref('exports', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True))
+    format = db.Column(db.Enum('zip', 'tar.gz', name='export_formats'), default='zip')
+    status = db.Column(db.Enum('pending', 'running', 'ready', 'failed', name='export_statuses'), default='pending')
+    filepath = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    @property
+    def filename(self):
+        return f"project-{self.project_id}_export-{self.token}.{self.format}"
+
+    def tokenize(self):
+        self.token = self.generate_token()
+
+    def delete_file(self):
+        if not self.filepath:
+            return
+        try:
+            os.remove(self.filepath)
+        except Exception as e:
+            current_app.logger.error(f"Error deleting export file {self.filepath}: {e}")
+
+class Analysis(BaseModel):
+    __tablename__ = 'analysis'
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('project.id', ondelete='CASCADE'), nullable=False, index=True)
+    project = db.relationship('Project', backref=db.backref('analyses', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True))
+    session_id = db.Column(db.Integer, db.ForeignKey('session.id', ondelete='CASCADE'), nullable=True)
+    session = db.relationship('Session', backref=db.backref('analyses', lazy='dynamic', cascade='all, delete-orphan', passive_deletes=True))
+    config = db.Column(db.Text, nullable=False)
+    config_hash = db.Column(db.String(64), nullable=False)
+    fingerprint = db.Column(db.String(255), nullable=False)
+    status = db.Column(db.Enum('pending', 'running', 'ready', 'failed', name='analysis_statuses'), default='pending')
+    filepath = db.Column(db.String(255), nullable=True)
+    error = db.Column(db.String(255), nullable=True)
+
+    @property
+    def filename(self):
+        scope = f"session-{self.session_id}" if self.session_id else f"project-{self.project_id}"
+        return f"{scope}_analysis-{self.token}.zip"
+
+    def tokenize(self):
+        self.token = self.generate_token()
+
+    def delete_file(self):
+        if not self.filepath:
+            return
+        try:
+            os.remove(self.filepath)
+        except Exception as e:
+            current_app.logger.error(f"Error deleting analysis file {self.filepath}: {e}")
+
+class Upload(BaseModel):
+    __tablename__ = 'upload'
+    id = db.Column(db.Integer, primary_key=True)
+    researcher_id = db.Column(db.Integer, db.ForeignKey('researcher.id'), nullable=False)
+    filename = db.Column(db.String(100), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    chunks = db.relationship('UploadChunk', backref='upload', lazy='dynamic', cascade='all, delete-orphan')
+
+    @property
+    def extension(self):
+        return os.path.splitext(self.filename)[1]
+
+    @property
+    def filepath(self):
+        return os.path.join(current_app.config.get('UPLOADS_FOLDER_PATH'), 'partial', f"{self.token}.part")
+
+    def tokenize(self):
+        self.token = self.generate_token()
+
+class UploadChunk(db.Model):
+    __tablename__ = 'upload_chunk'
+    upload_id = db.Column(db.Integer, db.ForeignKey('upload.id', ondelete='CASCADE'), primary_key=True)
+    offset = db.Column(db.BigInteger, primary_key=True)
+    length = db.Column(db.BigInteger, nullable=False)
 
 class ParticipantVideoAssociation(db.Model):
     __table__ = participant_video_association
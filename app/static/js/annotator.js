@@ -3,10 +3,94 @@ const progressBar = document.getElementById("videoProgressBar");
 const annotationSlider = document.getElementById("annotationSlider");
 const videosDataElement = document.getElementById("videosData");
 const videos_data = JSON.parse(videosDataElement.textContent);
+const annotationMethod = JSON.parse(
+  document.getElementById("annotationMethod").textContent
+);
+const frameSyncEnabled = annotationMethod === "CORAE-continuous";
+
+const annotationTriggers = ["start", "input", "end", "interval", "frame"];
+const annotationDedupeWindow = 0.05;
+
+class AnnotationBuffer {
+  constructor(frameRate, duration) {
+    this.frameRate = frameRate || 0;
+    this.length = 0;
+    this.lastTimestamp = -Infinity;
+    this.mergeSamples = frameSyncEnabled;
+    if (frameSyncEnabled) {
+      // Keep every frame: samples of a frame that was already recorded are merged into it.
+      this.dedupeWindow = this.frameRate ? 0.5 / this.frameRate : 0.001;
+      const frames = Math.ceil((duration || 0) * (this.frameRate || 60));
+      this.allocate(Math.max(frames + 16, 1024));
+    } else {
+      this.dedupeWindow = annotationDedupeWindow;
+      this.allocate(Math.max(Math.ceil((duration || 0) * 30), 1024));
+    }
+  }
+
+  allocate(capacity) {
+    const timestamps = new Float64Array(capacity);
+    const frames = new Int32Array(capacity);
+    const positions = new Float64Array(capacity);
+    const triggers = new Uint8Array(capacity);
+    if (this.length) {
+      timestamps.set(this.timestamps.subarray(0, this.length));
+      frames.set(this.frames.subarray(0, this.length));
+      positions.set(this.positions.subarray(0, this.length));
+      triggers.set(this.triggers.subarray(0, this.length));
+    }
+    this.timestamps = timestamps;
+    this.frames = frames;
+    this.positions = positions;
+    this.triggers = triggers;
+    this.capacity = capacity;
+  }
+
+  record(timestamp, position, trigger) {
+    if (Math.abs(timestamp - this.lastTimestamp) < this.dedupeWindow) {
+      if (this.mergeSamples && this.length) {
+        // Keep the latest slider position of the frame, and the trigger of any input on it.
+        const index = this.length - 1;
+        this.positions[index] = position;
+        if (trigger !== "frame") {
+          this.triggers[index] = annotationTriggers.indexOf(trigger);
+        }
+      }
+      return false;
+    }
+    if (this.length === this.capacity) {
+      this.allocate(this.capacity * 2);
+    }
+    const index = this.length++;
+    this.timestamps[index] = timestamp;
+    this.frames[index] = Math.round(timestamp * this.frameRate);
+    this.positions[index] = position;
+    this.triggers[index] = annotationTriggers.indexOf(trigger);
+    this.lastTimestamp = timestamp;
+    return true;
+  }
+
+  toJSON() {
+    const triggers = new Array(this.length);
+    for (let i = 0; i < this.length; i++) {
+      triggers[i] = annotationTriggers[this.triggers[i]];
+    }
+    return {
+      timestamp: Array.from(this.timestamps.subarray(0, this.length)),
+      video_frame: Array.from(this.frames.subarray(0, this.length)),
+      slider_position: Array.from(this.positions.subarray(0, this.length)),
+      trigger: triggers,
+    };
+  }
+}
+
 let annotations = {};
 
 videos_data.forEach((video) => {
-  annotations[video.id] = [];
+  annotations[video.id] = new AnnotationBuffer(
+    video.frame_rate,
+    video.duration
+  );
 });
 
 let currentVideoIndex = 0;
@@ -14,9 +98,24 @@ let intervalAnnotation = null;
 let isPlaying = false;
 let intervalAnnotationModeEnabled = false;
 let intervalTime = 1000;
+let frameCallbackHandle = null;
+let lastMediaTime = null;
+
+const heartbeatInterval = 10000;
+let heartbeatTimer = null;
+
+const prefetchBlobLimit = 256 * 1024 * 1024;
+let prefetchedVideos = {};
+
+const hlsSupported =
+  videoElement.canPlayType("application/vnd.apple.mpegurl") !== "";
 
 let currentVideoId = videos_data[currentVideoIndex].id;
-let currentVideoURL = videos_data[currentVideoIndex].url;
+let currentVideoURL = getVideoSource(videos_data[currentVideoIndex]).url;
+
+if (currentVideoURL !== videos_data[currentVideoIndex].url) {
+  setVideoSource(getVideoSource(videos_data[currentVideoIndex]));
+}
 
 videoElement.addEventListener("keydown", reemitKeydown);
 annotationSlider.addEventListener("keydown", reemitKeydown);
@@ -24,6 +123,9 @@ videoElement.addEventListener("timeupdate", updateProgressBar);
 document.addEventListener("keydown", handleKey);
 document.addEventListener("reemittedKeydown", handleKey);
 videoElement.addEventListener("ended", handleVideoEnd);
+videoElement.addEventListener("canplaythrough", function () {
+  prefetchVideo(currentVideoIndex + 1);
+});
 annotationSlider.addEventListener("input", function () {
   if (isPlaying) {
     recordAnnotation("input");
@@ -41,6 +143,12 @@ videoElement.addEventListener("play", function () {
 
   isPlaying = true;
   updateSliderAppearance();
+  startFrameSampling();
+
+  if (!heartbeatTimer) {
+    sendHeartbeat();
+    heartbeatTimer = setInterval(sendHeartbeat, heartbeatInterval);
+  }
 
   if (intervalAnnotationModeEnabled) {
     intervalAnnotation = setInterval(
@@ -53,6 +161,13 @@ videoElement.addEventListener("play", function () {
 videoElement.addEventListener("pause", function () {
   isPlaying = false;
   updateSliderAppearance();
+  stopFrameSampling();
+
+  if (heartbeatTimer) {
+    clearInterval(heartbeatTimer);
+    heartbeatTimer = null;
+    sendHeartbeat();
+  }
 
   if (intervalAnnotation) {
     clearInterval(intervalAnnotation);
@@ -61,33 +176,57 @@ videoElement.addEventListener("pause", function () {
 });
 
 function recordAnnotation(triggerType = "input") {
-  const currentTimestamp = videoElement.currentTime;
-  const currentValue = annotationSlider.value;
-  const FRAME_RATE = JSON.parse(
-    document.getElementById(`videoFrameRate_${currentVideoId}`).textContent
+  // When sampling every frame, stamp every sample with the time of the last frame presented, so that samples
+  // stay in timecode order: currentTime usually runs slightly ahead of the frames' mediaTime.
+  const timestamp =
+    frameSyncEnabled && lastMediaTime !== null
+      ? lastMediaTime
+      : videoElement.currentTime;
+  annotations[currentVideoId].record(
+    timestamp,
+    Number(annotationSlider.value),
+    triggerType
   );
-  const currentFrameNumber = Math.round(currentTimestamp * FRAME_RATE);
+}
 
-  if (!annotations[currentVideoId]) {
-    annotations[currentVideoId] = [];
+function sampleFrame(now, metadata) {
+  if (!isPlaying) {
+    frameCallbackHandle = null;
+    return;
   }
+  lastMediaTime = metadata ? metadata.mediaTime : videoElement.currentTime;
+  annotations[currentVideoId].record(
+    lastMediaTime,
+    Number(annotationSlider.value),
+    "frame"
+  );
+  scheduleFrameSample();
+}
 
-  const annotation = {
-    timestamp: currentTimestamp,
-    video_frame: currentFrameNumber,
-    slider_position: currentValue,
-    trigger: triggerType,
-  };
-
-  console.log("Recording annotation:", annotation);
+function scheduleFrameSample() {
+  if (videoElement.requestVideoFrameCallback) {
+    frameCallbackHandle = videoElement.requestVideoFrameCallback(sampleFrame);
+  } else {
+    frameCallbackHandle = requestAnimationFrame((now) => sampleFrame(now));
+  }
+}
 
-  const isDuplicate = annotations[currentVideoId].some(
-    (ann) => Math.abs(ann.timestamp - annotation.timestamp) < 0.05
-  );
+function startFrameSampling() {
+  if (frameSyncEnabled && frameCallbackHandle === null) {
+    scheduleFrameSample();
+  }
+}
 
-  if (!isDuplicate) {
-    annotations[currentVideoId].push(annotation);
+function stopFrameSampling() {
+  if (frameCallbackHandle === null) {
+    return;
+  }
+  if (videoElement.cancelVideoFrameCallback) {
+    videoElement.cancelVideoFrameCallback(frameCallbackHandle);
+  } else {
+    cancelAnimationFrame(frameCallbackHandle);
   }
+  frameCallbackHandle = null;
 }
 
 function updateAnnotationsInput() {
@@ -159,30 +298,107 @@ function updateSliderAppearance() {
   }
 }
 
+function getVideoSource(video) {
+  if (video.hls_url && hlsSupported) {
+    return { url: video.hls_url, type: "application/vnd.apple.mpegurl" };
+  }
+  return { url: video.url, type: video.type };
+}
+
+function setVideoSource(source) {
+  const sourceElement = videoElement.querySelector("source");
+  sourceElement.src = source.url;
+  sourceElement.type = source.type;
+  videoElement.load();
+}
+
+function prefetchVideo(index) {
+  if (index >= videos_data.length) {
+    return;
+  }
+
+  const video = videos_data[index];
+  if (prefetchedVideos[video.id]) {
+    return;
+  }
+
+  const source = getVideoSource(video);
+  if (
+    source.url === video.url &&
+    video.size &&
+    video.size <= prefetchBlobLimit &&
+    window.fetch
+  ) {
+    prefetchedVideos[video.id] = { url: video.url };
+    fetch(video.url)
+      .then((response) => {
+        if (!response.ok) {
+          throw new Error(`Server responded with status ${response.status}`);
+        }
+        return response.blob();
+      })
+      .then((blob) => {
+        if (!prefetchedVideos[video.id]) {
+          return;
+        }
+        prefetchedVideos[video.id] = {
+          url: URL.createObjectURL(blob),
+          objectURL: true,
+        };
+      })
+      .catch((error) => {
+        console.error("Error prefetching video:", video.id, error);
+      });
+  } else {
+    const preloader = document.createElement("video");
+    preloader.preload = "auto";
+    preloader.muted = true;
+    preloader.style.display = "none";
+    preloader.src = source.url;
+    document.body.appendChild(preloader);
+    preloader.load();
+    prefetchedVideos[video.id] = { url: source.url, preloader: preloader };
+  }
+}
+
+function releasePrefetchedVideo(videoId) {
+  const prefetched = prefetchedVideos[videoId];
+  if (!prefetched) {
+    return;
+  }
+  if (prefetched.objectURL) {
+    URL.revokeObjectURL(prefetched.url);
+  }
+  if (prefetched.preloader) {
+    prefetched.preloader.removeAttribute("src");
+    prefetched.preloader.load();
+    prefetched.preloader.remove();
+  }
+  delete prefetchedVideos[videoId];
+}
+
 function handleVideoEnd() {
   recordAnnotation("end");
   isFirstPlay = true;
+  lastMediaTime = null;
   if (currentVideoIndex < videos_data.length - 1) {
     const nextVideoId = videos_data[currentVideoIndex + 1].id;
-    annotations[nextVideoId] = annotations[nextVideoId] || [];
-    annotations[nextVideoId].push({
-      timestamp: 0,
-      video_frame: 0,
-      slider_position: 0,
-      trigger: "start",
-      video_id: nextVideoId,
-    });
+    annotations[nextVideoId].record(0, 0, "start");
   }
   console.log("Current Video Index:", currentVideoIndex);
   console.log("Annotations:", annotations);
   currentVideoIndex++;
 
   if (currentVideoIndex < videos_data.length) {
+    const previousVideoId = currentVideoId;
+    const source = getVideoSource(videos_data[currentVideoIndex]);
     currentVideoId = videos_data[currentVideoIndex].id;
-    currentVideoURL = videos_data[currentVideoIndex].url;
-    videoElement.querySelector("source").src = currentVideoURL;
-    videoElement.load();
+    currentVideoURL = prefetchedVideos[currentVideoId]
+      ? prefetchedVideos[currentVideoId].url
+      : source.url;
+    setVideoSource({ url: currentVideoURL, type: source.type });
     videoElement.play();
+    releasePrefetchedVideo(previousVideoId);
   } else {
     console.log(
       "All videos completed. Sending annotations to server:",
@@ -208,6 +424,37 @@ function handleVideoEnd() {
 const participantTokenElement = document.getElementById("participantToken");
 const participantToken = JSON.parse(participantTokenElement.textContent);
 
+function getProgress() {
+  const fraction = videoElement.duration
+    ? Math.min(videoElement.currentTime / videoElement.duration, 1)
+    : 0;
+  return Math.min(
+    ((currentVideoIndex + fraction) / videos_data.length) * 100,
+    100
+  );
+}
+
+function sendHeartbeat() {
+  const csrfToken = document
+    .querySelector('meta[name="csrf-token"]')
+    .getAttribute("content");
+
+  fetch(`/annotator/${participantToken}/heartbeat`, {
+    method: "POST",
+    keepalive: true,
+    headers: {
+      "Content-Type": "application/json",
+      "X-CSRFToken": csrfToken,
+    },
+    body: JSON.stringify({
+      progress: getProgress(),
+      video_id: currentVideoId,
+    }),
+  }).catch((error) => {
+    console.error("Error sending heartbeat:", error);
+  });
+}
+
 function submitAnnotations(annotationsData, csrfToken) {
   console.log("Submitting annotations:", annotationsData);
 
@@ -236,7 +483,6 @@ function submitAnnotations(annotationsData, csrfToken) {
     })
     .then((data) => {
       if (data.message) {
-        annotations[currentVideoId].submitted = true;
         alert(data.message);
         window.location.href = "/";
       } else if (data.error) {
@@ -0,0 +1,39 @@
+document.addEventListener("DOMContentLoaded", function () {
+  const container = document.getElementById("participants");
+  if (!container || !window.EventSource) return;
+
+  const statusClasses = ["bg-success", "bg-warning", "bg-danger"];
+
+  function updateParticipant(progress) {
+    const card = container.querySelector(
+      `[data-participant-id="${progress.participant_id}"]`
+    );
+    if (!card) return;
+
+    const status = card.querySelector("[data-status]");
+    status.classList.remove(...statusClasses);
+    if (progress.has_submitted) {
+      status.classList.add("bg-success");
+    } else if (progress.has_accessed) {
+      status.classList.add("bg-warning");
+    } else {
+      status.classList.add("bg-danger");
+    }
+
+    card.querySelector("[data-progress]").textContent =
+      Math.round(progress.progress) + "%";
+    card.querySelector("[data-annotations]").textContent =
+      progress.annotations;
+  }
+
+  function handleEvent(event) {
+    JSON.parse(event.data).forEach(updateParticipant);
+  }
+
+  const source = new EventSource(container.dataset.eventsUrl);
+  source.addEventListener("snapshot", handleEvent);
+  source.addEventListener("progress", handleEvent);
+  window.addEventListener("beforeunload", function () {
+    source.close();
+  });
+});
@@ -3,4 +3,20 @@ from .constants import *
 from .functions.auth import *
 from .functions.annotator import *
 from .functions.validation import *
-from .functions.common import *
\ No newline at end of file
+from .functions.common import *
+from .functions.codec import *
+from .functions.compression import *
+from .functions.cache import *
+from .functions.monitor import *
+from .functions.transcode import *
+from .functions.upload import *
+from .functions.jobs import *
+from .functions.archive import *
+from .functions.export import *
+from .functions.analysis import *
+from .functions.ratings import *
+from .functions.annotations import *
+from .functions.deletion import *
+from .functions.listing import *
+from .functions.logs import *
+from .functions.schema import *
@@ -1,4 +1,20 @@
 from .common import *
+from .codec import *
+from .compression import *
 from .validation import *
 from .auth import *
-from .annotator import *
\ No newline at end of file
+from .annotator import *
+from .cache import *
+from .monitor import *
+from .jobs import *
+from .transcode import *
+from .upload import *
+from .archive import *
+from .export import *
+from .analysis import *
+from .ratings import *
+from .annotations import *
+from .deletion import *
+from .listing import *
+from .logs import *
+from .schema import *
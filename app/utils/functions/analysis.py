@@ -0,0 +1,368 @@
+import datetime
+import hashlib
+import io
+import json
+import os
+import zipfile
+
+import numpy as np
+import pandas as pd
+from flask import current_app
+from sqlalchemy import func
+
+from ...models import Analysis, Annotation, Participant, Session, Video
+from ..extensions import db
+from .archive import iter_packed_annotations
+from .jobs import get_executor, submit_job
+
+ANALYSIS_DEFAULTS = {
+    "rate": 10.0,
+    "smoothing": 1.0,
+    "detrend": True,
+    "zscore": True,
+    "change_window": 5.0,
+    "change_threshold": 1.0
+}
+
+
+def step_hold(timecodes, values, rate, duration=None):
+    """
+    Resample an annotation trace onto a regular time grid, holding each slider position until the next annotation.
+
+    Parameters:
+    - timecodes (ndarray): The timecodes of the annotations, in seconds.
+    - values (ndarray): The slider positions of the annotations.
+    - rate (float): The sampling rate of the grid, in Hz.
+    - duration (float): The duration of the video, in seconds. Defaults to the last timecode.
+
+    Returns:
+    - tuple: The grid's times and the held slider positions. Times before the first annotation hold the neutral 0.
+    """
+    order = np.argsort(timecodes, kind='stable')
+    timecodes, values = timecodes[order], values[order]
+    end = duration or (timecodes[-1] if len(timecodes) else 0)
+    grid = np.arange(0, end + 0.5 / rate, 1 / rate)
+    if not len(values):
+        return grid, np.zeros(len(grid))
+    indexes = np.searchsorted(timecodes, grid, side='right') - 1
+    return grid, np.where(indexes >= 0, values[np.clip(indexes, 0, None)], 0.0)
+
+def smooth(values, rate, seconds):
+    """
+    Smooth a resampled trace with a centred moving average.
+
+    Parameters:
+    - values (ndarray): The resampled trace.
+    - rate (float): The sampling rate of the trace, in Hz.
+    - seconds (float): The width of the moving average, in seconds.
+
+    Returns:
+    - ndarray: The smoothed trace.
+    """
+    window = max(1, int(round(seconds * rate)))
+    return pd.Series(values).rolling(window, center=True, min_periods=1).mean().to_numpy()
+
+def detrend(times, values):
+    """
+    Remove the least-squares linear trend, and so the mean, from a resampled trace.
+
+    Parameters:
+    - times (ndarray): The times of the trace.
+    - values (ndarray): The resampled trace.
+
+    Returns:
+    - ndarray: The detrended trace.
+    """
+    if len(values) < 2:
+        return values - values.mean() if len(values) else values
+    slope, intercept = np.polyfit(times, values, 1)
+    return values - (slope * times + intercept)
+
+def zscore(traces):
+    """
+    Standardize the traces of one rater together, so that raters who use more or less of the scale are comparable.
+
+    Parameters:
+    - traces (list): The rater's resampled traces.
+
+    Returns:
+    - list: The standardized traces.
+    """
+    if not traces:
+        return traces
+    values = np.concatenate(traces)
+    mean, std = values.mean(), values.std()
+    return [(trace - mean) / std if std else trace - mean for trace in traces]
+
+def detect_change_points(times, values, rate, window_seconds, threshold):
+    """
+    Find the points where the mean of a trace shifts, by comparing the mean of the window before each point with
+    the mean of the window after it. Points whose shift is at least `threshold` standard deviations of the trace
+    and is the largest within a window on either side are reported.
+
+    Parameters:
+    - times (ndarray): The times of the trace.
+    - values (ndarray): The resampled trace.
+    - rate (float): The sampling rate of the trace, in Hz.
+    - window_seconds (float): The width of the windows compared, in seconds.
+    - threshold (float): The minimum shift, in standard deviations of the trace.
+
+    Returns:
+    - tuple: The times of the change points and the shift of the mean at each.
+    """
+    window = max(1, int(round(window_seconds * rate)))
+    if len(values) < 2 * window:
+        return np.empty(0), np.empty(0)
+    sums = np.concatenate(([0.0], np.cumsum(values)))
+    splits = np.arange(window, len(values) - window + 1)
+    shifts = (sums[splits + window] - 2 * sums[splits] + sums[splits - window]) / window
+    scores = np.abs(shifts) / (values.std() or 1.0)
+    peaks = scores == pd.Series(scores).rolling(2 * window + 1, center=True, min_periods=1).max().to_numpy()
+    peaks = np.flatnonzero(peaks & (scores >= threshold))
+    if len(peaks):
+        peaks = peaks[np.concatenate(([True], np.diff(peaks) > window))]
+    return times[splits[peaks]], shifts[peaks]
+
+def process_rater(traces, config):
+    """
+    Run the pipeline over every trace of one rater: step-hold resampling, smoothing, detrending, z-scoring across
+    the rater's traces, then change-point detection. Runs in the analysis rater pool, as NumPy and pandas release
+    the GIL for most of the work.
+
+    Parameters:
+    - traces (list): The rater's traces, as (video ID, timecodes, slider positions, duration) tuples.
+    - config (dict): The pipeline settings, as in `ANALYSIS_DEFAULTS`.
+
+    Returns:
+    - list: The processed traces, as (video ID, times, values, change point times, change point shifts) tuples.
+    """
+    rate = config["rate"]
+    video_ids, grids, processed = [], [], []
+    for video_id, timecodes, values, duration in traces:
+        grid, held = step_hold(np.asarray(timecodes, dtype=float), np.asarray(values, dtype=float), rate, duration)
+        if config["smoothing"]:
+            held = smooth(held, rate, config["smoothing"])
+        if config["detrend"]:
+            held = detrend(grid, held)
+        video_ids.append(video_id)
+        grids.append(grid)
+        processed.append(held)
+    if config["zscore"]:
+        processed = zscore(processed)
+
+    results = []
+    for video_id, grid, values in zip(video_ids, grids, processed):
+        change_times, change_shifts = detect_change_points(grid, values, rate, config["change_window"], config["change_threshold"])
+        results.append((video_id, grid, values, change_times, change_shifts))
+    return results
+
+def normalize_analysis_config(config=None):
+    """
+    Fill in and coerce the settings of an analysis.
+
+    Parameters:
+    - config (dict): The requested settings. Missing ones take their value from `ANALYSIS_DEFAULTS`.
+
+    Returns:
+    - dict: The complete settings.
+
+    Raises:
+    - ValueError: If a setting is not valid.
+    """
+    normalized = dict(ANALYSIS_DEFAULTS)
+    for key, value in (config or {}).items():
+        if key not in ANALYSIS_DEFAULTS or value is None:
+            continue
+        normalized[key] = bool(value) if isinstance(ANALYSIS_DEFAULTS[key], bool) else float(value)
+    if normalized["rate"] <= 0 or normalized["change_window"] <= 0 or normalized["smoothing"] < 0:
+        raise ValueError('Invalid analysis settings.')
+    return normalized
+
+def get_analysis_fingerprint(session_ids):
+    """
+    Fingerprint the annotations of a set of sessions, so that an analysis is only reused while they are unchanged.
+
+    Parameters:
+    - session_ids (list): The IDs of the sessions.
+
+    Returns:
+    - str: The fingerprint.
+    """
+    count, last_id = db.session.query(func.count(Annotation.id), func.max(Annotation.id)).join(
+        Participant, Participant.id == Annotation.participant_id
+    ).filter(Participant.session_id.in_(session_ids)).one()
+    packs = sorted(
+        (session_id, os.path.getmtime(archive_path) if os.path.exists(archive_path) else 0)
+        for session_id, archive_path in db.session.query(Session.id, Session.archive_path).filter(
+            Session.id.in_(session_ids), Session.archive_path.isnot(None)
+        )
+    )
+    key = json.dumps([sorted(session_ids), count, last_id, packs])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def load_traces(session_ids):
+    """
+    Load the annotation traces of a set of sessions, from cold storage for archived sessions.
+
+    Parameters:
+    - session_ids (list): The IDs of the sessions.
+
+    Returns:
+    - dict: A mapping from participant ID to a list of (video ID, timecodes, slider positions, duration) tuples.
+    """
+    columns = {}
+    def add(participant_id, video_id, timecode, slider_position):
+        timecodes, values = columns.setdefault((participant_id, video_id), ([], []))
+        timecodes.append(timecode)
+        values.append(slider_position)
+
+    for session_id, archive_path in db.session.query(Session.id, Session.archive_path).filter(Session.id.in_(session_ids)):
+        if archive_path:
+            for row in iter_packed_annotations(archive_path):
+                add(row["participant_id"], row["video_id"], row["timecode"], row["slider_position"])
+            continue
+        query = db.session.query(
+            Annotation.participant_id, Annotation.video_id, Annotation.timecode, Annotation.slider_position
+        ).join(Participant, Participant.id == Annotation.participant_id).filter(Participant.session_id == session_id)
+        for row in query.yield_per(5000):
+            add(*row)
+
+    video_ids = {video_id for _, video_id in columns}
+    durations = dict(db.session.query(Video.id, Video.duration).filter(Video.id.in_(video_ids))) if video_ids else {}
+    traces = {}
+    for (participant_id, video_id), (timecodes, values) in sorted(columns.items()):
+        traces.setdefault(participant_id, []).append((video_id, timecodes, values, durations.get(video_id)))
+    return traces
+
+def write_analysis_archive(archive_path, config, results):
+    """
+    Write the results of an analysis to a zip archive holding `traces.csv`, with the processed trace of every rater
+    and video, `change_points.csv`, and `config.json`, with the pipeline settings.
+
+    Parameters:
+    - archive_path (str): The path of the archive to write.
+    - config (dict): The pipeline settings.
+    - results (dict): A mapping from participant ID to the rater's processed traces, as returned by `process_rater`.
+    """
+    with zipfile.ZipFile(archive_path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True) as archive:
+        archive.writestr('config.json', json.dumps(config, indent=2))
+        for name, columns in (('traces.csv', ('time', 'value')), ('change_points.csv', ('time', 'shift'))):
+            with archive.open(name, 'w', force_zip64=True) as binary_file, io.TextIOWrapper(binary_file, encoding='utf-8', newline='') as csv_file:
+                csv_file.write(','.join(('participant_id', 'video_id') + columns) + '\n')
+                for participant_id, traces in sorted(results.items()):
+                    for video_id, times, values, change_times, change_shifts in traces:
+                        if name == 'change_points.csv':
+                            times, values = change_times, change_shifts
+                        pd.DataFrame({
+                            'participant_id': participant_id,
+                            'video_id': video_id,
+                            columns[0]: times,
+                            columns[1]: values
+                        }).to_csv(csv_file, header=False, index=False, float_format='%.6g')
+
+def run_analysis(analysis_id):
+    """
+    Run a queued analysis, processing the raters' traces in parallel in the analysis rater pool. Runs in the
+    analysis worker pool.
+
+    Parameters:
+    - analysis_id (int): The ID of the analysis.
+    """
+    analysis = Analysis.query.get(analysis_id)
+    if not analysis:
+        return
+    analysis.status = 'running'
+    db.session.commit()
+
+    ANALYSIS_FOLDER_PATH = current_app.config.get('ANALYSIS_FOLDER_PATH')
+    archive_path = os.path.join(ANALYSIS_FOLDER_PATH, analysis.filename)
+    temp_path = f"{archive_path}.part"
+    try:
+        if not os.path.exists(ANALYSIS_FOLDER_PATH):
+            os.makedirs(ANALYSIS_FOLDER_PATH)
+        config = json.loads(analysis.config)
+        traces = load_traces(get_analysis_session_ids(analysis.project_id, analysis.session_id))
+        current_app.logger.info("Running analysis %s over %d raters", analysis.token, len(traces))
+
+        workers = current_app.config.get('ANALYSIS_WORKERS', 2)
+        if workers:
+            pool = get_executor('analysis-rater', workers)
+            futures = {participant_id: pool.submit(process_rater, rater_traces, config) for participant_id, rater_traces in traces.items()}
+            results = {participant_id: future.result() for participant_id, future in futures.items()}
+        else:
+            results = {participant_id: process_rater(rater_traces, config) for participant_id, rater_traces in traces.items()}
+
+        write_analysis_archive(temp_path, config, results)
+        os.replace(temp_path, archive_path)
+        analysis.filepath = archive_path
+        analysis.status = 'ready'
+        current_app.logger.info("Analysis %s is ready", analysis.token)
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error("Error running analysis %s: %s", analysis.token, e, exc_info=True)
+        analysis.status = 'failed'
+        analysis.error = str(e)[:255]
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    db.session.commit()
+
+def get_analysis_session_ids(project_id, session_id=None):
+    """
+    Get the IDs of the sessions an analysis covers: the given session, or every session of the project.
+    """
+    if session_id:
+        return [session_id]
+    return [row[0] for row in db.session.query(Session.id).filter(Session.project_id == project_id)]
+
+def create_analysis(project, session=None, config=None):
+    """
+    Queue an analysis of the annotation traces of a session, or of every session of a project.
+
+    An analysis with the same scope and settings is reused rather than run again, for as long as the annotations
+    it covers are unchanged. Queued or running analyses are only reused until they are `ANALYSIS_STALE_SECONDS`
+    old, after which they are marked as failed and run again.
+
+    Parameters:
+    - project (Project): The project to analyse.
+    - session (Session): The session to analyse. Defaults to the whole project.
+    - config (dict): The pipeline settings. Missing ones take their value from `ANALYSIS_DEFAULTS`.
+
+    Returns:
+    - Analysis: The queued, running or finished analysis.
+
+    Raises:
+    - ValueError: If a setting is not valid.
+    """
+    config = json.dumps(normalize_analysis_config(config), sort_keys=True)
+    config_hash = hashlib.sha256(config.encode('utf-8')).hexdigest()
+    session_id = session.id if session else None
+    fingerprint = get_analysis_fingerprint(get_analysis_session_ids(project.id, session_id))
+
+    analysis = Analysis.query.filter(
+        Analysis.project_id == project.id,
+        Analysis.session_id == session_id,
+        Analysis.config_hash == config_hash,
+        Analysis.fingerprint == fingerprint,
+        Analysis.status != 'failed'
+    ).order_by(Analysis.id.desc()).first()
+    if analysis and analysis.status != 'ready':
+        # A queued or running analysis that has not progressed in a while was lost to a restart or a crashed worker.
+        stale_after = datetime.timedelta(seconds=current_app.config.get('ANALYSIS_STALE_SECONDS', 3600))
+        if analysis.updated_at < datetime.datetime.utcnow() - stale_after:
+            current_app.logger.warning("Analysis %s has been %s since %s, marking it as failed", analysis.token, analysis.status, analysis.updated_at)
+            analysis.status = 'failed'
+            analysis.error = 'The analysis did not finish.'
+            db.session.commit()
+            analysis = None
+    if analysis:
+        current_app.logger.info("Reusing analysis %s", analysis.token)
+        return analysis
+
+    analysis = Analysis(project_id=project.id, session_id=session_id, config=config, config_hash=config_hash, fingerprint=fingerprint)
+    analysis.tokenize()
+    db.session.add(analysis)
+    db.session.commit()
+
+    submit_job('analysis', current_app.config.get('ANALYSIS_JOBS', 1), run_analysis, analysis.id)
+    return analysis
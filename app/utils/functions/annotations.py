@@ -0,0 +1,150 @@
+import base64
+import binascii
+
+from sqlalchemy import tuple_
+
+from ...models import Annotation, Participant, Project, Session
+from ..extensions import db
+from .codec import dumps, loads
+
+ANNOTATION_READ_FIELDS = ('id', 'participant_id', 'video_id', 'timecode', 'frame_number', 'slider_position', 'trigger', 'created_at')
+ANNOTATION_READ_FILTERS = ('project_id', 'session_id', 'participant_id', 'video_id')
+# Pages follow the (video_id, participant_id, timecode) index, with the ID breaking ties between equal timecodes.
+ANNOTATION_READ_ORDER = (Annotation.video_id, Annotation.participant_id, Annotation.timecode, Annotation.id)
+
+
+def encode_cursor(key):
+    """
+    Encode the sort key of the last row on a page into an opaque cursor.
+
+    Parameters:
+    - key (tuple): The row's video ID, participant ID, timecode and ID.
+
+    Returns:
+    - str: The cursor.
+    """
+    return base64.urlsafe_b64encode(dumps(list(key))).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """
+    Decode a cursor into the sort key of the last row on the previous page.
+
+    Parameters:
+    - cursor (str): The cursor.
+
+    Returns:
+    - tuple: The row's video ID, participant ID, timecode and ID.
+
+    Raises:
+    - ValueError: If the cursor is not valid.
+    """
+    try:
+        key = loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError, TypeError):
+        raise ValueError('Invalid cursor.')
+    if not isinstance(key, list) or len(key) != len(ANNOTATION_READ_ORDER) or not all(isinstance(value, (int, float)) for value in key):
+        raise ValueError('Invalid cursor.')
+    return tuple(key)
+
+def parse_annotation_fields(fields):
+    """
+    Parse the fields to return from a comma-separated list.
+
+    Parameters:
+    - fields (str): The requested fields, or None for every field.
+
+    Returns:
+    - list: The fields, in the order requested.
+
+    Raises:
+    - ValueError: If a field is not known.
+    """
+    if not fields:
+        return list(ANNOTATION_READ_FIELDS)
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(',') if field.strip()))
+    unknown = [field for field in requested if field not in ANNOTATION_READ_FIELDS]
+    if unknown or not requested:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}. Choose from: {', '.join(ANNOTATION_READ_FIELDS)}.")
+    return requested
+
+def parse_annotation_filters(args):
+    """
+    Parse the filters of an annotation read from a request's query string.
+
+    Parameters:
+    - args (MultiDict): The query string arguments.
+
+    Returns:
+    - dict: The filters given, as expected by `query_annotations`.
+
+    Raises:
+    - ValueError: If a filter is not a valid number.
+    """
+    filters = {}
+    for name, cast in [(name, int) for name in ANNOTATION_READ_FILTERS] + [('start', float), ('end', float)]:
+        value = args.get(name)
+        if value in (None, ''):
+            continue
+        try:
+            filters[name] = cast(value)
+        except ValueError:
+            raise ValueError(f"Invalid {name}: {value}.")
+    if args.get('trigger'):
+        filters['trigger'] = args.get('trigger')
+    return filters
+
+def query_annotations(researcher_id, filters=None, fields=None, cursor=None, limit=1000):
+    """
+    Fetch one page of the annotations collected in a researcher's projects, in (video, participant, timecode)
+    order, so that pages are read straight along the index on those columns.
+
+    Archived sessions hold no live annotations and are skipped; filtering on one is an error.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    - filters (dict): Any of `project_id`, `session_id`, `participant_id` and `video_id`, along with `start` and
+      `end` to only include timecodes within a range, in seconds, and `trigger`.
+    - fields (list): The fields to return. Defaults to every field.
+    - cursor (str): The cursor returned with the previous page, or None for the first page.
+    - limit (int): The maximum number of annotations on the page.
+
+    Returns:
+    - tuple: The annotations on the page, as dictionaries, and the cursor of the next page or None if this is the
+      last page.
+
+    Raises:
+    - ValueError: If a filter or the cursor is not valid.
+    """
+    filters = filters or {}
+    fields = fields or list(ANNOTATION_READ_FIELDS)
+    query = db.session.query(*(getattr(Annotation, field) for field in fields), *ANNOTATION_READ_ORDER).join(
+        Participant, Participant.id == Annotation.participant_id
+    ).join(Session, Session.id == Participant.session_id).join(Project, Project.id == Session.project_id).filter(
+        Project.researcher_id == researcher_id
+    )
+
+    if filters.get('session_id') is not None:
+        status = db.session.query(Session.status).join(Project, Project.id == Session.project_id).filter(
+            Session.id == filters['session_id'], Project.researcher_id == researcher_id
+        ).scalar()
+        if status == 'archived':
+            raise ValueError('This session is archived. Unarchive it to read its annotations.')
+    for name, column in (('project_id', Session.project_id), ('session_id', Participant.session_id),
+                         ('participant_id', Annotation.participant_id), ('video_id', Annotation.video_id)):
+        if filters.get(name) is not None:
+            query = query.filter(column == filters[name])
+    if filters.get('start') is not None:
+        query = query.filter(Annotation.timecode >= filters['start'])
+    if filters.get('end') is not None:
+        query = query.filter(Annotation.timecode <= filters['end'])
+    if filters.get('trigger'):
+        query = query.filter(Annotation.trigger == filters['trigger'])
+    if cursor:
+        query = query.filter(tuple_(*ANNOTATION_READ_ORDER) > tuple_(*decode_cursor(cursor)))
+
+    rows = query.order_by(*ANNOTATION_READ_ORDER).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1][len(fields):])
+    return [dict(zip(fields, row[:len(fields)])) for row in rows], next_cursor
@@ -1,14 +1,28 @@
+import hashlib
 import json
 import os
 import random
+import tempfile
+import time
 
 import ffmpeg
-from flask import current_app, flash, redirect, url_for
+from flask import current_app, flash, make_response, redirect, request, url_for
+from flask_wtf.csrf import generate_csrf
+from sqlalchemy import insert
 from sqlalchemy.exc import SQLAlchemyError
 from werkzeug.utils import secure_filename
 
-from ...models import Annotation, Participant, Video, ParticipantVideoAssociation
+from ...models import (Annotation, Participant, ParticipantVideoAssociation,
+                       Project, Session, Settings, Video,
+                       participant_video_association)
 from ..extensions import db
+from .cache import annotator_context_cache, annotator_page_cache
+from .monitor import heartbeat_buffer, notify_session_changed, record_heartbeat
+from .transcode import (get_video_mimetype, has_hls_rendition,
+                        submit_video_transcode)
+from .validation import validate_annotation_batch
+
+ANNOTATOR_CSRF_PLACEHOLDER = "__annotator_csrf_token__"
 
 
 def extract_video_properties(video_path):
@@ -34,7 +48,7 @@ def extract_video_properties(video_path):
         return frame_rate, duration
 
     except Exception as e:
-        current_app.logger.error(f"Error extracting video properties using FFmpeg for video: {video_path}. Error: {e}")
+        current_app.logger.error("Error extracting video properties using FFmpeg for video: %s. Error: %s", video_path, e)
         return None, None
         
 def get_or_create_association(participant, video):
@@ -64,7 +78,7 @@ def assign_and_order_videos(participants, videos, coupling, ordering):
     - coupling (str): The coupling condition ("coupled" or other).
     - ordering (str): The ordering condition ("random" or other).
     """
-    current_app.logger.debug(f"Number of participants: {len(participants)}, Number of videos: {len(videos)}")
+    current_app.logger.debug("Number of participants: %s, Number of videos: %s", len(participants), len(videos))
 
     try:
         if coupling == "coupled":
@@ -93,79 +107,103 @@ def assign_and_order_videos(participants, videos, coupling, ordering):
 
     except SQLAlchemyError as e:
         db.session.rollback()
-        current_app.logger.error(f"Error during video-participant association: {e}")
+        current_app.logger.error("Error during video-participant association: %s", e)
         raise
     except Exception as e:
-        current_app.logger.error(f"Unexpected error during video-participant association: {e}")
+        current_app.logger.error("Unexpected error during video-participant association: %s", e)
         raise
 
-def save_annotations(request, participant):
+def save_annotations(data, participant, granularity=None, batch_size=5000):
     """
-    Saves annotations for a participant based on the request data.
+    Saves annotations for a participant from a submitted annotation payload.
+
+    Each video's annotations are validated as a batch by `validate_annotation_batch`, and rejected rows are
+    logged once per submission as a summary. Annotations already stored for the participant are skipped, using
+    a single lookup per video, and new ones are written with batched multi-row inserts, so that dense
+    frame-synchronous traces can be ingested quickly.
 
     Args:
-    - request (Request): The Flask request object containing the annotation data.
+    - data (dict): The parsed JSON body of the submission, holding the annotations of each video.
     - participant (Participant): The participant instance.
+    - granularity (int): The width of the project's scale, from -granularity/2 to granularity/2, used to bound
+      slider positions.
+    - batch_size (int): The number of annotations inserted per statement.
 
     Returns:
     - Response: A Flask response object.
     """
     try:
-        current_app.logger.info(f"Saving annotations for participant ID: {participant.id}")
-        data = request.get_json()
+        current_app.logger.info("Saving annotations for participant ID: %s", participant.id)
         annotations_data_dict = data.get('annotations')
 
+        video_ids = {int(video_id_str) for video_id_str in annotations_data_dict}
+        known_videos = {row.id: row for row in db.session.query(Video.id, Video.frame_rate, Video.duration).filter(Video.id.in_(video_ids))}
+
+        batch = []
+        count = 0
+        rejections = {}
         for video_id_str, annotations_list in annotations_data_dict.items():
             video_id = int(video_id_str)
-            video = Video.query.get(video_id)
-            if video is None:
-                current_app.logger.error(f"Video with ID {video_id} not found in the database.")
+            if video_id not in known_videos:
+                current_app.logger.error("Video with ID %s not found in the database.", video_id)
                 continue
 
-            for annotation_data in annotations_list:
-                existing_annotation = Annotation.query.filter_by(
-                    participant_id=participant.id,
-                    video_id=video.id,
-                    timecode=annotation_data["timestamp"],
-                    frame_number=annotation_data["video_frame"]
-                ).first()
-                if existing_annotation:
-                    continue
-                
-                if annotation_data.get('trigger') not in ['start', 'input', 'end']:
-                    current_app.logger.error(f"Invalid trigger value: {annotation_data.get('trigger')}")
-                    continue
-
-                annotation = Annotation(
-                    timecode=annotation_data["timestamp"],
-                    frame_number=annotation_data["video_frame"],
-                    slider_position=annotation_data["slider_position"],
-                    trigger=annotation_data["trigger"],
-                    participant_id=participant.id,
-                    video_id=video.id
-                )
+            video = known_videos[video_id]
+            accepted, rejected = validate_annotation_batch(annotations_list, video.frame_rate, video.duration, granularity)
+            for reason, rejected_count in rejected.items():
+                if rejected_count:
+                    rejections.setdefault(video_id, {})[reason] = rejected_count
 
-                db.session.add(annotation)
+            seen = set(db.session.query(Annotation.timecode, Annotation.frame_number).filter_by(participant_id=participant.id, video_id=video_id))
+            rows = zip(accepted["timecode"].tolist(), accepted["frame_number"].astype(int).tolist(), accepted["slider_position"].tolist(), accepted["trigger"].tolist())
+            for timecode, frame_number, slider_position, trigger in rows:
+                if (timecode, frame_number) in seen:
+                    continue
+                seen.add((timecode, frame_number))
+
+                batch.append({
+                    "timecode": timecode,
+                    "frame_number": frame_number,
+                    "slider_position": slider_position,
+                    "trigger": trigger,
+                    "participant_id": participant.id,
+                    "video_id": video_id
+                })
+                if len(batch) >= batch_size:
+                    db.session.execute(insert(Annotation), batch)
+                    count += len(batch)
+                    batch = []
+
+        if batch:
+            db.session.execute(insert(Annotation), batch)
+            count += len(batch)
+        if rejections:
+            current_app.logger.warning("Rejected annotations for participant ID: %s, by video ID and reason: %s", participant.id, rejections)
+        current_app.logger.debug("Inserted %s annotations for participant ID: %s", count, participant.id)
 
         participant.has_submitted = True
+        participant.progress = 100
+        heartbeat_buffer.discard(participant.id)
         db.session.commit()
         current_app.logger.debug("Database commit successful")
+        notify_session_changed(participant.session_id)
 
-        current_app.logger.info(f"Annotations saved successfully for participant ID: {participant.id}")
+        current_app.logger.info("Annotations saved successfully for participant ID: %s", participant.id)
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"Error saving annotations: {e}", exc_info=True)
+        current_app.logger.error("Error saving annotations: %s", e, exc_info=True)
         flash('There was an error saving your annotations. Please try again.', 'danger')
 
     finally:
         return redirect(url_for('core.index'))
         
-def participant_annotations_to_json(participant):
+def participant_annotations_to_json(participant, packed_annotations=None):
     """
     Converts a participant's annotations to a JSON format.
 
     Args:
     - participant (Participant): The participant instance.
+    - packed_annotations (dict): The annotations of an archived session, as returned by `load_packed_annotations`.
 
     Returns:
     - dict: A dictionary containing the participant's annotations in JSON format.
@@ -189,42 +227,172 @@ def participant_annotations_to_json(participant):
             "duration": video.duration,
             "frame_rate": video.frame_rate
         }
-        annotations = Annotation.query.filter_by(participant_id=participant.id, video_id=video.id).all()
-        current_app.logger.debug(f"Retrieved annotations: {annotations}")
-
-        annotations_data = []
-        for annotation in annotations:
-            annotation_dict = {
-                "timecode": annotation.timecode,
-                "frame_number": annotation.frame_number,
-                "slider_position": annotation.slider_position,
-                "trigger": annotation.trigger
-            }
-            annotations_data.append(annotation_dict)
+        if packed_annotations is not None:
+            annotations_data = [
+                {key: row[key] for key in ("timecode", "frame_number", "slider_position", "trigger")}
+                for row in packed_annotations.get((participant.id, video.id), [])
+            ]
+        else:
+            annotations = Annotation.query.filter_by(participant_id=participant.id, video_id=video.id).all()
+            current_app.logger.debug("Retrieved %s annotations of video ID: %s", len(annotations), video.id)
+
+            annotations_data = []
+            for annotation in annotations:
+                annotation_dict = {
+                    "timecode": annotation.timecode,
+                    "frame_number": annotation.frame_number,
+                    "slider_position": annotation.slider_position,
+                    "trigger": annotation.trigger
+                }
+                annotations_data.append(annotation_dict)
         
         video_data["annotations"] = annotations_data
         participant_data["videos"].append(video_data)
 
-    current_app.logger.debug(f"Participant data before JSON serialization: {participant_data}")
+    current_app.logger.debug("Serialized %s videos for participant ID: %s", len(participant_data["videos"]), participant.id)
     return participant_data
 
-def update_participant_progress(participant_id, progress_value):
+def get_annotator_context(token):
+    """
+    Resolves a participant token to everything the annotator needs to serve and accept annotations.
+
+    Results are kept in the per-process annotator context cache, so repeated visits and submissions
+    by the same participant are answered without touching the database.
+
+    Args:
+    - token (str): The participant's token.
+
+    Returns:
+    - dict: The participant, session and project IDs, the project's settings and the participant's videos,
+      or None if the token does not resolve to a participant with a session, project and settings.
+    """
+    context = annotator_context_cache.get(token)
+    if context is not None:
+        return context
+
+    row = db.session.query(Participant.id, Session.id, Project.id, Settings).join(
+        Session, Participant.session_id == Session.id
+    ).join(
+        Project, Session.project_id == Project.id
+    ).join(
+        Settings, Project.settings_id == Settings.id
+    ).filter(Participant.token == token).first()
+    if row is None:
+        current_app.logger.debug("Could not resolve annotator context for token: %s", token)
+        return None
+
+    participant_id, session_id, project_id, settings = row
+    associations = db.session.query(ParticipantVideoAssociation, Video).join(
+        Video, ParticipantVideoAssociation.video_id == Video.id
+    ).filter(ParticipantVideoAssociation.participant_id == participant_id).all()
+
+    context = {
+        "participant_id": participant_id,
+        "session_id": session_id,
+        "project_id": project_id,
+        "settings": settings.to_dict(),
+        "videos": [
+            {
+                "id": video.id,
+                "filename": video.filename,
+                "type": get_video_mimetype(video.filepath),
+                "hls": has_hls_rendition(video.filepath),
+                "frame_rate": video.frame_rate,
+                "duration": video.duration,
+                "size": video.size,
+                "owner": assoc.owner,
+                "order": assoc.order
+            }
+            for assoc, video in associations
+        ]
+    }
+    annotator_context_cache.set(token, context)
+    return context
+
+def get_cached_annotator_page(token):
     """
-    Updates the progress of a participant.
+    Retrieves the rendered annotator page for a participant, if one is cached for the current settings version.
+
+    Args:
+    - token (str): The participant's token.
+
+    Returns:
+    - dict: The cached page body and its ETag, or None if nothing is cached.
+    """
+    return annotator_page_cache.get((token, annotator_context_cache.version))
+
+def cache_annotator_page(token, body):
+    """
+    Caches a rendered annotator page for a participant under the current settings version.
+
+    The page must have been rendered with `ANNOTATOR_CSRF_PLACEHOLDER` in place of the CSRF token,
+    which is substituted per request by `annotator_page_response`.
+
+    Args:
+    - token (str): The participant's token.
+    - body (str): The rendered annotator page.
+
+    Returns:
+    - dict: The cached page body and its ETag.
+    """
+    page = {
+        "body": body,
+        "etag": hashlib.md5(body.encode('utf-8')).hexdigest()
+    }
+    annotator_page_cache.set((token, annotator_context_cache.version), page)
+    return page
+
+def annotator_page_response(page):
+    """
+    Builds the response for a cached annotator page, answering with 304 Not Modified if the client already has it.
+
+    The ETag includes the current CSRF validity window, so a client is never told to reuse a page
+    whose embedded CSRF token has expired or is about to.
+
+    Args:
+    - page (dict): The cached page body and its ETag.
+
+    Returns:
+    - Response: A Flask response object.
+    """
+    time_limit = current_app.config.get('WTF_CSRF_TIME_LIMIT', 3600)
+    window = int(time.time() // max(time_limit // 2, 1)) if time_limit else 0
+    etag = f"{page['etag']}-{window}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(page["body"].replace(ANNOTATOR_CSRF_PLACEHOLDER, generate_csrf()))
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+def update_participant_progress(participant_id, progress_value, session_id, video_id=None):
+    """
+    Updates the progress of a participant from an annotator heartbeat.
+
+    Heartbeats are coalesced in memory and written to the database in batches, so the update is accepted
+    rather than applied immediately. Heartbeats from participants who have already submitted are rejected.
 
     Args:
     - participant_id (int): The ID of the participant.
     - progress_value (float): The progress value to set (between 0 and 100).
+    - session_id (int): The ID of the participant's session.
+    - video_id (int): The ID of the video the participant is watching.
 
     Returns:
     - dict: A dictionary containing a message about the update status.
     - int: HTTP status code.
     """
-    if 0 <= float(progress_value) <= 100:
-        participant_instance = Participant.query.get_or_404(participant_id)
-        participant_instance.progress = progress_value
-        db.session.commit()
-        return {'message': 'Progress updated successfully'}, 200
+    try:
+        progress_value = float(progress_value)
+    except (TypeError, ValueError):
+        return {'message': 'Invalid progress value'}, 400
+    if db.session.query(Participant.has_submitted).filter(Participant.id == participant_id).scalar():
+        return {'message': 'Annotations already submitted'}, 409
+    if 0 <= progress_value <= 100:
+        record_heartbeat(participant_id, session_id, progress_value, video_id)
+        return {'message': 'Progress updated successfully'}, 202
     else:
         return {'message': 'Invalid progress value'}, 400
     
@@ -240,7 +408,7 @@ def get_session_from_participant(participant_instance):
     """
     session = participant_instance.session
     if not session:
-        current_app.logger.warning(f"No session associated with token: {participant_instance.token}")
+        current_app.logger.warning("No session associated with token: %s", participant_instance.token)
         flash('The session associated with this link is not available.')
         return redirect(url_for('core.index'))
     return session
@@ -257,14 +425,139 @@ def get_project_from_participant(participant_instance):
     """
     project = participant_instance.session.project
     if not project:
-        current_app.logger.warning(f"No project associated with token: {participant_instance.token}")
+        current_app.logger.warning("No project associated with token: %s", participant_instance.token)
         flash('The project associated with this link is not available.')
         return redirect(url_for('core.index'))
     return project
 
+def get_blob_path(content_hash, extension):
+    """
+    Get the content-addressed path under which a video blob is stored.
+
+    Args:
+    - content_hash (str): The SHA-256 hex digest of the video's contents.
+    - extension (str): The video's file extension, including the leading dot.
+
+    Returns:
+    - str: The path of the blob.
+    """
+    return os.path.join(current_app.config.get('UPLOADS_FOLDER_PATH'), 'blobs', content_hash[:2], f"{content_hash}{extension}")
+
+def store_video_blob(file_path, content_hash, extension):
+    """
+    Moves a fully written video file into content-addressed storage, unless an identical video is already stored.
+
+    The file is moved rather than copied, and removed if it turns out to be a duplicate. Only the blob at the
+    content-addressed path counts as stored, so new videos never reference a file that may be moved elsewhere.
+
+    Args:
+    - file_path (str): Path to the video file.
+    - content_hash (str): The SHA-256 hex digest of the video's contents.
+    - extension (str): The video's file extension, including the leading dot.
+
+    Returns:
+    - str: The path of the stored blob.
+    - bool: True if the blob was newly stored, False if an identical video was already stored.
+    """
+    blob_path = get_blob_path(content_hash, extension)
+    if os.path.exists(blob_path):
+        current_app.logger.info("Video with hash %s is already stored at %s", content_hash, blob_path)
+        os.remove(file_path)
+        return blob_path, False
+    os.makedirs(os.path.dirname(blob_path), exist_ok=True)
+    os.replace(file_path, blob_path)
+    return blob_path, True
+
+def hash_video_file(file_path, chunk_size=1024 * 1024):
+    """
+    Computes the SHA-256 hex digest of a video file on disk.
+
+    Args:
+    - file_path (str): Path to the video file.
+    - chunk_size (int): The number of bytes to read at a time.
+
+    Returns:
+    - str: The SHA-256 hex digest of the file's contents.
+    """
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as video_file:
+        for chunk in iter(lambda: video_file.read(chunk_size), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def write_video_blob(stream, extension, chunk_size=1024 * 1024):
+    """
+    Streams a video into content-addressed storage, hashing it on the way, and stores each distinct video only once.
+
+    Args:
+    - stream (file-like): The video contents.
+    - extension (str): The video's file extension, including the leading dot.
+    - chunk_size (int): The number of bytes to read at a time.
+
+    Returns:
+    - str: The SHA-256 hex digest of the video's contents.
+    - str: The path of the stored blob.
+    - bool: True if the blob was newly written, False if an identical video was already stored.
+    """
+    BLOBS_FOLDER_PATH = os.path.join(current_app.config.get('UPLOADS_FOLDER_PATH'), 'blobs')
+    if not os.path.exists(BLOBS_FOLDER_PATH):
+        current_app.logger.debug("%s does not exist. Creating directory.", BLOBS_FOLDER_PATH)
+        os.makedirs(BLOBS_FOLDER_PATH)
+
+    hasher = hashlib.sha256()
+    temp_fd, temp_path = tempfile.mkstemp(dir=BLOBS_FOLDER_PATH, suffix='.part')
+    try:
+        with os.fdopen(temp_fd, 'wb') as temp_file:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                hasher.update(chunk)
+                temp_file.write(chunk)
+        content_hash = hasher.hexdigest()
+        blob_path, created = store_video_blob(temp_path, content_hash, extension)
+        return content_hash, blob_path, created
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def create_video_from_blob(extension, content_hash, blob_path, created):
+    """
+    Creates a video instance referencing a stored blob, reusing the properties of identical videos where known.
+
+    Args:
+    - extension (str): The video's file extension, including the leading dot.
+    - content_hash (str): The SHA-256 hex digest of the video's contents.
+    - blob_path (str): The path of the stored blob.
+    - created (bool): True if the blob was newly written.
+
+    Returns:
+    - Video: The new video instance, added to the database session.
+    """
+    video_instance = Video()
+    video_instance.tokenize()
+
+    known_video = Video.query.filter(Video.content_hash == content_hash, Video.frame_rate.isnot(None)).first()
+    if known_video:
+        current_app.logger.info("Reusing properties of video ID: %s for hash %s", known_video.id, content_hash)
+        frame_rate, duration = known_video.frame_rate, known_video.duration
+    else:
+        current_app.logger.info("Attempting to extract frame rate from %s", blob_path)
+        frame_rate, duration = extract_video_properties(blob_path)
+        current_app.logger.info("Extracted frame rate: %s, Duration: %s", frame_rate, duration)
+
+    video_instance.filename = f"{video_instance.token}{extension}"
+    video_instance.filepath = blob_path
+    video_instance.content_hash = content_hash
+    video_instance.frame_rate = frame_rate
+    video_instance.duration = duration
+    db.session.add(video_instance)
+
+    if created:
+        submit_video_transcode(blob_path)
+
+    return video_instance
+
 def save_video_to_disk(video, project_id, session_id):
     """
-    Saves a video file to the disk and updates the corresponding video instance.
+    Saves a video file to content-addressed storage and creates the corresponding video instance.
 
     Args:
     - video (FileStorage): The video file to save.
@@ -274,49 +567,107 @@ def save_video_to_disk(video, project_id, session_id):
     Returns:
     - str: The filename of the saved video.
     """
-    current_working_directory = os.getcwd()
-    current_app.logger.debug(f"Current working directory: {current_working_directory}")
-    SESSION_FOLDER_PATH = os.path.join(current_app.config.get('UPLOADS_FOLDER_PATH'), str(project_id), str(session_id))
-    try:
-        if not os.path.exists(SESSION_FOLDER_PATH):
-            current_app.logger.debug(f"{SESSION_FOLDER_PATH} does not exist. Creating directory.")
-            os.makedirs(SESSION_FOLDER_PATH)
-        else:
-            current_app.logger.debug(f"{SESSION_FOLDER_PATH} already exists. Skipping directory creation.")
-    except Exception as e:
-        current_app.logger.error(f"Error creating directory {SESSION_FOLDER_PATH}: {e}")
-        raise
-    
-    video_instance = Video()
-    video_instance.tokenize()
-    
     extension = os.path.splitext(secure_filename(video.filename))[1]
-    
-    filename = f"{video_instance.token}{extension}"
-    
-    VIDEO_FILE_PATH = os.path.join(SESSION_FOLDER_PATH, filename)
-    current_app.logger.info(f"Attempting to save video to {VIDEO_FILE_PATH}")
-    absolute_path_before = os.path.abspath(VIDEO_FILE_PATH).replace("\\", "/")
-    current_app.logger.debug(f"Absolute path before saving video: {absolute_path_before}")
+    current_app.logger.info("Attempting to save video %s for project ID: %s and session ID: %s", video.filename, project_id, session_id)
 
-    video.save(VIDEO_FILE_PATH)
-    current_app.logger.debug(f"Saved video with filename: {filename} at path: {VIDEO_FILE_PATH}")
+    content_hash, blob_path, created = write_video_blob(video.stream, extension)
+    current_app.logger.debug("Video with hash %s stored at %s (new: %s)", content_hash, blob_path, created)
 
-    absolute_path_after = os.path.abspath(VIDEO_FILE_PATH).replace("\\", "/")
-    current_app.logger.debug(f"Absolute path after saving video: {absolute_path_after}")
+    video_instance = create_video_from_blob(extension, content_hash, blob_path, created)
+    db.session.commit()
 
-    video_size = os.path.getsize(VIDEO_FILE_PATH)
-    current_app.logger.debug(f"Video size on disk: {video_size} bytes")
-    
-    current_app.logger.info(f"Attempting to extract frame rate from {absolute_path_after}")
-    frame_rate, duration = extract_video_properties(absolute_path_after)
-    current_app.logger.info(f"Extracted frame rate: {frame_rate}, Duration: {duration}")
+    return video_instance.filename
 
-    video_instance.filename = filename
-    video_instance.filepath = VIDEO_FILE_PATH
-    video_instance.frame_rate = frame_rate
-    video_instance.duration = duration
-    db.session.add(video_instance)
+def save_video_to_library(video, researcher):
+    """
+    Saves a video file to content-addressed storage and adds it to a researcher's video library.
+
+    Args:
+    - video (FileStorage): The video file to save.
+    - researcher (Researcher): The researcher whose library the video is added to.
+
+    Returns:
+    - Video: The new library video.
+    """
+    extension = os.path.splitext(secure_filename(video.filename))[1]
+    current_app.logger.info("Adding video %s to the library of researcher ID: %s", video.filename, researcher.id)
+
+    content_hash, blob_path, created = write_video_blob(video.stream, extension)
+    video_instance = create_video_from_blob(extension, content_hash, blob_path, created)
+    video_instance.researcher_id = researcher.id
+    video_instance.name = secure_filename(video.filename)
     db.session.commit()
 
-    return filename
\ No newline at end of file
+    return video_instance
+
+def is_project_video(video_id, project_ids):
+    """
+    Checks whether a video is assigned to a participant in any of the given projects.
+
+    Args:
+    - video_id (int): The ID of the video.
+    - project_ids (iterable): The IDs of the projects.
+
+    Returns:
+    - bool: True if the video is used in one of the projects.
+    """
+    if not project_ids:
+        return False
+    return db.session.query(participant_video_association.c.video_id).join(
+        Participant, Participant.id == participant_video_association.c.participant_id
+    ).join(Session, Session.id == Participant.session_id).filter(
+        participant_video_association.c.video_id == video_id, Session.project_id.in_(list(project_ids))
+    ).first() is not None
+
+def get_session_video(project_id, session_id, video_token):
+    """
+    Retrieves a video by its token, if it is assigned to a participant of the given session.
+
+    Args:
+    - project_id (int): The ID of the session's project.
+    - session_id (int): The ID of the session.
+    - video_token (str): The token of the video.
+
+    Returns:
+    - Video: The video, or None if the session has no such video.
+    """
+    assigned = db.session.query(participant_video_association.c.video_id).join(
+        Participant, Participant.id == participant_video_association.c.participant_id
+    ).join(Session, Session.id == Participant.session_id).filter(
+        Session.id == session_id, Session.project_id == project_id
+    )
+    return Video.query.filter(Video.token == video_token, Video.id.in_(assigned)).first()
+
+def get_library_videos(researcher, video_ids):
+    """
+    Retrieves videos from a researcher's library, in the order requested.
+
+    Args:
+    - researcher (Researcher): The researcher whose library to look in.
+    - video_ids (list): The IDs of the library videos.
+
+    Returns:
+    - list: The library videos. IDs that are not in the researcher's library are skipped.
+    """
+    if not video_ids:
+        return []
+    videos = {video.id: video for video in Video.query.filter(Video.researcher_id == researcher.id, Video.id.in_(video_ids))}
+    return [videos[video_id] for video_id in video_ids if video_id in videos]
+
+def delete_library_video(video):
+    """
+    Removes a video from its researcher's library and deletes it, unless it is still assigned to participants.
+
+    Args:
+    - video (Video): The library video.
+
+    Returns:
+    - tuple: A tuple containing a boolean indicating success or failure, and a message string.
+    """
+    if video.video_associations:
+        return False, 'This video is assigned to participants and cannot be deleted.'
+    db.session.delete(video)
+    db.session.flush()
+    video.delete_file()
+    db.session.commit()
+    return True, 'Video deleted successfully!'
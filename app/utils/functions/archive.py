@@ -0,0 +1,237 @@
+import datetime
+import gzip
+import os
+import shutil
+
+from flask import current_app
+from sqlalchemy import delete, insert, select, update
+
+from ...models import (Annotation, Participant, Session, Video,
+                       participant_video_association)
+from ..extensions import db
+from .annotator import get_blob_path
+from .codec import dumps, loads
+from .transcode import delete_renditions, submit_video_transcode
+
+
+def _to_json(value):
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def iter_session_annotations(session_id, batch_size=5000):
+    """
+    Yield every annotation collected in a session, without loading them all into memory.
+    """
+    query = db.session.query(
+        Annotation.participant_id, Annotation.video_id, Annotation.timecode,
+        Annotation.frame_number, Annotation.slider_position, Annotation.trigger, Annotation.created_at
+    ).join(Participant, Participant.id == Annotation.participant_id).filter(
+        Participant.session_id == session_id
+    ).order_by(Annotation.participant_id, Annotation.video_id, Annotation.timecode)
+    for row in query.yield_per(batch_size):
+        yield {
+            "participant_id": row.participant_id,
+            "video_id": row.video_id,
+            "timecode": row.timecode,
+            "frame_number": row.frame_number,
+            "slider_position": row.slider_position,
+            "trigger": row.trigger,
+            "created_at": row.created_at
+        }
+
+def get_cold_folder_path(session):
+    """
+    Get the cold storage folder of a session, holding its packed annotations and videos while archived.
+
+    Parameters:
+    - session (Session): The session.
+
+    Returns:
+    - str: The path of the folder.
+    """
+    return os.path.join(current_app.config.get('COLD_STORAGE_FOLDER_PATH'), str(session.project_id), str(session.id))
+
+def iter_packed_session(pack_path):
+    """
+    Read a packed session file: a gzipped NDJSON file whose first line is a header describing the session and
+    the videos moved to cold storage, followed by one line per annotation.
+
+    Parameters:
+    - pack_path (str): The path of the packed session file.
+
+    Returns:
+    - generator: Yields the header, then each annotation row.
+    """
+    with gzip.open(pack_path, 'rb') as pack_file:
+        for line in pack_file:
+            yield loads(line)
+
+def iter_packed_annotations(pack_path):
+    """
+    Yield every annotation row of a packed session file, skipping its header.
+
+    Parameters:
+    - pack_path (str): The path of the packed session file.
+    """
+    rows = iter_packed_session(pack_path)
+    next(rows, None)
+    yield from rows
+
+def load_packed_annotations(session, participant_id=None):
+    """
+    Load the annotations of an archived session from cold storage, grouped by participant and video.
+
+    Parameters:
+    - session (Session): The archived session.
+    - participant_id (int): Only load the annotations of this participant.
+
+    Returns:
+    - dict: A mapping from (participant ID, video ID) to a list of annotation rows, in timecode order.
+    """
+    annotations = {}
+    for row in iter_packed_annotations(session.archive_path):
+        if participant_id is None or row["participant_id"] == participant_id:
+            annotations.setdefault((row["participant_id"], row["video_id"]), []).append(row)
+    return annotations
+
+def get_session_videos(session_id):
+    """
+    Get the uploaded videos that belong to a session alone, and so can be moved with it.
+
+    Videos in a researcher's library, assigned to participants of other sessions, whose file is shared with
+    another video, or stored as content-addressed blobs are left in place, since uploads of the same contents
+    made while the session is archived would reuse the blob.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+
+    Returns:
+    - list: The videos.
+    """
+    session_participants = select(Participant.id).where(Participant.session_id == session_id)
+    other_participants = select(Participant.id).where(Participant.session_id != session_id)
+    videos = Video.query.join(
+        participant_video_association, Video.id == participant_video_association.c.video_id
+    ).filter(
+        participant_video_association.c.participant_id.in_(session_participants),
+        Video.researcher_id.is_(None),
+        Video.id.not_in(select(participant_video_association.c.video_id).where(participant_video_association.c.participant_id.in_(other_participants)))
+    ).distinct().all()
+    return [video for video in videos if not video.is_shared and not is_blob(video)]
+
+def is_blob(video):
+    """
+    Check whether a video's file is stored as a content-addressed blob.
+    """
+    return bool(video.content_hash) and os.path.abspath(video.filepath) == os.path.abspath(get_blob_path(video.content_hash, os.path.splitext(video.filepath)[1]))
+
+def archive_session(session_id):
+    """
+    Move an archived session out of the live tables: pack its annotations into a compressed file in cold storage,
+    move its videos alongside, and delete its annotation rows.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+    """
+    session = Session.query.get_or_404(session_id)
+    cold_folder_path = get_cold_folder_path(session)
+    if not os.path.exists(cold_folder_path):
+        os.makedirs(cold_folder_path)
+    pack_path = os.path.join(cold_folder_path, 'annotations.ndjson.gz')
+
+    moved = []
+    try:
+        videos = get_session_videos(session_id)
+        header = {
+            "session_id": session.id,
+            "archived_at": datetime.datetime.utcnow(),
+            "videos": [{"video_id": video.id, "filepath": video.filepath} for video in videos]
+        }
+        count = 0
+        with gzip.open(pack_path, 'wb') as pack_file:
+            pack_file.write(dumps(header, default=_to_json) + b'\n')
+            for row in iter_session_annotations(session_id):
+                pack_file.write(dumps(row, default=_to_json) + b'\n')
+                count += 1
+
+        for video in videos:
+            cold_path = os.path.join(cold_folder_path, os.path.basename(video.filepath))
+            delete_renditions(video.filepath)
+            shutil.move(video.filepath, cold_path)
+            moved.append((video.filepath, cold_path))
+            video.filepath = cold_path
+
+        db.session.execute(delete(Annotation).where(Annotation.participant_id.in_(select(Participant.id).where(Participant.session_id == session_id))))
+        session.archive_path = pack_path
+        session.status = 'archived'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.error(f"Error archiving session ID: {session_id}", exc_info=True)
+        for live_path, cold_path in moved:
+            shutil.move(cold_path, live_path)
+        if os.path.exists(pack_path):
+            os.remove(pack_path)
+        raise
+    current_app.logger.info(f"Archived session ID: {session_id} with {count} annotations and {len(moved)} videos to {cold_folder_path}")
+
+def rehydrate_session(session_id, batch_size=5000):
+    """
+    Bring an archived session back into the live tables: restore its annotations from cold storage in batches,
+    move its videos back and queue them for post-processing again.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+    - batch_size (int): The number of annotations inserted per statement.
+    """
+    session = Session.query.get_or_404(session_id)
+    if not session.archive_path:
+        session.status = 'active'
+        db.session.commit()
+        return
+
+    pack_path = session.archive_path
+    rows = iter_packed_session(pack_path)
+    header = next(rows)
+    moved = []
+    try:
+        count = 0
+        batch = []
+        for row in rows:
+            row["created_at"] = datetime.datetime.fromisoformat(row["created_at"]) if row.get("created_at") else None
+            batch.append(row)
+            if len(batch) >= batch_size:
+                db.session.execute(insert(Annotation), batch)
+                count += len(batch)
+                batch = []
+        if batch:
+            db.session.execute(insert(Annotation), batch)
+            count += len(batch)
+
+        for entry in header["videos"]:
+            video = Video.query.get(entry["video_id"])
+            if not video:
+                continue
+            live_folder_path = os.path.dirname(entry["filepath"])
+            if not os.path.exists(live_folder_path):
+                os.makedirs(live_folder_path)
+            shutil.move(video.filepath, entry["filepath"])
+            moved.append((entry["filepath"], video.filepath))
+            # Videos uploaded while the session was archived may have been pointed at the file in cold storage.
+            db.session.execute(update(Video).where(Video.filepath == video.filepath).values(filepath=entry["filepath"]))
+
+        session.archive_path = None
+        session.status = 'active'
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.error(f"Error rehydrating session ID: {session_id}", exc_info=True)
+        for live_path, cold_path in moved:
+            shutil.move(live_path, cold_path)
+        raise
+
+    os.remove(pack_path)
+    for live_path, _ in moved:
+        submit_video_transcode(live_path)
+    current_app.logger.info(f"Rehydrated session ID: {session_id} with {count} annotations and {len(moved)} videos")
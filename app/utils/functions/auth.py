@@ -1,9 +1,79 @@
 import json
-from flask import current_app, abort
-from flask_login import current_user
+from flask import current_app, abort, g
+from flask_login import UserMixin, current_user
 from sqlalchemy.exc import IntegrityError, SQLAlchemyError
-from ...models import Researcher
-from ..extensions import db
+from ...models import Project, Researcher
+from ..extensions import db, login_manager
+from .cache import researcher_cache
+
+class ResearcherIdentity(UserMixin):
+    """
+    The identity of a logged-in researcher: their ID, username and the IDs of the projects they own.
+
+    Identities are cached across requests, so that authenticating a request and checking which projects it may
+    touch costs no queries. Any other attribute is read from the researcher row, which is loaded at most once
+    per request and only when a view needs it.
+    """
+
+    def __init__(self, id, username, project_ids):
+        self.id = id
+        self.username = username
+        self.project_ids = frozenset(project_ids)
+
+    @property
+    def researcher(self):
+        """
+        The researcher row of this identity, loaded once per request.
+        """
+        if '_researcher' not in g:
+            g._researcher = Researcher.query.get(self.id)
+        return g._researcher
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return getattr(self.researcher, name)
+
+    def owns_project(self, project_id):
+        """
+        Check whether the researcher owns a project.
+
+        Parameters:
+        - project_id (int): The ID of the project.
+
+        Returns:
+        - bool: True if the researcher owns the project.
+        """
+        if project_id in self.project_ids:
+            return True
+        # The cached identity may predate a project created since, possibly by another process.
+        identity = load_researcher_identity(self.id, refresh=True)
+        return identity is not None and project_id in identity.project_ids
+
+def load_researcher_identity(researcher_id, refresh=False):
+    """
+    Load the identity of a researcher, from the researcher cache when possible.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    - refresh (bool): Whether to reload the identity from the database even if it is cached.
+
+    Returns:
+    - ResearcherIdentity: The identity, or None if the researcher does not exist.
+    """
+    identity = None if refresh else researcher_cache.get(researcher_id)
+    if identity is None:
+        username = db.session.query(Researcher.username).filter(Researcher.id == researcher_id).scalar()
+        if username is None:
+            return None
+        project_ids = [row[0] for row in db.session.query(Project.id).filter(Project.researcher_id == researcher_id)]
+        identity = ResearcherIdentity(researcher_id, username, project_ids)
+        researcher_cache.set(researcher_id, identity)
+    return identity
+
+@login_manager.user_loader
+def load_user(researcher_id):
+    return load_researcher_identity(int(researcher_id))
 
 def register_user(username, password):
     """
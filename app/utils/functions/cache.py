@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache(object):
+    """
+    A small thread-safe, per-process LRU cache whose entries expire after a fixed time-to-live.
+
+    The cache also carries a `version` counter that is bumped every time it is cleared, so that
+    anything derived from its contents can be keyed on it.
+    """
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Retrieve a value from the cache.
+
+        Parameters:
+        - key (hashable): The key of the cached value.
+
+        Returns:
+        - obj: The cached value, or None if the key is missing or has expired.
+        """
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        """
+        Store a value in the cache, evicting the least recently used entry if the cache is full.
+
+        Parameters:
+        - key (hashable): The key under which to store the value.
+        - value (obj): The value to store.
+        """
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        """
+        Remove a single entry from the cache.
+
+        Parameters:
+        - key (hashable): The key of the entry to remove.
+        """
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        """
+        Remove every entry from the cache and bump its version.
+        """
+        with self._lock:
+            self._data.clear()
+            self.version += 1
+
+    def configure(self, maxsize, ttl):
+        """
+        Resize the cache and change its time-to-live, dropping any existing entries.
+
+        Parameters:
+        - maxsize (int): The maximum number of entries to hold.
+        - ttl (float): The time-to-live of each entry, in seconds.
+        """
+        with self._lock:
+            self.maxsize = maxsize
+            self.ttl = ttl
+        self.clear()
+
+
+annotator_context_cache = TTLCache()
+annotator_page_cache = TTLCache()
+researcher_cache = TTLCache()
+
+
+def invalidate_annotator_cache():
+    """
+    Drop every cached annotator context and rendered annotator page.
+
+    Called whenever projects, presets, sessions or their videos are edited or deleted, since any of
+    these can change what a participant token resolves to.
+    """
+    annotator_context_cache.clear()
+    annotator_page_cache.clear()
+
+def invalidate_researcher_cache(researcher_id):
+    """
+    Drop the cached identity of a researcher, after they create or delete a project.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    """
+    researcher_cache.pop(researcher_id)
@@ -0,0 +1,84 @@
+import json
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+if orjson is not None:
+    # Dates are handed to the `default` function, so that output is the same whichever codec is in use.
+    ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def dumps(obj, default=None, indent=False):
+    """
+    Serialize an object to compact JSON, using orjson when it is installed and the standard library otherwise.
+
+    Parameters:
+    - obj (obj): The object to serialize.
+    - default (callable): Converts objects that JSON cannot represent, such as dates.
+    - indent (bool): Whether to indent the output by two spaces.
+
+    Returns:
+    - bytes: The UTF-8 encoded JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj, default=default, option=ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(obj, default=default, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, default=default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+def loads(data):
+    """
+    Parse JSON, using orjson when it is installed and the standard library otherwise.
+
+    Parameters:
+    - data (bytes or str): The JSON to parse.
+
+    Returns:
+    - obj: The parsed object.
+    """
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    The app's JSON provider: Flask's default provider, with parsing and serialization done by orjson when it is
+    installed. Falls back to the standard library otherwise.
+
+    Unlike Flask's default, non-ASCII characters are written as UTF-8 rather than escaped (`"é"`, not
+    `"\\u00e9"`), as orjson cannot escape them, and the fallback does the same. Output is equivalent JSON either
+    way, but not byte-for-byte the same: orjson also writes NaN and infinity as null, and may format floats
+    differently.
+    """
+
+    ensure_ascii = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or set(kwargs) - {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return self._orjson_dumps(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self._orjson_dumps(obj, indent) + b'\n', mimetype=self.mimetype)
+
+    def _orjson_dumps(self, obj, indent=False):
+        option = ORJSON_OPTIONS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=self.default, option=option)
@@ -2,6 +2,7 @@ import os, json
 import importlib
 from datetime import datetime
 from ..extensions import db
+from .cache import invalidate_annotator_cache
 
 ALLOWED_EXTENSIONS = {'mp4', 'avi', 'mov', 'flv', 'mkv'}
 
@@ -87,8 +88,12 @@ def delete_item_from_db(item_type, item_id):
     if not model:
         return False, 'Invalid item type!'
     item = model.query.get_or_404(item_id)
-    db.session.delete(item)
-    db.session.commit()
+    if hasattr(item, 'delete'):
+        item.delete()
+    else:
+        db.session.delete(item)
+        db.session.commit()
+    invalidate_annotator_cache()
 
     return True, f'{item_type.capitalize()} deleted successfully!'
 
@@ -105,8 +110,12 @@ def toggle_item_status(item_type, item_id):
     """
     model = get_item_model(item_type)
     item = model.query.get_or_404(item_id)
-    item.status = 'archived' if item.status == 'active' else 'active'
-    db.session.commit()
+    if hasattr(item, 'toggle_status'):
+        item.toggle_status()
+    else:
+        item.status = 'archived' if item.status == 'active' else 'active'
+        db.session.commit()
+    invalidate_annotator_cache()
     
 def load_settings(objs):
     """
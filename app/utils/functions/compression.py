@@ -0,0 +1,230 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import shutil
+import zlib
+
+from flask import current_app, request, send_file, url_for
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.json', '.svg', '.ico', '.txt', '.html', '.map')
+ASSET_MANIFEST = 'manifest.json'
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def get_encodings():
+    """
+    Get the content encodings this server can produce, in order of preference.
+
+    Returns:
+    - tuple: The encodings.
+    """
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+def choose_encoding(available=None):
+    """
+    Choose the content encoding of a response from the request's Accept-Encoding header.
+
+    Parameters:
+    - available (iterable): The encodings to choose from. Defaults to every encoding this server can produce.
+
+    Returns:
+    - str: The chosen encoding, or None if the client accepts none of them.
+    """
+    accepted = request.accept_encodings
+    for encoding in available if available is not None else get_encodings():
+        if accepted[encoding]:
+            return encoding
+    return None
+
+def compress_bytes(data, encoding, level=6):
+    """
+    Compress a response body in one go.
+
+    Parameters:
+    - data (bytes): The body.
+    - encoding (str): The content encoding ('br' or 'gzip').
+    - level (int): The gzip compression level, from 1 to 9. Brotli uses a quality scaled to match.
+
+    Returns:
+    - bytes: The compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=min(11, level + 2))
+    return gzip.compress(data, compresslevel=level)
+
+def compress_stream(chunks, encoding, level=6):
+    """
+    Compress a streamed response body chunk by chunk, without buffering it.
+
+    Parameters:
+    - chunks (iterable): The chunks of the body, as bytes or strings.
+    - encoding (str): The content encoding ('br' or 'gzip').
+    - level (int): The gzip compression level, from 1 to 9.
+
+    Returns:
+    - generator: Yields the compressed chunks.
+    """
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=min(11, level + 2))
+        compress, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        compress, finish = compressor.compress, compressor.flush
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            data = compress(chunk)
+            if data:
+                yield data
+        yield finish()
+    finally:
+        if hasattr(chunks, 'close'):
+            chunks.close()
+
+def compress_response(response):
+    """
+    Compress a dynamic response if the client accepts it, e.g. JSON downloads of a session's annotations.
+    Registered as an `after_request` handler.
+
+    Only successful responses of the types listed in `COMPRESS_MIMETYPES` are compressed, and only if they are
+    streamed or at least `COMPRESS_MIN_SIZE` bytes long. Files sent from disk are left alone.
+
+    Parameters:
+    - response (Response): The response.
+
+    Returns:
+    - Response: The response, compressed if applicable.
+    """
+    config = current_app.config
+    if (response.status_code != 200 or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.mimetype not in config.get('COMPRESS_MIMETYPES', ())):
+        return response
+    response.vary.add('Accept-Encoding')
+    if not response.is_streamed and response.calculate_content_length() < config.get('COMPRESS_MIN_SIZE', 1024):
+        return response
+
+    encoding = choose_encoding()
+    if not encoding:
+        return response
+    level = config.get('COMPRESS_LEVEL', 6)
+    if response.is_streamed:
+        response.response = compress_stream(response.response, encoding, level)
+        response.headers.pop('Content-Length', None)
+    else:
+        response.set_data(compress_bytes(response.get_data(), encoding, level))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+def build_static_assets(static_folder_path, build_folder_path, level=9):
+    """
+    Write a fingerprinted copy of every static file, named after a hash of its contents, along with gzip and
+    (if available) brotli versions of the text files, and a manifest mapping each file to its copy.
+
+    Parameters:
+    - static_folder_path (str): The folder of the original static files.
+    - build_folder_path (str): The folder to write the built files to. It is emptied first.
+    - level (int): The gzip compression level, from 1 to 9.
+
+    Returns:
+    - dict: The manifest, mapping each file's path relative to the static folder to its fingerprinted path.
+    """
+    if os.path.exists(build_folder_path):
+        shutil.rmtree(build_folder_path)
+    os.makedirs(build_folder_path)
+
+    manifest = {}
+    for folder_path, _, filenames in os.walk(static_folder_path):
+        for filename in sorted(filenames):
+            source_path = os.path.join(folder_path, filename)
+            relative_path = os.path.relpath(source_path, static_folder_path).replace(os.sep, '/')
+            with open(source_path, 'rb') as source_file:
+                data = source_file.read()
+
+            stem, extension = os.path.splitext(relative_path)
+            fingerprinted_path = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{extension}"
+            target_path = os.path.join(build_folder_path, *fingerprinted_path.split('/'))
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            with open(target_path, 'wb') as target_file:
+                target_file.write(data)
+
+            if extension.lower() in COMPRESSIBLE_EXTENSIONS:
+                for encoding, suffix in (('gzip', '.gz'), ('br', '.br')):
+                    if encoding == 'br' and brotli is None:
+                        continue
+                    compressed = gzip.compress(data, compresslevel=level, mtime=0) if encoding == 'gzip' else brotli.compress(data, quality=11)
+                    if len(compressed) < len(data):
+                        with open(target_path + suffix, 'wb') as compressed_file:
+                            compressed_file.write(compressed)
+            manifest[relative_path] = fingerprinted_path
+
+    with open(os.path.join(build_folder_path, ASSET_MANIFEST), 'w', encoding='utf-8') as manifest_file:
+        json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+    return manifest
+
+def load_asset_manifest(build_folder_path):
+    """
+    Load the manifest of the built static files.
+
+    Parameters:
+    - build_folder_path (str): The folder of the built files.
+
+    Returns:
+    - dict: The manifest, or an empty dictionary if the static files have not been built.
+    """
+    try:
+        with open(os.path.join(build_folder_path, ASSET_MANIFEST), encoding='utf-8') as manifest_file:
+            return json.load(manifest_file)
+    except (OSError, ValueError):
+        return {}
+
+def asset_url(filename):
+    """
+    Get the URL of a static file: its fingerprinted copy if the static files have been built, and the file
+    itself otherwise. Available in templates.
+
+    Parameters:
+    - filename (str): The path of the file, relative to the static folder.
+
+    Returns:
+    - str: The URL.
+    """
+    fingerprinted_path = current_app.extensions.get('asset_manifest', {}).get(filename)
+    if fingerprinted_path:
+        return url_for('core.serve_asset', filename=fingerprinted_path)
+    return url_for('static', filename=filename)
+
+def send_static_asset(filename):
+    """
+    Send a fingerprinted static file, precompressed if the client accepts it, with headers letting browsers
+    cache it for a year without revalidating.
+
+    Parameters:
+    - filename (str): The fingerprinted path of the file, relative to the build folder.
+
+    Returns:
+    - Response: The file.
+    """
+    file_path = safe_join(os.path.abspath(current_app.config.get('STATIC_BUILD_FOLDER_PATH')), filename)
+    if file_path is None or filename == ASSET_MANIFEST or not os.path.isfile(file_path):
+        raise NotFound()
+
+    suffixes = {'br': '.br', 'gzip': '.gz'}
+    encoding = choose_encoding([encoding for encoding, suffix in suffixes.items() if os.path.isfile(file_path + suffix)])
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    response = send_file(file_path + suffixes[encoding] if encoding else file_path, mimetype=mimetype, max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
@@ -0,0 +1,126 @@
+import os
+
+from flask import current_app
+from sqlalchemy import delete, select
+
+from ...models import (Analysis, Annotation, Export, Participant, Project,
+                       Session, Video, participant_video_association)
+from ..extensions import db
+from .cache import invalidate_researcher_cache
+from .jobs import submit_job
+from .transcode import delete_renditions
+
+
+def remove_files(file_paths):
+    """
+    Remove deleted videos, exports and analyses from disk, along with any renditions of the videos.
+
+    Parameters:
+    - file_paths (list): The paths of the files to remove.
+    """
+    for file_path in file_paths:
+        try:
+            delete_renditions(file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except Exception as e:
+            current_app.logger.error(f"Error deleting file {file_path}: {e}")
+    current_app.logger.info(f"Removed {len(file_paths)} files from disk")
+
+def submit_file_removal(file_paths):
+    """
+    Queue files for removal from disk once the rows referencing them have been deleted.
+
+    Parameters:
+    - file_paths (iterable): The paths of the files to remove.
+    """
+    file_paths = sorted(set(file_paths))
+    if file_paths:
+        submit_job('cleanup', 1, remove_files, file_paths)
+
+def delete_session_rows(session_ids):
+    """
+    Delete sessions and everything collected in them with set-based statements, without loading any rows.
+
+    Annotations, video assignments and participants are deleted first, so this also works on databases created
+    before foreign keys cascaded on delete. Videos uploaded into the sessions are deleted once no participant is
+    assigned them any longer; videos in a researcher's library are kept.
+
+    Parameters:
+    - session_ids (list): The IDs of the sessions to delete.
+
+    Returns:
+    - list: The paths of the video files no longer referenced by any video, and of the sessions' packed annotations
+      and analyses.
+    """
+    pack_paths = [row[0] for row in db.session.execute(select(Session.archive_path).where(Session.id.in_(session_ids), Session.archive_path.isnot(None)))]
+    pack_paths += [row[0] for row in db.session.execute(select(Analysis.filepath).where(Analysis.session_id.in_(session_ids), Analysis.filepath.isnot(None)))]
+    participant_ids = select(Participant.id).where(Participant.session_id.in_(session_ids))
+    candidate_ids = [row[0] for row in db.session.execute(
+        select(participant_video_association.c.video_id).distinct().join(
+            Video, Video.id == participant_video_association.c.video_id
+        ).where(participant_video_association.c.participant_id.in_(participant_ids), Video.researcher_id.is_(None))
+    )]
+
+    db.session.execute(delete(Annotation).where(Annotation.participant_id.in_(participant_ids)))
+    db.session.execute(delete(participant_video_association).where(participant_video_association.c.participant_id.in_(participant_ids)))
+    db.session.execute(delete(Participant).where(Participant.session_id.in_(session_ids)))
+    db.session.execute(delete(Analysis).where(Analysis.session_id.in_(session_ids)))
+    db.session.execute(delete(Session).where(Session.id.in_(session_ids)))
+
+    file_paths = pack_paths
+    for start in range(0, len(candidate_ids), 500):
+        batch = candidate_ids[start:start + 500]
+        assigned = select(participant_video_association.c.video_id).where(participant_video_association.c.video_id.in_(batch))
+        orphans = [row[0] for row in db.session.execute(select(Video.id).where(Video.id.in_(batch), Video.id.not_in(assigned)))]
+        if not orphans:
+            continue
+        paths = {row[0] for row in db.session.execute(select(Video.filepath).where(Video.id.in_(orphans)))}
+        db.session.execute(delete(Annotation).where(Annotation.video_id.in_(orphans)))
+        db.session.execute(delete(Video).where(Video.id.in_(orphans)))
+        shared = {row[0] for row in db.session.execute(select(Video.filepath).where(Video.filepath.in_(paths)))}
+        file_paths.extend(paths - shared)
+    return file_paths
+
+def delete_session(session_id):
+    """
+    Delete a session, its participants and their annotations, removing its videos from disk in the background.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+    """
+    try:
+        file_paths = delete_session_rows([session_id])
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.error(f"Error deleting session ID: {session_id}", exc_info=True)
+        raise
+    current_app.logger.info(f"Deleted session ID: {session_id}")
+    submit_file_removal(file_paths)
+
+def delete_project(project_id):
+    """
+    Delete a project with all of its sessions, participants, annotations, exports and analyses, removing its videos,
+    export archives and analysis results from disk in the background.
+
+    Parameters:
+    - project_id (int): The ID of the project.
+    """
+    try:
+        export_paths = [row[0] for row in db.session.execute(select(Export.filepath).where(Export.project_id == project_id, Export.filepath.isnot(None)))]
+        export_paths += [row[0] for row in db.session.execute(select(Analysis.filepath).where(Analysis.project_id == project_id, Analysis.filepath.isnot(None)))]
+        researcher_id = db.session.execute(select(Project.researcher_id).where(Project.id == project_id)).scalar()
+        session_ids = [row[0] for row in db.session.execute(select(Session.id).where(Session.project_id == project_id))]
+        file_paths = delete_session_rows(session_ids)
+        db.session.execute(delete(Export).where(Export.project_id == project_id))
+        db.session.execute(delete(Analysis).where(Analysis.project_id == project_id))
+        db.session.execute(delete(Project).where(Project.id == project_id))
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        current_app.logger.error(f"Error deleting project ID: {project_id}", exc_info=True)
+        raise
+    invalidate_researcher_cache(researcher_id)
+    current_app.logger.info(f"Deleted project ID: {project_id}")
+    submit_file_removal(file_paths + export_paths)
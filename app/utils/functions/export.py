@@ -0,0 +1,229 @@
+import datetime
+import os
+import tarfile
+import tempfile
+import zipfile
+
+from flask import current_app
+
+from ...models import (Export, Participant, Project, Session, Video,
+                       participant_video_association)
+from ..extensions import db
+from .archive import _to_json, iter_packed_annotations, iter_session_annotations
+from .codec import dumps
+from .jobs import submit_job
+
+EXPORT_FORMATS = ('zip', 'tar.gz')
+EXPORT_FORMAT_VERSION = 1
+
+
+def write_ndjson(path, rows):
+    """
+    Write rows to a newline-delimited JSON file, one row at a time.
+
+    Parameters:
+    - path (str): The path of the file to write.
+    - rows (iterable): The rows to write, as dictionaries.
+
+    Returns:
+    - int: The number of rows written.
+    """
+    count = 0
+    with open(path, 'wb') as ndjson_file:
+        for row in rows:
+            ndjson_file.write(dumps(row, default=_to_json) + b'\n')
+            count += 1
+    return count
+
+def iter_project_videos(project_id):
+    """
+    Yield the metadata of every video assigned to a participant in a project.
+    """
+    query = db.session.query(Video).join(
+        participant_video_association, Video.id == participant_video_association.c.video_id
+    ).join(
+        Participant, Participant.id == participant_video_association.c.participant_id
+    ).join(
+        Session, Session.id == Participant.session_id
+    ).filter(Session.project_id == project_id).distinct().order_by(Video.id)
+    for video in query.yield_per(1000):
+        yield {
+            "video_id": video.id,
+            "video_token": video.token,
+            "filename": video.filename,
+            "name": video.name,
+            "duration": video.duration,
+            "frame_rate": video.frame_rate,
+            "content_hash": video.content_hash
+        }
+
+def iter_project_participants(project_id):
+    """
+    Yield every participant of a project along with their video assignments.
+    """
+    assignments = {}
+    association_rows = db.session.query(participant_video_association).join(
+        Participant, Participant.id == participant_video_association.c.participant_id
+    ).join(
+        Session, Session.id == Participant.session_id
+    ).filter(Session.project_id == project_id)
+    for row in association_rows:
+        assignments.setdefault(row.participant_id, []).append({"video_id": row.video_id, "order": row.order, "owner": row.owner})
+
+    query = db.session.query(Participant).join(Session, Session.id == Participant.session_id).filter(Session.project_id == project_id).order_by(Participant.id)
+    for participant in query.yield_per(1000):
+        yield {
+            "participant_internal_id": participant.id,
+            "participant_external_id": participant.name,
+            "participant_token": participant.token,
+            "session_id": participant.session_id,
+            "has_accessed": participant.has_accessed,
+            "last_accessed": participant.last_accessed,
+            "has_submitted": participant.has_submitted,
+            "videos": assignments.get(participant.id, [])
+        }
+
+class _ArchiveWriter(object):
+    """
+    Adds files from disk to a zip or tar.gz archive under a given name.
+    """
+
+    def __init__(self, path, export_format):
+        if export_format == 'zip':
+            self._archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED, allowZip64=True)
+        else:
+            self._archive = tarfile.open(path, 'w:gz')
+        self._format = export_format
+
+    def add(self, source_path, name):
+        if self._format == 'zip':
+            self._archive.write(source_path, name)
+        else:
+            self._archive.add(source_path, arcname=name)
+
+    def close(self):
+        self._archive.close()
+
+def write_project_archive(project, archive_path, export_format):
+    """
+    Build a project archive on disk, one file at a time.
+
+    The archive holds `videos.ndjson`, `participants.ndjson`, one `sessions/session-<id>.ndjson` file of annotations
+    per session, and a `manifest.json` describing the project, its sessions and every file in the archive.
+
+    Parameters:
+    - project (Project): The project to export.
+    - archive_path (str): The path of the archive to write.
+    - export_format (str): The archive format ('zip' or 'tar.gz').
+    """
+    manifest = {
+        "format_version": EXPORT_FORMAT_VERSION,
+        "generated_at": datetime.datetime.utcnow().isoformat(),
+        "project": {
+            "project_id": project.id,
+            "project_token": project.token,
+            "name": project.name,
+            "description": project.description,
+            "settings": project.settings.to_dict() if project.settings else None
+        },
+        "sessions": [],
+        "files": {}
+    }
+
+    archive = _ArchiveWriter(archive_path, export_format)
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(archive_path)) as work_folder_path:
+        def add_ndjson(name, rows):
+            file_path = os.path.join(work_folder_path, os.path.basename(name))
+            count = write_ndjson(file_path, rows)
+            archive.add(file_path, name)
+            os.remove(file_path)
+            manifest["files"][name] = {"rows": count}
+            return count
+
+        try:
+            add_ndjson('videos.ndjson', iter_project_videos(project.id))
+            add_ndjson('participants.ndjson', iter_project_participants(project.id))
+
+            for session in project.sessions.order_by(Session.id):
+                name = f"sessions/session-{session.id}.ndjson"
+                if session.archive_path:
+                    rows = iter_packed_annotations(session.archive_path)
+                else:
+                    rows = iter_session_annotations(session.id)
+                count = add_ndjson(name, rows)
+                manifest["sessions"].append({
+                    "session_id": session.id,
+                    "session_token": session.token,
+                    "description": session.description,
+                    "status": session.status,
+                    "created_at": session.created_at,
+                    "annotations": count,
+                    "file": name
+                })
+                current_app.logger.debug(f"Exported {count} annotations for session ID: {session.id}")
+
+            manifest_path = os.path.join(work_folder_path, 'manifest.json')
+            with open(manifest_path, 'wb') as manifest_file:
+                manifest_file.write(dumps(manifest, default=_to_json, indent=True))
+            archive.add(manifest_path, 'manifest.json')
+        finally:
+            archive.close()
+
+def build_export(export_id):
+    """
+    Build the archive of a queued export. Runs in the export worker pool.
+
+    Parameters:
+    - export_id (int): The ID of the export.
+    """
+    export = Export.query.get(export_id)
+    if not export:
+        return
+    export.status = 'running'
+    db.session.commit()
+
+    EXPORTS_FOLDER_PATH = current_app.config.get('EXPORTS_FOLDER_PATH')
+    archive_path = os.path.join(EXPORTS_FOLDER_PATH, export.filename)
+    temp_path = f"{archive_path}.part"
+    try:
+        if not os.path.exists(EXPORTS_FOLDER_PATH):
+            os.makedirs(EXPORTS_FOLDER_PATH)
+        current_app.logger.info(f"Building export {export.token} of project ID: {export.project_id}")
+        write_project_archive(Project.query.get(export.project_id), temp_path, export.format)
+        os.replace(temp_path, archive_path)
+        export.filepath = archive_path
+        export.status = 'ready'
+        current_app.logger.info(f"Export {export.token} of project ID: {export.project_id} is ready")
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.error(f"Error building export {export.token}: {e}", exc_info=True)
+        export.status = 'failed'
+        export.error = str(e)[:255]
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+    db.session.commit()
+
+def create_export(project, export_format='zip'):
+    """
+    Queue an export of a whole project into a single compressed archive.
+
+    Parameters:
+    - project (Project): The project to export.
+    - export_format (str): The archive format ('zip' or 'tar.gz').
+
+    Returns:
+    - Export: The queued export.
+
+    Raises:
+    - ValueError: If the format is not supported.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError('Invalid export format.')
+    export = Export(project_id=project.id, format=export_format)
+    export.tokenize()
+    db.session.add(export)
+    db.session.commit()
+
+    submit_job('export', current_app.config.get('EXPORT_WORKERS', 1), build_export, export.id)
+    return export
@@ -0,0 +1,56 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from ..extensions import db
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def get_executor(name, max_workers):
+    """
+    Get a named, bounded worker pool, creating it on first use.
+
+    Parameters:
+    - name (str): The name of the pool (e.g., 'transcode', 'export').
+    - max_workers (int): The maximum number of concurrent jobs in the pool.
+
+    Returns:
+    - ThreadPoolExecutor: The worker pool.
+    """
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        return _executors[name]
+
+def _run_job(app, name, function, args, kwargs):
+    """
+    Run a job inside an application context, logging any error and releasing the database session afterwards.
+    """
+    with app.app_context():
+        try:
+            return function(*args, **kwargs)
+        except Exception as e:
+            current_app.logger.error(f"Error running {name} job {function.__name__}: {e}", exc_info=True)
+            raise
+        finally:
+            db.session.remove()
+
+def submit_job(name, max_workers, function, *args, **kwargs):
+    """
+    Queue a function to run in a named, bounded worker pool, inside the current application's context.
+
+    Parameters:
+    - name (str): The name of the pool (e.g., 'transcode', 'export').
+    - max_workers (int): The maximum number of concurrent jobs in the pool.
+    - function (callable): The job to run.
+    - *args, **kwargs: The arguments to call the job with.
+
+    Returns:
+    - Future: The queued job.
+    """
+    app = current_app._get_current_object()
+    current_app.logger.debug(f"Queueing {name} job {function.__name__}")
+    return get_executor(name, max_workers).submit(_run_job, app, name, function, args, kwargs)
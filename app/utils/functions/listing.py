@@ -0,0 +1,133 @@
+import datetime
+
+from sqlalchemy import Integer, func
+
+from ...models import Participant, Preset, Project, Session
+from ..extensions import db
+
+SESSION_STATUSES = ('active', 'archived')
+SUBMISSION_STATES = ('pending', 'in_progress', 'complete')
+
+
+def parse_date_arg(value):
+    """
+    Parse a date filter from a query string argument.
+
+    Parameters:
+    - value (str): The date, formatted as YYYY-MM-DD.
+
+    Returns:
+    - datetime: The start of the given day, or None if the value is missing or invalid.
+    """
+    try:
+        return datetime.datetime.strptime(value, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return None
+
+def filter_created(query, model, since=None, until=None):
+    """
+    Restrict a query to rows created within a date range.
+
+    Parameters:
+    - query (Query): The query to filter.
+    - model (db.Model): The model whose creation date is filtered on.
+    - since (datetime): The first day to include.
+    - until (datetime): The last day to include.
+
+    Returns:
+    - Query: The filtered query.
+    """
+    if since:
+        query = query.filter(model.created_at >= since)
+    if until:
+        query = query.filter(model.created_at < until + datetime.timedelta(days=1))
+    return query
+
+def keyset_paginate(query, key_column, cursor=None, per_page=20, get_key=lambda item: item.id):
+    """
+    Fetch one page of a query in descending key order, starting after a cursor.
+
+    Unlike offset pagination, every page costs the same to fetch however far into the listing it is, since
+    the database seeks straight to the cursor along the key's index.
+
+    Parameters:
+    - query (Query): The query to paginate.
+    - key_column (Column): The unique, indexed column to paginate on.
+    - cursor (int): The key of the last item on the previous page, or None for the first page.
+    - per_page (int): The number of items per page.
+    - get_key (callable): Gets the key of an item returned by the query.
+
+    Returns:
+    - tuple: The items on the page, and the cursor of the next page or None if this is the last page.
+    """
+    if cursor is not None:
+        query = query.filter(key_column < cursor)
+    items = query.order_by(key_column.desc()).limit(per_page + 1).all()
+    if len(items) > per_page:
+        items = items[:per_page]
+        return items, get_key(items[-1])
+    return items, None
+
+def get_project_listing(researcher, cursor=None, per_page=20, since=None, until=None):
+    """
+    Get one page of a researcher's projects, newest first.
+
+    Returns:
+    - tuple: The projects on the page, and the cursor of the next page.
+    """
+    query = filter_created(Project.query.filter(Project.researcher_id == researcher.id), Project, since, until)
+    return keyset_paginate(query, Project.id, cursor, per_page)
+
+def get_preset_listing(researcher, cursor=None, per_page=20):
+    """
+    Get one page of a researcher's presets, newest first.
+
+    Returns:
+    - tuple: The presets on the page, and the cursor of the next page.
+    """
+    return keyset_paginate(Preset.query.filter(Preset.researcher_id == researcher.id), Preset.id, cursor, per_page)
+
+def get_session_listing(project_id, cursor=None, per_page=20, status=None, submission=None, since=None, until=None):
+    """
+    Get one page of a project's sessions, newest first, with participant counts computed in SQL.
+
+    Parameters:
+    - project_id (int): The ID of the project.
+    - cursor (int): The ID of the last session on the previous page.
+    - per_page (int): The number of sessions per page.
+    - status (str): Only include sessions with this status ('active' or 'archived').
+    - submission (str): Only include sessions in this submission state: 'pending' if no participant has joined,
+      'complete' if every participant has submitted, and 'in_progress' otherwise.
+    - since (datetime): Only include sessions created on or after this day.
+    - until (datetime): Only include sessions created on or before this day.
+
+    Returns:
+    - tuple: A list of (session, participants, accessed, submitted) tuples, and the cursor of the next page.
+    """
+    counts = db.session.query(
+        Participant.session_id.label('session_id'),
+        func.count(Participant.id).label('participants'),
+        func.sum(Participant.has_accessed.cast(Integer)).label('accessed'),
+        func.sum(Participant.has_submitted.cast(Integer)).label('submitted')
+    ).join(Session, Session.id == Participant.session_id).filter(
+        Session.project_id == project_id
+    ).group_by(Participant.session_id).subquery()
+
+    participants = func.coalesce(counts.c.participants, 0)
+    accessed = func.coalesce(counts.c.accessed, 0)
+    submitted = func.coalesce(counts.c.submitted, 0)
+    query = db.session.query(Session, participants, accessed, submitted).outerjoin(
+        counts, counts.c.session_id == Session.id
+    ).filter(Session.project_id == project_id)
+
+    if status in SESSION_STATUSES:
+        query = query.filter(Session.status == status)
+    if submission == 'pending':
+        query = query.filter(accessed == 0)
+    elif submission == 'complete':
+        query = query.filter(participants > 0, submitted == participants)
+    elif submission == 'in_progress':
+        query = query.filter(accessed > 0, submitted < participants)
+    query = filter_created(query, Session, since, until)
+
+    return keyset_paginate(query, Session.id, cursor, per_page, get_key=lambda row: row[0].id)
@@ -0,0 +1,64 @@
+import atexit
+import logging
+import logging.handlers
+import queue
+
+
+class PayloadSummary(object):
+    """
+    A log argument standing in for a request payload. It is only rendered if the record is actually emitted, and
+    then as a short summary of the payload's shape rather than its body.
+    """
+
+    def __init__(self, payload, limit=200):
+        self.payload = payload
+        self.limit = limit
+
+    def __str__(self):
+        return summarize_payload(self.payload, self.limit)
+
+
+def summarize_payload(payload, limit=200, depth=3):
+    """
+    Summarize a JSON payload for logging, replacing lists with their lengths and capping the result's size.
+
+    Parameters:
+    - payload (obj): The payload.
+    - limit (int): The maximum length of the summary, in characters.
+    - depth (int): The number of nested objects to describe before summarizing them by their size.
+
+    Returns:
+    - str: The summary.
+    """
+    def describe(value, depth):
+        if isinstance(value, dict):
+            if depth <= 0:
+                return f"<{len(value)} keys>"
+            return '{' + ', '.join(f"{key}: {describe(item, depth - 1)}" for key, item in value.items()) + '}'
+        if isinstance(value, (list, tuple)):
+            return f"<{len(value)} items>"
+        if isinstance(value, str) and len(value) > 40:
+            return repr(value[:40] + '...')
+        return repr(value)
+
+    summary = describe(payload, depth)
+    if len(summary) > limit:
+        summary = f"{summary[:limit]}... ({len(summary)} characters)"
+    return summary
+
+def start_log_listener(*handlers):
+    """
+    Move log handlers off the request path: records are put on an in-memory queue by the returned handler and
+    written out by a background listener thread, which is stopped, flushing any queued records, on exit.
+
+    Parameters:
+    - handlers (Handler): The handlers writing the records out.
+
+    Returns:
+    - QueueHandler: The handler to attach to loggers in place of the given handlers.
+    """
+    log_queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return logging.handlers.QueueHandler(log_queue)
@@ -0,0 +1,252 @@
+import datetime
+import json
+import threading
+import time
+
+from flask import current_app
+from sqlalchemy import bindparam, func, update
+
+from ...models import Annotation, Participant
+from ..extensions import db
+from .jobs import submit_job
+
+
+class ChangeFeed(object):
+    """
+    A small per-process feed of change counters keyed by ID, which watchers can block on until something changes.
+    """
+
+    def __init__(self):
+        self._versions = {}
+        self._condition = threading.Condition()
+
+    def version(self, key):
+        """
+        Get the current change counter of a key.
+
+        Parameters:
+        - key (hashable): The key.
+
+        Returns:
+        - int: The change counter.
+        """
+        with self._condition:
+            return self._versions.get(key, 0)
+
+    def notify(self, key):
+        """
+        Record a change to a key and wake every watcher.
+
+        Parameters:
+        - key (hashable): The key that changed.
+        """
+        with self._condition:
+            self._versions[key] = self._versions.get(key, 0) + 1
+            self._condition.notify_all()
+
+    def wait(self, key, version, timeout):
+        """
+        Block until a key changes past a known counter, or the timeout expires.
+
+        Parameters:
+        - key (hashable): The key to watch.
+        - version (int): The last counter seen by the watcher.
+        - timeout (float): The maximum time to wait, in seconds.
+
+        Returns:
+        - int: The current change counter.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self._versions.get(key, 0) != version, timeout)
+            return self._versions.get(key, 0)
+
+
+class HeartbeatBuffer(object):
+    """
+    Coalesces participant heartbeats in memory, keeping only the latest one per participant until they are
+    flushed to the database in a single batch.
+    """
+
+    def __init__(self):
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._scheduled = False
+
+    def record(self, participant_id, heartbeat):
+        """
+        Buffer the latest heartbeat of a participant.
+
+        Parameters:
+        - participant_id (int): The ID of the participant.
+        - heartbeat (dict): The participant's progress.
+
+        Returns:
+        - bool: True if no flush is scheduled yet, in which case the caller should schedule one.
+        """
+        with self._lock:
+            self._pending[participant_id] = heartbeat
+            schedule = not self._scheduled
+            self._scheduled = True
+            return schedule
+
+    def discard(self, participant_id):
+        """
+        Drop the buffered heartbeat of a participant, e.g. once they have submitted.
+
+        Parameters:
+        - participant_id (int): The ID of the participant.
+        """
+        with self._lock:
+            self._pending.pop(participant_id, None)
+
+    def drain(self):
+        """
+        Take every buffered heartbeat, leaving the buffer empty.
+
+        Returns:
+        - list: The buffered heartbeats.
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._scheduled = False
+            return list(pending.values())
+
+
+session_feed = ChangeFeed()
+heartbeat_buffer = HeartbeatBuffer()
+
+
+def notify_session_changed(session_id):
+    """
+    Wake every researcher monitoring a session, after one of its participants has changed.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+    """
+    session_feed.notify(session_id)
+
+def record_heartbeat(participant_id, session_id, progress, video_id=None):
+    """
+    Buffer a participant's progress, scheduling a batched flush to the database if none is pending.
+
+    Parameters:
+    - participant_id (int): The ID of the participant.
+    - session_id (int): The ID of the participant's session.
+    - progress (float): The participant's progress through their videos, between 0 and 100.
+    - video_id (int): The ID of the video the participant is watching.
+    """
+    heartbeat = {
+        "participant_id": participant_id,
+        "session_id": session_id,
+        "progress_value": progress,
+        "video_id": video_id,
+        "accessed_at": datetime.datetime.utcnow()
+    }
+    if heartbeat_buffer.record(participant_id, heartbeat):
+        submit_job('heartbeat', 1, flush_heartbeats, current_app.config.get('HEARTBEAT_FLUSH_SECONDS', 5))
+
+def flush_heartbeats(delay=0):
+    """
+    Write every buffered heartbeat to the database in a single batched update, then wake anyone monitoring the
+    affected sessions.
+
+    Parameters:
+    - delay (float): The time to wait before flushing, in seconds, letting heartbeats accumulate.
+
+    Returns:
+    - int: The number of participants updated.
+    """
+    if delay:
+        time.sleep(delay)
+    heartbeats = heartbeat_buffer.drain()
+    if not heartbeats:
+        return 0
+    # Heartbeats racing a submission must not wind a submitted participant's progress back.
+    statement = update(Participant.__table__).where(
+        Participant.__table__.c.id == bindparam('participant_id'), Participant.__table__.c.has_submitted.is_(False)
+    ).values(
+        progress=bindparam('progress_value'),
+        current_video_id=bindparam('video_id'),
+        last_accessed=bindparam('accessed_at')
+    )
+    db.session.execute(statement, heartbeats)
+    db.session.commit()
+    for session_id in {heartbeat["session_id"] for heartbeat in heartbeats}:
+        notify_session_changed(session_id)
+    current_app.logger.debug("Flushed %s participant heartbeats", len(heartbeats))
+    return len(heartbeats)
+
+def get_session_progress(session_id):
+    """
+    Get the status and annotation count of every participant in a session, in a single aggregate query.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+
+    Returns:
+    - dict: A mapping from participant ID to the participant's progress.
+    """
+    rows = db.session.query(
+        Participant.id, Participant.has_accessed, Participant.has_submitted, Participant.last_accessed,
+        Participant.progress, Participant.current_video_id, func.count(Annotation.id)
+    ).outerjoin(Annotation, Annotation.participant_id == Participant.id).filter(
+        Participant.session_id == session_id
+    ).group_by(Participant.id)
+    return {
+        participant_id: {
+            "participant_id": participant_id,
+            "has_accessed": has_accessed,
+            "has_submitted": has_submitted,
+            "last_accessed": last_accessed.isoformat() if last_accessed else None,
+            "progress": progress,
+            "current_video_id": current_video_id,
+            "annotations": annotations
+        }
+        for participant_id, has_accessed, has_submitted, last_accessed, progress, current_video_id, annotations in rows
+    }
+
+def format_event(event, data):
+    """
+    Format a Server-Sent Event.
+
+    Parameters:
+    - event (str): The event name.
+    - data (obj): The event payload, serialized as JSON.
+
+    Returns:
+    - str: The event, ready to be written to the stream.
+    """
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stream_session_progress(session_id, poll_seconds=15):
+    """
+    Stream the progress of a session's participants as Server-Sent Events.
+
+    A `snapshot` event carries every participant on connect; afterwards, `progress` events carry only the
+    participants that changed. The stream wakes as soon as this process records a change and otherwise re-checks
+    every `poll_seconds`, so that changes recorded by other processes are picked up too. No database connection is
+    held while waiting.
+
+    Parameters:
+    - session_id (int): The ID of the session.
+    - poll_seconds (float): The maximum time between checks, in seconds.
+
+    Returns:
+    - generator: Yields the events.
+    """
+    version = session_feed.version(session_id)
+    progress = get_session_progress(session_id)
+    db.session.remove()
+    yield f"retry: {int(poll_seconds * 1000)}\n"
+    yield format_event('snapshot', list(progress.values()))
+
+    while True:
+        version = session_feed.wait(session_id, version, poll_seconds)
+        latest = get_session_progress(session_id)
+        db.session.remove()
+        changed = [entry for participant_id, entry in latest.items() if progress.get(participant_id) != entry]
+        progress = latest
+        if changed:
+            yield format_event('progress', changed)
+        else:
+            yield ": keepalive\n\n"
@@ -0,0 +1,233 @@
+import csv
+import io
+import random
+import uuid
+
+from flask import current_app, url_for
+
+from ...models import (Participant, Session, Video,
+                       participant_video_association)
+from ..extensions import db
+
+ROSTER_COLUMNS = ('session', 'participant', 'video')
+JOIN_LINK_COLUMNS = ('session_id', 'session_token', 'participant_id', 'participant', 'participant_token', 'join_link')
+
+
+def parse_roster(roster_file):
+    """
+    Parse a roster CSV into sessions of participants.
+
+    The roster has a header row with the columns `session`, `participant` and, optionally, `video`. Rows sharing
+    a `session` label are grouped into one session. The `video` column names the library video (by ID, token or
+    name) a participant owns in coupled projects; in decoupled projects it may list several videos separated by
+    semicolons, and the session is assigned every video listed across its rows.
+
+    Parameters:
+    - roster_file (file-like): The roster CSV, as text.
+
+    Returns:
+    - list: A list of (session label, list of (participant name, list of video references)) tuples, in roster order.
+
+    Raises:
+    - ValueError: If the roster is missing required columns or values.
+    """
+    reader = csv.DictReader(roster_file)
+    if not reader.fieldnames or not {'session', 'participant'} <= {name.strip().lower() for name in reader.fieldnames}:
+        raise ValueError(f"Roster must have a header row with the columns: {', '.join(ROSTER_COLUMNS)}")
+
+    sessions = {}
+    for line_number, row in enumerate(reader, start=2):
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in row.items()}
+        if not row.get('session') or not row.get('participant'):
+            raise ValueError(f"Line {line_number}: session and participant are required.")
+        videos = [video for video in row.get('video', '').split(';') if video.strip()]
+        sessions.setdefault(row['session'], []).append((row['participant'], [video.strip() for video in videos]))
+    return list(sessions.items())
+
+def resolve_library_videos(researcher, references):
+    """
+    Resolve references to library videos by ID, token or name in a single query.
+
+    Parameters:
+    - researcher (Researcher): The researcher whose library to look in.
+    - references (iterable): The video references.
+
+    Returns:
+    - dict: A mapping from each reference to its video.
+
+    Raises:
+    - ValueError: If a reference does not match a video in the researcher's library.
+    """
+    lookup = {}
+    for video in Video.query.filter_by(researcher_id=researcher.id):
+        for key in (str(video.id), video.token, video.name):
+            if key:
+                lookup.setdefault(key, video)
+
+    resolved = {}
+    for reference in references:
+        if reference not in lookup:
+            raise ValueError(f"Video '{reference}' is not in your library.")
+        resolved[reference] = lookup[reference]
+    return resolved
+
+def generate_tokens(model, count):
+    """
+    Generate a batch of unique tokens for a model, checking for collisions in a single query per round.
+
+    Parameters:
+    - model (db.Model): The model for which the tokens are generated.
+    - count (int): The number of tokens to generate.
+
+    Returns:
+    - list: The unique tokens.
+    """
+    tokens = set()
+    while len(tokens) < count:
+        candidates = list({str(uuid.uuid4()).replace('-', '')[:7] for _ in range(count - len(tokens))} - tokens)
+        taken = set()
+        for start in range(0, len(candidates), 500):
+            taken.update(row[0] for row in db.session.query(model.token).filter(model.token.in_(candidates[start:start + 500])))
+        tokens.update(token for token in candidates if token not in taken)
+    return list(tokens)
+
+def build_associations(participant_ids, owned_videos, session_videos, coupling, ordering):
+    """
+    Build the participant-video association rows for one session, following the same rules as
+    `assign_and_order_videos`.
+
+    Parameters:
+    - participant_ids (list): The IDs of the session's participants.
+    - owned_videos (list): The video each participant owns in a coupled session, in participant order.
+    - session_videos (list): Every video assigned in the session.
+    - coupling (str): The coupling condition ("coupled" or other).
+    - ordering (str): The ordering condition ("random" or other).
+
+    Returns:
+    - list: A list of association rows.
+    """
+    rows = []
+    for index, participant_id in enumerate(participant_ids):
+        owned_video = owned_videos[index] if coupling == "coupled" else None
+        viewed_videos = [video for video in session_videos if video is not owned_video]
+        if ordering == "random":
+            random.shuffle(viewed_videos)
+        if owned_video is not None:
+            rows.append({'participant_id': participant_id, 'video_id': owned_video.id, 'order': None, 'owner': True})
+        for order, video in enumerate(viewed_videos, start=1):
+            rows.append({
+                'participant_id': participant_id,
+                'video_id': video.id,
+                'order': order if ordering == "random" else None,
+                'owner': False
+            })
+    return rows
+
+def provision_sessions(project, roster, default_videos=None, batch_size=500):
+    """
+    Create sessions, participants, tokens and video associations for a project from a parsed roster,
+    in batched transactions.
+
+    Parameters:
+    - project (Project): The project to provision.
+    - roster (list): The parsed roster, as returned by `parse_roster`.
+    - default_videos (list): Library video references assigned to decoupled sessions whose rows list none.
+    - batch_size (int): The number of sessions created per transaction.
+
+    Returns:
+    - list: One dictionary per participant with the session and participant IDs and tokens, and the join path.
+
+    Raises:
+    - ValueError: If the roster references unknown videos or is incomplete for the project's coupling.
+    """
+    project_id = project.id
+    coupling = project.settings.coupling
+    ordering = project.settings.ordering
+    default_videos = default_videos or []
+
+    references = {reference for _, participants in roster for _, videos in participants for reference in videos}
+    videos = resolve_library_videos(project.researcher, references | set(default_videos))
+
+    plans = []
+    for label, participants in roster:
+        if coupling == "coupled":
+            if any(len(participant_videos) != 1 for _, participant_videos in participants):
+                raise ValueError(f"Session '{label}': every participant in a coupled project needs exactly one video.")
+            owned_videos = [videos[participant_videos[0]] for _, participant_videos in participants]
+            session_videos = list(dict.fromkeys(owned_videos))
+        else:
+            owned_videos = []
+            session_references = [reference for _, participant_videos in participants for reference in participant_videos] or default_videos
+            if not session_references:
+                raise ValueError(f"Session '{label}': no videos were given.")
+            session_videos = list(dict.fromkeys(videos[reference] for reference in session_references))
+        plans.append((label, participants, owned_videos, session_videos))
+
+    join_path = url_for('participant.join_session', token='TOKEN')
+    results = []
+    for start in range(0, len(plans), batch_size):
+        batch = plans[start:start + batch_size]
+        try:
+            session_tokens = generate_tokens(Session, len(batch))
+            participant_tokens = iter(generate_tokens(Participant, sum(len(plan[1]) for plan in batch)))
+
+            sessions = [Session(project_id=project_id, description=label, token=token) for (label, _, _, _), token in zip(batch, session_tokens)]
+            db.session.add_all(sessions)
+            db.session.flush()
+
+            participant_batches = []
+            for session, (_, participants, _, _) in zip(sessions, batch):
+                session_participants = [Participant(session_id=session.id, name=name, token=next(participant_tokens)) for name, _ in participants]
+                participant_batches.append(session_participants)
+            db.session.add_all([participant for session_participants in participant_batches for participant in session_participants])
+            db.session.flush()
+
+            association_rows = []
+            for session_participants, (_, _, owned_videos, session_videos) in zip(participant_batches, batch):
+                association_rows.extend(build_associations([participant.id for participant in session_participants], owned_videos, session_videos, coupling, ordering))
+            if association_rows:
+                db.session.execute(participant_video_association.insert(), association_rows)
+
+            batch_results = [
+                {
+                    'session_id': session.id,
+                    'session_token': session.token,
+                    'participant_id': participant.id,
+                    'participant': participant.name,
+                    'participant_token': participant.token,
+                    'join_link': join_path.replace('TOKEN', participant.token)
+                }
+                for session, session_participants in zip(sessions, participant_batches)
+                for participant in session_participants
+            ]
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            current_app.logger.error(f"Error provisioning sessions {start + 1} to {start + len(batch)} for project ID: {project_id}", exc_info=True)
+            raise
+
+        results.extend(batch_results)
+        for instance in sessions + [participant for session_participants in participant_batches for participant in session_participants]:
+            db.session.expunge(instance)
+        current_app.logger.info(f"Provisioned sessions {start + 1} to {start + len(batch)} of {len(plans)} for project ID: {project_id}")
+
+    return results
+
+def join_links_to_csv(results, base_url=''):
+    """
+    Serialize provisioned participants to a CSV of join links.
+
+    Parameters:
+    - results (list): The participants, as returned by `provision_sessions`.
+    - base_url (str): The scheme and host to prefix each join path with.
+
+    Returns:
+    - str: The CSV.
+    """
+    output = io.StringIO()
+    writer = csv.DictWriter(output, fieldnames=JOIN_LINK_COLUMNS)
+    writer.writeheader()
+    base_url = base_url.rstrip('/')
+    for result in results:
+        writer.writerow({**result, 'join_link': f"{base_url}{result['join_link']}"})
+    return output.getvalue()
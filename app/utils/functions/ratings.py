@@ -0,0 +1,137 @@
+from sqlalchemy import or_, select
+
+from ...models import (Annotation, Participant, Project, Session, Video,
+                       participant_video_association)
+from ..extensions import db
+from .archive import iter_packed_annotations
+
+
+def get_researcher_videos(researcher_id):
+    """
+    Build a filter matching the videos a researcher can see: those in their library, and those assigned to
+    participants in their projects.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+
+    Returns:
+    - ColumnElement: The filter.
+    """
+    used = select(participant_video_association.c.video_id).join(
+        Participant, Participant.id == participant_video_association.c.participant_id
+    ).join(Session, Session.id == Participant.session_id).join(Project, Project.id == Session.project_id).where(
+        Project.researcher_id == researcher_id
+    )
+    return or_(Video.researcher_id == researcher_id, Video.id.in_(used))
+
+def resolve_stimulus(researcher_id, key):
+    """
+    Find a stimulus by the token or content hash of one of its videos, among the videos a researcher can see.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    - key (str): The token or SHA-256 content hash of a video.
+
+    Returns:
+    - tuple: The video, and the IDs of every video of the researcher's with the same contents, or (None, []) if
+      none of their videos match.
+    """
+    visible = get_researcher_videos(researcher_id)
+    video = Video.query.filter(or_(Video.token == key, Video.content_hash == key), visible).order_by(Video.id).first()
+    if not video:
+        return None, []
+    if not video.content_hash:
+        return video, [video.id]
+    return video, [row[0] for row in db.session.query(Video.id).filter(Video.content_hash == video.content_hash, visible).order_by(Video.id)]
+
+def get_stimulus_raters(researcher_id, video_ids):
+    """
+    Get the participants assigned a stimulus across every session and project a researcher owns.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    - video_ids (list): The IDs of the stimulus' videos.
+
+    Returns:
+    - dict: A mapping from participant ID to a row of the participant's name, session ID, project ID and the
+      session's packed annotations, if archived.
+    """
+    assigned = select(participant_video_association.c.participant_id).where(participant_video_association.c.video_id.in_(video_ids))
+    query = db.session.query(
+        Participant.id, Participant.name, Participant.session_id, Session.project_id, Session.archive_path
+    ).join(Session, Session.id == Participant.session_id).join(Project, Project.id == Session.project_id).filter(
+        Project.researcher_id == researcher_id, Participant.id.in_(assigned)
+    )
+    return {row.id: row for row in query}
+
+def get_stimulus_ratings(researcher_id, key):
+    """
+    Get every rating collected for a stimulus, across all the sessions and projects a researcher owns, as one
+    columnar trace per rater and video.
+
+    Live annotations are read straight from the index on (video, participant, timecode), in index order, rather
+    than session by session; those of archived sessions are read from cold storage.
+
+    Parameters:
+    - researcher_id (int): The ID of the researcher.
+    - key (str): The token or SHA-256 content hash of one of the stimulus' videos.
+
+    Returns:
+    - dict: The stimulus and its traces, or None if none of the researcher's videos match.
+    """
+    video, video_ids = resolve_stimulus(researcher_id, key)
+    if not video:
+        return None
+    raters = get_stimulus_raters(researcher_id, video_ids)
+
+    traces = {}
+    def add(participant_id, video_id, timecode, slider_position, trigger):
+        trace = traces.get((participant_id, video_id))
+        if trace is None:
+            rater = raters[participant_id]
+            trace = traces[(participant_id, video_id)] = {
+                "project_id": rater.project_id,
+                "session_id": rater.session_id,
+                "participant_id": participant_id,
+                "participant_name": rater.name,
+                "video_id": video_id,
+                "archived": bool(rater.archive_path),
+                "timecode": [],
+                "slider_position": [],
+                "trigger": []
+            }
+        trace["timecode"].append(timecode)
+        trace["slider_position"].append(slider_position)
+        trace["trigger"].append(trigger)
+
+    if raters:
+        owned_participants = select(Participant.id).join(Session, Session.id == Participant.session_id).join(
+            Project, Project.id == Session.project_id
+        ).where(Project.researcher_id == researcher_id)
+        query = db.session.query(
+            Annotation.participant_id, Annotation.video_id, Annotation.timecode, Annotation.slider_position, Annotation.trigger
+        ).filter(
+            Annotation.video_id.in_(video_ids), Annotation.participant_id.in_(owned_participants)
+        ).order_by(Annotation.video_id, Annotation.participant_id, Annotation.timecode)
+        for row in query.yield_per(5000):
+            add(*row)
+
+    wanted_videos = set(video_ids)
+    for archive_path in sorted({rater.archive_path for rater in raters.values() if rater.archive_path}):
+        for row in iter_packed_annotations(archive_path):
+            if row["video_id"] in wanted_videos and row["participant_id"] in raters:
+                add(row["participant_id"], row["video_id"], row["timecode"], row["slider_position"], row["trigger"])
+
+    return {
+        "stimulus": {
+            "video_token": video.token,
+            "name": video.name,
+            "filename": video.filename,
+            "content_hash": video.content_hash,
+            "duration": video.duration,
+            "frame_rate": video.frame_rate,
+            "video_ids": video_ids
+        },
+        "raters": len({participant_id for participant_id, _ in traces}),
+        "traces": [traces[trace_key] for trace_key in sorted(traces, key=lambda trace_key: (trace_key[1], trace_key[0]))]
+    }
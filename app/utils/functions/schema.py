@@ -0,0 +1,69 @@
+from flask import current_app
+from sqlalchemy import inspect, literal
+
+
+def add_missing_columns(engine, metadata):
+    """
+    Add the columns introduced since a database was created to its existing tables, which `create_all` skips.
+
+    Columns are added as nullable unless they have a scalar default to fill existing rows with, and without their
+    foreign key constraints, which most databases cannot add to an existing table.
+
+    Parameters:
+    - engine (Engine): The database engine.
+    - metadata (MetaData): The app's tables.
+
+    Returns:
+    - list: The added columns, as 'table.column' strings.
+    """
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+    added = []
+    with engine.begin() as connection:
+        for table in metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+            existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                if hasattr(column.type, 'create'):
+                    column.type.create(connection, checkfirst=True)
+                ddl = f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN {preparer.format_column(column)} {column.type.compile(dialect=engine.dialect)}"
+                if column.default is not None and column.default.is_scalar:
+                    default = literal(column.default.arg, column.type).compile(dialect=engine.dialect, compile_kwargs={'literal_binds': True})
+                    ddl += f" DEFAULT {default}"
+                    if not column.nullable:
+                        ddl += " NOT NULL"
+                connection.exec_driver_sql(ddl)
+                added.append(f"{table.name}.{column.name}")
+    if added:
+        current_app.logger.info("Added columns to existing tables: %s", ', '.join(added))
+    return added
+
+def add_missing_indexes(engine, metadata):
+    """
+    Create the indexes introduced since a database was created on its existing tables, which `create_all` skips.
+
+    Indexes on columns the table does not have are skipped rather than failing startup.
+
+    Parameters:
+    - engine (Engine): The database engine.
+    - metadata (MetaData): The app's tables.
+
+    Returns:
+    - list: The names of the indexes in place.
+    """
+    inspector = inspect(engine)
+    created = []
+    for table in metadata.sorted_tables:
+        existing_columns = {column['name'] for column in inspector.get_columns(table.name)}
+        for index in table.indexes:
+            missing_columns = [column.name for column in index.columns if column.name not in existing_columns]
+            if missing_columns:
+                current_app.logger.warning("Skipping index %s: table %s has no column %s", index.name, table.name, ', '.join(missing_columns))
+                continue
+            index.create(engine, checkfirst=True)
+            created.append(index.name)
+    return created
@@ -0,0 +1,307 @@
+import mimetypes
+import os
+import shutil
+
+import ffmpeg
+from flask import current_app
+
+from .cache import invalidate_annotator_cache
+from .jobs import submit_job
+
+RENDITIONS = ('h264', 'faststart')
+HLS_PLAYLIST = 'index.m3u8'
+PREVIEWS = ('thumbnail', 'sprite')
+
+
+def get_rendition_path(video_path, rendition):
+    """
+    Get the path of a streaming rendition of a video, stored next to the original.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - rendition (str): The rendition name (e.g., 'faststart', 'h264').
+
+    Returns:
+    - str: The path of the rendition.
+    """
+    base, _ = os.path.splitext(video_path)
+    return f"{base}.{rendition}.mp4"
+
+def get_hls_folder_path(video_path):
+    """
+    Get the folder holding the HLS playlist and segments of a video, stored next to the original.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - str: The path of the HLS folder.
+    """
+    base, _ = os.path.splitext(video_path)
+    return f"{base}_hls"
+
+def get_preview_path(video_path, preview):
+    """
+    Get the path of a preview image of a video, stored next to the original.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - preview (str): The preview name ('thumbnail' or 'sprite').
+
+    Returns:
+    - str: The path of the preview image.
+    """
+    base, _ = os.path.splitext(video_path)
+    return f"{base}.{preview}.jpg"
+
+def get_best_rendition(video_path):
+    """
+    Get the most streaming-friendly file available for a video.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - str: The path of the bitrate-capped H.264 rendition if present, else the faststart rendition, else the original.
+    """
+    for rendition in RENDITIONS:
+        rendition_path = get_rendition_path(video_path, rendition)
+        if os.path.exists(rendition_path):
+            return rendition_path
+    return video_path
+
+def get_video_mimetype(video_path):
+    """
+    Get the MIME type of the file that will be served for a video.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - str: The MIME type of the best available rendition.
+    """
+    best_path = get_best_rendition(video_path)
+    if best_path.endswith('.mp4'):
+        return 'video/mp4'
+    return mimetypes.guess_type(best_path)[0] or 'video/mp4'
+
+def has_hls_rendition(video_path):
+    """
+    Check whether an HLS playlist has been generated for a video.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - bool: True if the HLS playlist exists, False otherwise.
+    """
+    return os.path.exists(os.path.join(get_hls_folder_path(video_path), HLS_PLAYLIST))
+
+def delete_renditions(video_path):
+    """
+    Delete every rendition generated for a video.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    """
+    for rendition in RENDITIONS:
+        rendition_path = get_rendition_path(video_path, rendition)
+        if os.path.exists(rendition_path):
+            os.remove(rendition_path)
+    for preview in PREVIEWS:
+        preview_path = get_preview_path(video_path, preview)
+        if os.path.exists(preview_path):
+            os.remove(preview_path)
+    hls_folder_path = get_hls_folder_path(video_path)
+    if os.path.isdir(hls_folder_path):
+        shutil.rmtree(hls_folder_path)
+
+def _run_to(stream, output_path):
+    """
+    Run an ffmpeg output stream into a temporary file and move it into place once complete,
+    so that a partially written rendition is never served.
+    """
+    temp_path = f"{output_path}.part"
+    try:
+        stream.overwrite_output().run(quiet=True)
+        os.replace(temp_path, output_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+def remux_faststart(video_path):
+    """
+    Remux a video into an MP4 with its moov atom at the front, without re-encoding.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - str: The path of the faststart rendition.
+    """
+    output_path = get_rendition_path(video_path, 'faststart')
+    stream = ffmpeg.input(video_path).output(f"{output_path}.part", format='mp4', c='copy', movflags='+faststart')
+    _run_to(stream, output_path)
+    return output_path
+
+def transcode_h264(video_path, max_bitrate):
+    """
+    Transcode a video into a bitrate-capped H.264/AAC MP4 suitable for progressive streaming.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - max_bitrate (str): The maximum video bitrate (e.g., '2500k').
+
+    Returns:
+    - str: The path of the H.264 rendition.
+    """
+    output_path = get_rendition_path(video_path, 'h264')
+    stream = ffmpeg.input(video_path).output(
+        f"{output_path}.part", format='mp4', vcodec='libx264', acodec='aac', preset='veryfast',
+        maxrate=max_bitrate, bufsize=max_bitrate, pix_fmt='yuv420p', movflags='+faststart'
+    )
+    _run_to(stream, output_path)
+    return output_path
+
+def segment_hls(video_path, segment_seconds):
+    """
+    Segment the best MP4 rendition of a video into an HLS playlist, without re-encoding.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - segment_seconds (int): The target duration of each segment, in seconds.
+
+    Returns:
+    - str: The path of the HLS playlist.
+    """
+    hls_folder_path = get_hls_folder_path(video_path)
+    if not os.path.exists(hls_folder_path):
+        os.makedirs(hls_folder_path)
+    playlist_path = os.path.join(hls_folder_path, HLS_PLAYLIST)
+    stream = ffmpeg.input(get_best_rendition(video_path)).output(
+        f"{playlist_path}.part", format='hls', c='copy', hls_time=segment_seconds, hls_playlist_type='vod',
+        hls_segment_filename=os.path.join(hls_folder_path, 'segment_%05d.ts')
+    )
+    _run_to(stream, playlist_path)
+    return playlist_path
+
+def generate_thumbnail(video_path, duration, width):
+    """
+    Grab a single frame from a tenth of the way into a video, past any opening black frames, as a JPEG.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - duration (float): The duration of the video, in seconds.
+    - width (int): The width of the thumbnail, in pixels.
+
+    Returns:
+    - str: The path of the thumbnail.
+    """
+    output_path = get_preview_path(video_path, 'thumbnail')
+    stream = ffmpeg.input(video_path, ss=duration / 10).filter('scale', width, -2).output(
+        f"{output_path}.part", format='image2', vcodec='mjpeg', vframes=1, q=4
+    )
+    _run_to(stream, output_path)
+    return output_path
+
+def generate_sprite(video_path, duration, columns, rows, tile_width):
+    """
+    Lay out frames sampled evenly across a video into a single JPEG contact sheet, read row by row.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    - duration (float): The duration of the video, in seconds.
+    - columns (int): The number of frames per row.
+    - rows (int): The number of rows.
+    - tile_width (int): The width of each frame, in pixels.
+
+    Returns:
+    - str: The path of the sprite sheet.
+    """
+    output_path = get_preview_path(video_path, 'sprite')
+    stream = ffmpeg.input(video_path).filter('fps', fps=columns * rows / duration).filter('scale', tile_width, -2).filter(
+        'tile', f"{columns}x{rows}"
+    ).output(f"{output_path}.part", format='image2', vcodec='mjpeg', vframes=1, q=5)
+    _run_to(stream, output_path)
+    return output_path
+
+def generate_previews(video_path):
+    """
+    Produce the thumbnail and sprite sheet of an uploaded video, so that researchers can check a stimulus
+    without streaming it.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    """
+    config = current_app.config
+    try:
+        duration = float(ffmpeg.probe(video_path)['format']['duration'])
+    except Exception as e:
+        current_app.logger.error(f"Error probing video {video_path} for previews: {e}")
+        return
+    if duration <= 0:
+        return
+
+    try:
+        current_app.logger.info(f"Generating thumbnail of {video_path}")
+        generate_thumbnail(video_path, duration, config.get('VIDEO_THUMBNAIL_WIDTH'))
+    except Exception as e:
+        current_app.logger.error(f"Error generating thumbnail of video {video_path}: {e}")
+
+    try:
+        current_app.logger.info(f"Generating sprite sheet of {video_path}")
+        generate_sprite(video_path, duration, config.get('VIDEO_SPRITE_COLUMNS'), config.get('VIDEO_SPRITE_ROWS'), config.get('VIDEO_SPRITE_TILE_WIDTH'))
+    except Exception as e:
+        current_app.logger.error(f"Error generating sprite sheet of video {video_path}: {e}")
+
+def transcode_video(video_path):
+    """
+    Produce the configured streaming renditions of an uploaded video.
+
+    A faststart remux is attempted first. Originals that are not MP4 and cannot be remuxed always get an H.264
+    rendition, since browsers could not otherwise play them.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+    """
+    config = current_app.config
+    is_mp4 = video_path.lower().endswith('.mp4')
+    remuxed = False
+    try:
+        if config.get('VIDEO_FASTSTART'):
+            current_app.logger.info(f"Remuxing {video_path} for faststart playback")
+            remux_faststart(video_path)
+            remuxed = True
+    except Exception as e:
+        current_app.logger.error(f"Error remuxing video {video_path} for faststart playback: {e}")
+
+    try:
+        if config.get('VIDEO_H264_RENDITION') or (not is_mp4 and not remuxed):
+            current_app.logger.info(f"Transcoding {video_path} to H.264 at {config.get('VIDEO_H264_MAX_BITRATE')}")
+            transcode_h264(video_path, config.get('VIDEO_H264_MAX_BITRATE'))
+    except Exception as e:
+        current_app.logger.error(f"Error transcoding video {video_path} to H.264: {e}")
+
+    try:
+        if config.get('VIDEO_HLS'):
+            current_app.logger.info(f"Segmenting {video_path} for HLS playback")
+            segment_hls(video_path, config.get('VIDEO_HLS_SEGMENT_SECONDS'))
+    except Exception as e:
+        current_app.logger.error(f"Error segmenting video {video_path} for HLS playback: {e}")
+
+    invalidate_annotator_cache()
+
+def submit_video_transcode(video_path):
+    """
+    Queue an uploaded video for post-processing into streaming-friendly renditions and preview images.
+    Previews are generated in their own pool, so that they are not held up behind long transcodes.
+
+    Parameters:
+    - video_path (str): Path to the original video file.
+
+    Returns:
+    - Future: The queued post-processing job.
+    """
+    current_app.logger.info(f"Queueing {video_path} for post-processing")
+    submit_job('preview', current_app.config.get('VIDEO_PREVIEW_WORKERS', 1), generate_previews, video_path)
+    return submit_job('transcode', current_app.config.get('VIDEO_TRANSCODE_WORKERS', 2), transcode_video, video_path)
@@ -0,0 +1,207 @@
+import datetime
+import os
+import time
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+from werkzeug.utils import secure_filename
+
+from ...models import Upload, UploadChunk
+from ..extensions import db
+from .annotator import create_video_from_blob, hash_video_file, store_video_blob
+from .common import ALLOWED_EXTENSIONS
+from .jobs import submit_job
+
+
+def create_upload(researcher, filename, size):
+    """
+    Start a chunked upload, preallocating its file on disk, and sweep away any uploads abandoned since.
+
+    Parameters:
+    - researcher (Researcher): The researcher uploading the video.
+    - filename (str): The original name of the video file.
+    - size (int): The total size of the video file, in bytes.
+
+    Returns:
+    - Upload: The new upload.
+
+    Raises:
+    - ValueError: If the filename or size is invalid.
+    """
+    filename = secure_filename(filename or '')
+    if '.' not in filename or filename.rsplit('.', 1)[1].lower() not in ALLOWED_EXTENSIONS:
+        raise ValueError('Invalid file type.')
+    if size <= 0 or size > current_app.config.get('MAX_UPLOAD_SIZE'):
+        raise ValueError('Invalid upload size.')
+
+    upload = Upload(researcher_id=researcher.id, filename=filename, size=size)
+    upload.tokenize()
+
+    PARTIAL_FOLDER_PATH = os.path.dirname(upload.filepath)
+    if not os.path.exists(PARTIAL_FOLDER_PATH):
+        current_app.logger.debug("%s does not exist. Creating directory.", PARTIAL_FOLDER_PATH)
+        os.makedirs(PARTIAL_FOLDER_PATH)
+    with open(upload.filepath, 'wb') as upload_file:
+        upload_file.truncate(size)
+
+    db.session.add(upload)
+    db.session.commit()
+    current_app.logger.info("Started upload %s of %s (%s bytes) for researcher ID: %s", upload.token, filename, size, researcher.id)
+    submit_job('cleanup', 1, expire_uploads, current_app.config.get('UPLOAD_EXPIRY_SECONDS'))
+    return upload
+
+def get_received_ranges(upload):
+    """
+    Get the byte ranges of an upload that have been received, merged and in order.
+
+    Parameters:
+    - upload (Upload): The upload.
+
+    Returns:
+    - list: A list of [start, end) pairs.
+    """
+    ranges = []
+    for chunk in upload.chunks.order_by(UploadChunk.offset):
+        end = chunk.offset + chunk.length
+        if ranges and chunk.offset <= ranges[-1][1]:
+            ranges[-1][1] = max(ranges[-1][1], end)
+        else:
+            ranges.append([chunk.offset, end])
+    return ranges
+
+def get_upload_offset(upload):
+    """
+    Get the number of contiguous bytes received from the start of an upload, from which a client can resume.
+
+    Parameters:
+    - upload (Upload): The upload.
+
+    Returns:
+    - int: The upload offset.
+    """
+    ranges = get_received_ranges(upload)
+    if ranges and ranges[0][0] == 0:
+        return ranges[0][1]
+    return 0
+
+def write_upload_chunk(upload, offset, length, stream, chunk_size=1024 * 1024):
+    """
+    Stream a chunk of an upload directly into place in its file.
+
+    Chunks may arrive in any order and in parallel, and may be re-sent, with a different length. A chunk is only
+    recorded once all of its bytes have been written.
+
+    Parameters:
+    - upload (Upload): The upload.
+    - offset (int): The byte offset of the chunk within the file.
+    - length (int): The length of the chunk, in bytes.
+    - stream (file-like): The chunk contents.
+    - chunk_size (int): The number of bytes to read at a time.
+
+    Raises:
+    - ValueError: If the chunk does not fit within the upload, or was not received in full.
+    """
+    if offset < 0 or length <= 0 or offset + length > upload.size:
+        raise ValueError('Chunk does not fit within the upload.')
+
+    written = 0
+    with open(upload.filepath, 'r+b') as upload_file:
+        upload_file.seek(offset)
+        while written < length:
+            data = stream.read(min(chunk_size, length - written))
+            if not data:
+                break
+            upload_file.write(data)
+            written += len(data)
+
+    if written != length:
+        current_app.logger.warning("Received %s of %s bytes at offset %s for upload %s", written, length, offset, upload.token)
+        raise ValueError('Chunk was not received in full.')
+
+    try:
+        upload.updated_at = datetime.datetime.utcnow()
+        db.session.add(UploadChunk(upload_id=upload.id, offset=offset, length=length))
+        db.session.commit()
+    except IntegrityError:
+        # A re-sent chunk may be longer than the first attempt, so keep whichever covers more.
+        db.session.rollback()
+        db.session.execute(update(UploadChunk).where(
+            UploadChunk.upload_id == upload.id, UploadChunk.offset == offset, UploadChunk.length < length
+        ).values(length=length))
+        upload.updated_at = datetime.datetime.utcnow()
+        db.session.commit()
+        current_app.logger.debug("Chunk at offset %s for upload %s was re-sent", offset, upload.token)
+
+def finalize_upload(upload):
+    """
+    Complete an upload once every byte has been received, moving it into video storage, probing it and adding
+    it to the uploading researcher's video library.
+
+    Parameters:
+    - upload (Upload): The upload.
+
+    Returns:
+    - Video: The video created from the upload.
+
+    Raises:
+    - ValueError: If parts of the upload are still missing.
+    """
+    if get_received_ranges(upload) != [[0, upload.size]]:
+        raise ValueError('Upload is incomplete.')
+
+    current_app.logger.info("Finalizing upload %s of %s", upload.token, upload.filename)
+    content_hash = hash_video_file(upload.filepath)
+    blob_path, created = store_video_blob(upload.filepath, content_hash, upload.extension)
+    video = create_video_from_blob(upload.extension, content_hash, blob_path, created)
+    video.researcher_id = upload.researcher_id
+    video.name = upload.filename
+    db.session.delete(upload)
+    db.session.commit()
+    return video
+
+def abort_upload(upload):
+    """
+    Abandon an upload, removing its partial file.
+
+    Parameters:
+    - upload (Upload): The upload.
+    """
+    try:
+        if os.path.exists(upload.filepath):
+            os.remove(upload.filepath)
+    except Exception as e:
+        current_app.logger.error("Error deleting partial upload %s: %s", upload.filepath, e)
+    db.session.delete(upload)
+    db.session.commit()
+
+def expire_uploads(max_age):
+    """
+    Abort the uploads that have received nothing for longer than a given time, freeing the space preallocated
+    for them, along with any partial files left without an upload.
+
+    Parameters:
+    - max_age (float): The time after which an idle upload is abandoned, in seconds.
+
+    Returns:
+    - int: The number of uploads aborted.
+    """
+    cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=max_age)
+    expired = Upload.query.filter(Upload.updated_at < cutoff).all()
+    for upload in expired:
+        current_app.logger.info("Expiring upload %s of %s, idle since %s", upload.token, upload.filename, upload.updated_at)
+        abort_upload(upload)
+
+    PARTIAL_FOLDER_PATH = os.path.join(current_app.config.get('UPLOADS_FOLDER_PATH'), 'partial')
+    if os.path.isdir(PARTIAL_FOLDER_PATH):
+        tokens = {row[0] for row in db.session.query(Upload.token)}
+        for entry in os.scandir(PARTIAL_FOLDER_PATH):
+            token = entry.name[:-len('.part')] if entry.name.endswith('.part') else None
+            if token is None or token in tokens or entry.stat().st_mtime >= time.time() - max_age:
+                continue
+            try:
+                os.remove(entry.path)
+                current_app.logger.info("Removed orphaned partial upload %s", entry.path)
+            except OSError as e:
+                current_app.logger.error("Error deleting partial upload %s: %s", entry.path, e)
+    return len(expired)
@@ -1,14 +1,21 @@
+import numpy as np
 from ...models import Project
 from flask_login import current_user
 from flask import abort
 
-def allowed_file(filename, allowed_extensions):
+from .common import ALLOWED_EXTENSIONS
+
+ANNOTATION_FIELDS = ("timestamp", "video_frame", "slider_position", "trigger")
+ANNOTATION_TRIGGERS = ("start", "input", "end", "interval", "frame")
+ANNOTATION_REJECTIONS = ("incomplete", "missing", "trigger", "timecode", "frame", "slider")
+
+def allowed_file(filename, allowed_extensions=ALLOWED_EXTENSIONS):
     """
     Check if the given filename has an allowed extension.
 
     Parameters:
     - filename (str): The name of the file to be checked.
-    - allowed_extensions (list): A list of allowed file extensions.
+    - allowed_extensions (list): A list of allowed file extensions. Defaults to `ALLOWED_EXTENSIONS`.
 
     Returns:
     - bool: True if the filename has an allowed extension, False otherwise.
@@ -25,9 +32,10 @@ def validate_project_owner(project_id):
     Raises:
     - 403 Forbidden: If the current user is not the owner of the project.
     """
-    project = Project.query.get_or_404(project_id)
-    if project.researcher != current_user:
-        abort(403)
+    if current_user.owns_project(project_id):
+        return
+    Project.query.get_or_404(project_id)
+    abort(403)
         
 def validate_file_upload(file):
     """
@@ -46,3 +54,103 @@ def validate_file_upload(file):
     if not allowed_file(file.filename):
         return 'INVALID_FILE_TYPE'
     return None
+
+def _to_float_array(values):
+    try:
+        floats = np.asarray(values, dtype=np.float64)
+        # Nested values of equal length convert cleanly into extra dimensions; none of them is a number.
+        return floats if floats.ndim == 1 else np.full(len(values), np.nan)
+    except (TypeError, ValueError):
+        floats = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                floats[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return floats
+
+def annotation_columns(annotations_data):
+    """
+    Convert the annotations submitted for a video into one array per annotation field.
+
+    Parameters:
+    - annotations_data (list or dict): Either a list of annotation objects, or the annotator's columnar format,
+      an object holding one array per annotation field.
+
+    Returns:
+    - tuple: A dictionary of one-dimensional arrays, all as long as the shortest column, and the number of rows
+      dropped because their columns were of unequal length. Columns that are not arrays count as empty, and
+      values that are not numbers or trigger names come out as NaN or None.
+    """
+    if isinstance(annotations_data, dict):
+        columns = [annotations_data.get(field) for field in ANNOTATION_FIELDS]
+        columns = [column if isinstance(column, list) else [] for column in columns]
+    else:
+        rows = [row if isinstance(row, dict) else {} for row in annotations_data or []]
+        columns = [[row.get(field) for row in rows] for field in ANNOTATION_FIELDS]
+    length = min(len(column) for column in columns)
+    incomplete = max(len(column) for column in columns) - length
+    timestamps, frames, positions, triggers = (column[:length] for column in columns)
+    arrays = {
+        "timecode": _to_float_array(timestamps),
+        "frame_number": _to_float_array(frames),
+        "slider_position": _to_float_array(positions),
+        "trigger": np.array([trigger if isinstance(trigger, str) else None for trigger in triggers], dtype=object)
+    }
+    return arrays, incomplete
+
+def validate_annotation_batch(annotations_data, frame_rate=None, duration=None, granularity=None):
+    """
+    Validate the annotations submitted for a video in one pass of vectorized checks, instead of row by row.
+
+    A row is rejected if any of its fields is missing or not a number, if its trigger is not one the annotator
+    sends, if its timecode is negative, past the end of the video or earlier than a preceding row, if its frame
+    number does not match its timecode at the video's frame rate, or if its slider position falls outside the
+    scale of the project. Each rejected row is counted under the first check it fails.
+
+    Parameters:
+    - annotations_data (list or dict): The annotations submitted for the video.
+    - frame_rate (float): The video's frame rate, if known.
+    - duration (float): The video's duration in seconds, if known.
+    - granularity (int): The width of the project's scale, which runs from -granularity/2 to granularity/2, if
+      bounded.
+
+    Returns:
+    - tuple: A dictionary of arrays holding the accepted rows, and a dictionary counting the rejected rows
+      by reason.
+    """
+    arrays, incomplete = annotation_columns(annotations_data)
+    timecodes = arrays["timecode"]
+    frames = arrays["frame_number"]
+    positions = arrays["slider_position"]
+    valid = np.ones(len(timecodes), dtype=bool)
+    rejections = dict.fromkeys(ANNOTATION_REJECTIONS, 0)
+    rejections["incomplete"] = incomplete
+
+    def reject(reason, mask):
+        mask &= valid
+        rejections[reason] += int(mask.sum())
+        valid[mask] = False
+
+    with np.errstate(invalid='ignore'):
+        reject("missing", ~(np.isfinite(timecodes) & np.isfinite(frames) & np.isfinite(positions)))
+        reject("trigger", ~np.isin(arrays["trigger"], ANNOTATION_TRIGGERS))
+
+        timecode_errors = timecodes < 0
+        if duration:
+            timecode_errors |= timecodes > duration + 1
+        reject("timecode", timecode_errors)
+        # Timecodes only move forward: compare each row with the latest valid timecode before it.
+        latest = np.maximum.accumulate(np.where(valid, timecodes, -np.inf))
+        reject("timecode", timecodes < np.concatenate(([-np.inf], latest[:-1])))
+
+        frame_errors = (frames < 0) | (frames != np.round(frames))
+        if frame_rate:
+            frame_errors |= np.abs(frames - timecodes * frame_rate) > 1
+        reject("frame", frame_errors)
+
+        if granularity:
+            reject("slider", np.abs(positions) > granularity / 2)
+
+    accepted = {field: array[valid] for field, array in arrays.items()}
+    return accepted, rejections
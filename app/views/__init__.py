@@ -5,4 +5,5 @@ from .dashboard import *
 from .presets import *
 from .projects import *
 from .sessions import *
+from .library import *
 from .participant import *
\ No newline at end of file
@@ -1,7 +1,20 @@
-from flask import Blueprint, flash, jsonify, redirect, request, url_for
-from flask_login import login_required
+import io
 
+from flask import (Blueprint, current_app, flash, jsonify, make_response,
+                   redirect, request, url_for)
+from flask_login import current_user, login_required
+
+from ..models import Project, Upload
+from ..utils.functions.annotations import (parse_annotation_fields,
+                                           parse_annotation_filters,
+                                           query_annotations)
 from ..utils.functions.common import delete_item_from_db
+from ..utils.functions.provision import (join_links_to_csv, parse_roster,
+                                         provision_sessions)
+from ..utils.functions.ratings import get_stimulus_ratings
+from ..utils.functions.upload import (abort_upload, create_upload,
+                                      finalize_upload, get_received_ranges,
+                                      get_upload_offset, write_upload_chunk)
 
 api = Blueprint('api', __name__)
 
@@ -24,6 +37,35 @@ def get_preset_settings(preset_id):
         return jsonify({"error": "Settings not found for the given preset ID"}), 404
     return jsonify(settings.to_dict())
 
+@api.route('/annotations', methods=['GET'])
+@login_required
+def get_annotations():
+    """
+    Fetch one page of the annotations collected in the logged-in researcher's projects.
+
+    Query Parameters:
+    - project_id, session_id, participant_id, video_id (int): Only include annotations matching these IDs.
+    - start, end (float): Only include annotations whose timecode falls within this range, in seconds.
+    - trigger (str): Only include annotations recorded by this trigger.
+    - fields (str): A comma-separated list of the fields to return. Defaults to every field.
+    - cursor (str): The `next_cursor` returned with the previous page.
+    - limit (int): The number of annotations per page, up to `ANNOTATIONS_MAX_PAGE_SIZE`.
+
+    Returns:
+    - JSON: The annotations on the page and the cursor of the next page, or an error message.
+    """
+    config = current_app.config
+    limit = request.args.get('limit', config.get('ANNOTATIONS_PAGE_SIZE', 1000), type=int)
+    limit = max(1, min(limit, config.get('ANNOTATIONS_MAX_PAGE_SIZE', 10000)))
+    try:
+        filters = parse_annotation_filters(request.args)
+        fields = parse_annotation_fields(request.args.get('fields'))
+        annotations, next_cursor = query_annotations(current_user.id, filters, fields, request.args.get('cursor'), limit)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    current_app.logger.debug("Read %s annotations with filters %s", len(annotations), filters)
+    return jsonify({"annotations": annotations, "next_cursor": next_cursor})
+
 @api.route('/delete_item/<item_type>/<int:item_id>', methods=['POST'])
 @login_required
 def delete_item(item_type, item_id):
@@ -45,3 +87,184 @@ def delete_item(item_type, item_id):
         flash(message, 'error')
     return redirect(next_url)
 
+def get_researcher_upload(token):
+    """
+    Fetch an upload owned by the logged-in researcher, or abort with 404.
+
+    Parameters:
+    - token (str): The token of the upload.
+
+    Returns:
+    - Upload: The upload.
+    """
+    return Upload.query.filter_by(token=token, researcher_id=current_user.id).first_or_404()
+
+def upload_status(upload):
+    """
+    Build the JSON description of an upload's progress.
+
+    Parameters:
+    - upload (Upload): The upload.
+
+    Returns:
+    - dict: The upload's token, size, resumable offset and received byte ranges.
+    """
+    return {
+        "token": upload.token,
+        "filename": upload.filename,
+        "size": upload.size,
+        "offset": get_upload_offset(upload),
+        "received": get_received_ranges(upload),
+        "url": url_for('api.upload_chunk', token=upload.token)
+    }
+
+@api.route('/uploads', methods=['POST'])
+@login_required
+def start_upload():
+    """
+    Start a chunked, resumable video upload.
+
+    Expects a JSON body with the `filename` and total `size` in bytes of the video.
+
+    Returns:
+    - JSON: The upload's status, including the URL to send chunks to.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        upload = create_upload(current_user, data.get('filename'), int(data.get('size', 0)))
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(upload_status(upload)), 201
+
+@api.route('/uploads/<token>', methods=['GET'])
+@login_required
+def get_upload(token):
+    """
+    Fetch the progress of an upload, so that an interrupted upload can be resumed.
+
+    Parameters:
+    - token (str): The token of the upload.
+
+    Returns:
+    - JSON: The upload's status.
+    """
+    upload = get_researcher_upload(token)
+    return jsonify(upload_status(upload))
+
+@api.route('/uploads/<token>', methods=['PATCH'])
+@login_required
+def upload_chunk(token):
+    """
+    Write a chunk of an upload. The chunk's byte offset is given in the `Upload-Offset` header and its contents
+    make up the raw request body. Chunks may be sent in any order and in parallel.
+
+    Parameters:
+    - token (str): The token of the upload.
+
+    Returns:
+    - Response: 204 with the resumable offset in the `Upload-Offset` header, or a JSON error.
+    """
+    upload = get_researcher_upload(token)
+    try:
+        offset = int(request.headers.get('Upload-Offset', ''))
+        length = request.content_length or 0
+        write_upload_chunk(upload, offset, length, request.stream)
+    except ValueError as e:
+        return jsonify({"error": str(e), "offset": get_upload_offset(upload)}), 400
+
+    response = make_response('', 204)
+    response.headers['Upload-Offset'] = str(get_upload_offset(upload))
+    return response
+
+@api.route('/uploads/<token>/finalize', methods=['POST'])
+@login_required
+def complete_upload(token):
+    """
+    Complete an upload once all of its chunks have been received, storing and probing the video.
+
+    Parameters:
+    - token (str): The token of the upload.
+
+    Returns:
+    - JSON: The created video, or an error with the upload's status if chunks are missing.
+    """
+    upload = get_researcher_upload(token)
+    try:
+        video = finalize_upload(upload)
+    except ValueError as e:
+        return jsonify({"error": str(e), **upload_status(upload)}), 409
+    current_app.logger.info("Upload %s finalized as video ID: %s", token, video.id)
+    return jsonify({
+        "id": video.id,
+        "token": video.token,
+        "filename": video.filename,
+        "duration": video.duration,
+        "frame_rate": video.frame_rate
+    }), 201
+
+@api.route('/uploads/<token>', methods=['DELETE'])
+@login_required
+def delete_upload(token):
+    """
+    Abandon an upload and discard the chunks received so far.
+
+    Parameters:
+    - token (str): The token of the upload.
+
+    Returns:
+    - Response: 204 once the upload has been discarded.
+    """
+    upload = get_researcher_upload(token)
+    abort_upload(upload)
+    return make_response('', 204)
+
+@api.route('/projects/<int:project_id>/sessions/bulk', methods=['POST'])
+@login_required
+def bulk_provision_sessions(project_id):
+    """
+    Provision sessions and participants for a project from a roster CSV, using videos from the researcher's library.
+
+    Expects a multipart form with the roster CSV in `roster` and, optionally, default library videos for decoupled
+    sessions in `library_videos`.
+
+    Parameters:
+    - project_id (int): ID of the project to provision.
+
+    Returns:
+    - CSV Response: The join link of every provisioned participant, or a JSON error.
+    """
+    project = Project.query.filter_by(id=project_id, researcher_id=current_user.id).first_or_404()
+    roster_file = request.files.get('roster')
+    if not roster_file:
+        return jsonify({"error": "No roster file was provided."}), 400
+
+    try:
+        roster = parse_roster(io.TextIOWrapper(roster_file.stream, encoding='utf-8-sig'))
+        results = provision_sessions(project, roster, request.form.getlist('library_videos'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    current_app.logger.info("Provisioned %s participants for project ID: %s", len(results), project_id)
+    response = make_response(join_links_to_csv(results, request.host_url))
+    response.headers.set('Content-Disposition', 'attachment', filename=f'project-{project_id}_join_links.csv')
+    response.mimetype = 'text/csv'
+    return response
+
+@api.route('/videos/<key>/ratings', methods=['GET'])
+@login_required
+def get_video_ratings(key):
+    """
+    Fetch every rating collected for a stimulus across the logged-in researcher's sessions and projects.
+
+    Parameters:
+    - key (str): The token or SHA-256 content hash of one of the stimulus' videos.
+
+    Returns:
+    - JSON: The stimulus and one columnar trace (timecodes, slider positions and triggers) per rater and video,
+      or an error message if the stimulus is not found.
+    """
+    ratings = get_stimulus_ratings(current_user.id, key)
+    if ratings is None:
+        return jsonify({"error": "Video not found."}), 404
+    current_app.logger.info("Fetched %s traces for video %s", len(ratings["traces"]), key)
+    return jsonify(ratings)
@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template
 
+from ..utils.functions.compression import send_static_asset
+
 core = Blueprint('core', __name__)
 
 
@@ -24,3 +26,15 @@ def documentation():
     """
     return render_template('documentation.html', title='Documentation', header='Documentation')
 
+@core.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """
+    Serve a fingerprinted static file written by `flask build-static`.
+
+    Parameters:
+    - filename (str): The fingerprinted path of the file.
+
+    Returns:
+    - File Response: The file, precompressed if the client accepts it, cacheable for a year.
+    """
+    return send_static_asset(filename)
@@ -1,7 +1,9 @@
-from flask import Blueprint, current_app, render_template
+from flask import Blueprint, current_app, render_template, request
 from flask_login import current_user, login_required
 
 from ..forms import DeleteForm
+from ..utils.functions.listing import (get_preset_listing, get_project_listing,
+                                       parse_date_arg)
 
 dashboard = Blueprint('dashboard', __name__)
 
@@ -15,23 +17,22 @@ def dash():
     - Rendered Template: Displays the dashboard with a list of projects, presets, and other related information.
     """
     form = DeleteForm()
-    projects = current_user.projects
-    presets = current_user.presets
+    per_page = current_app.config.get('ADMIN_PAGE_SIZE', 20)
+    since = parse_date_arg(request.args.get('since'))
+    until = parse_date_arg(request.args.get('until'))
+    projects, next_cursor = get_project_listing(current_user, request.args.get('cursor', type=int), per_page, since, until)
+    presets, next_presets_cursor = get_preset_listing(current_user, request.args.get('presets_cursor', type=int), per_page)
 
     if not projects:
         current_app.logger.debug("projects is None or Empty")
     if not presets:
         current_app.logger.debug("presets is None or Empty")
-    if not current_user:
-        current_app.logger.debug("current_user is None")
-
-    for project in projects:
-        current_app.logger.debug(f"Project Name: {project.name}")
-        current_app.logger.debug(f"Project Settings: {project.settings}")
-        if project.settings:
-            current_app.logger.debug(f"Project Settings Dict: {project.settings.to_dict()}")
 
-    return render_template('admin/index.html', title='Dashboard', header='Dashboard', subheader=current_user.username, projects=projects, presets=presets, form=form)
+    filters = {
+        'since': request.args.get('since', '') if since else '',
+        'until': request.args.get('until', '') if until else ''
+    }
+    return render_template('admin/index.html', title='Dashboard', header='Dashboard', subheader=current_user.username, projects=projects, presets=presets, form=form, filters=filters, next_cursor=next_cursor, next_presets_cursor=next_presets_cursor)
 
 @dashboard.route('/analytics')
 @login_required
@@ -0,0 +1,88 @@
+import os
+
+from flask import (Blueprint, abort, current_app, flash, redirect,
+                   render_template, send_file, url_for)
+from flask_login import current_user, login_required
+
+from ..forms import DeleteForm, LibraryUploadForm
+from ..models import Video
+from ..utils.functions.annotator import (delete_library_video,
+                                         is_project_video,
+                                         save_video_to_library)
+from ..utils.functions.transcode import get_preview_path
+from ..utils.functions.validation import validate_file_upload
+
+library = Blueprint('library', __name__)
+
+@library.route('/library', methods=['GET', 'POST'])
+@login_required
+def video_library():
+    """
+    List the videos in the logged-in researcher's library and upload new ones.
+
+    Videos in the library are uploaded and probed once, then attached to any number of sessions by reference.
+
+    Returns:
+    - Rendered Template: Displays the video library and upload form.
+    - Response: Redirects back to the library after an upload.
+    """
+    form = LibraryUploadForm()
+    delete_form = DeleteForm()
+
+    if form.validate_on_submit():
+        saved = 0
+        for video_file in form.videos.data:
+            error = validate_file_upload(video_file)
+            if error:
+                current_app.logger.warning(f"Rejected library upload {video_file.filename}: {error}")
+                flash(f"{video_file.filename} could not be uploaded ({error}).", 'error')
+                continue
+            save_video_to_library(video_file, current_user)
+            saved += 1
+        if saved:
+            flash('Videos uploaded successfully!')
+        return redirect(url_for('library.video_library'))
+
+    videos = current_user.library.order_by(Video.created_at.desc()).all()
+    return render_template('admin/library/index.html', title='Library', header='Library', videos=videos, form=form, delete_form=delete_form)
+
+@library.route('/library/<int:video_id>/delete', methods=['POST'])
+@login_required
+def delete_video(video_id):
+    """
+    Delete a video from the logged-in researcher's library.
+
+    Parameters:
+    - video_id (int): ID of the library video to delete.
+
+    Returns:
+    - Response: Redirects back to the library.
+    """
+    video = Video.query.filter_by(id=video_id, researcher_id=current_user.id).first_or_404()
+    success, message = delete_library_video(video)
+    flash(message, 'success' if success else 'error')
+    return redirect(url_for('library.video_library'))
+
+@library.route('/videos/<int:video_id>/<any(thumbnail, sprite):preview>')
+@login_required
+def video_preview(video_id, preview):
+    """
+    Serve the thumbnail or sprite sheet of a video in the logged-in researcher's library or projects.
+
+    Parameters:
+    - video_id (int): ID of the video.
+    - preview (str): The preview to serve ('thumbnail' or 'sprite').
+
+    Returns:
+    - File Response: The preview image, cacheable by the browser.
+    """
+    video = Video.query.get_or_404(video_id)
+    if video.researcher_id != current_user.id and not is_project_video(video.id, current_user.project_ids):
+        abort(404)
+    preview_path = get_preview_path(video.filepath, preview)
+    if not os.path.exists(preview_path):
+        abort(404)
+    response = send_file(os.path.abspath(preview_path), mimetype='image/jpeg', max_age=current_app.config.get('VIDEO_PREVIEW_MAX_AGE', 3600))
+    response.cache_control.public = False
+    response.cache_control.private = True
+    return response
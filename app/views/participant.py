@@ -1,13 +1,26 @@
 import os.path as osp
 
-from flask import (Blueprint, current_app, flash, jsonify, redirect,
-                   render_template, request, send_file, url_for)
+from flask import (Blueprint, abort, current_app, flash, jsonify, redirect,
+                   render_template, request, send_file, send_from_directory,
+                   url_for)
 
-from ..models import Annotation, Participant, Project
+from ..models import Participant
 from ..utils.extensions import db
-from ..utils.functions.annotator import (get_session_from_participant,
-                                         save_annotations)
+from ..utils.functions.annotator import (ANNOTATOR_CSRF_PLACEHOLDER,
+                                         annotator_page_response,
+                                         cache_annotator_page,
+                                         get_annotator_context,
+                                         get_cached_annotator_page,
+                                         get_session_from_participant,
+                                         get_session_video,
+                                         save_annotations,
+                                         update_participant_progress)
 from ..utils.functions.common import get_current_time
+from ..utils.functions.logs import PayloadSummary
+from ..utils.functions.monitor import notify_session_changed
+from ..utils.functions.transcode import (HLS_PLAYLIST, get_best_rendition,
+                                         get_hls_folder_path,
+                                         get_video_mimetype)
 
 participant = Blueprint('participant', __name__)
 
@@ -22,26 +35,50 @@ def join_session(token):
     Returns:
     - Response: Redirects to the annotator route or the core index based on the token validity.
     """
-    current_app.logger.info(f"Attempting to join session with token: {token}")
+    current_app.logger.info("Attempting to join session with token: %s", token)
     participant_instance = Participant.verify_token(token)
     if not participant_instance:
-        current_app.logger.warning(f"Invalid or expired token: {token}")
+        current_app.logger.warning("Invalid or expired token: %s", token)
         flash('The link is invalid or has expired.')
         return redirect(url_for('core.index'))
 
     session = get_session_from_participant(participant_instance)
     if not session:
-        current_app.logger.warning(f"No session associated with token: {token}")
+        current_app.logger.warning("No session associated with token: %s", token)
         flash('The session associated with this link is not available.')
         return redirect(url_for('core.index'))
 
-    current_app.logger.info(f"Redirecting to annotator route with token: {token}")
+    current_app.logger.info("Redirecting to annotator route with token: %s", token)
     participant_instance.last_accessed = get_current_time()
     participant_instance.has_accessed = True
     db.session.commit()
+    notify_session_changed(participant_instance.session_id)
     
     return redirect(url_for('participant.annotator', token=token))
 
+@participant.route('/annotator/<token>/heartbeat', methods=['POST'])
+def heartbeat(token):
+    """
+    Record a participant's progress, sent periodically by the annotator while videos play.
+
+    Parameters:
+    - token (str): Unique token associated with the participant.
+
+    Returns:
+    - JSON Response: Whether the progress was accepted.
+    """
+    context = get_annotator_context(token)
+    if not context:
+        return jsonify({"error": "Invalid or expired token"}), 400
+
+    data = request.get_json(silent=True) or {}
+    video_ids = {video["id"] for video in context["videos"]}
+    video_id = data.get("video_id")
+    if video_id not in video_ids:
+        video_id = None
+    message, status = update_participant_progress(context["participant_id"], data.get("progress"), context["session_id"], video_id)
+    return jsonify(message), status
+
 @participant.route('/annotator/<token>', methods=['GET', 'POST'])
 def annotator(token):
     """
@@ -54,83 +91,65 @@ def annotator(token):
     - Rendered Template: Displays the annotator interface.
     - JSON Response: Provides feedback on the annotation submission status.
     """
-    participant_instance = Participant.verify_token(token)
-    if not participant_instance:
-        current_app.logger.warning(f"Invalid or expired token: {token}")
+    if request.method == 'GET':
+        page = get_cached_annotator_page(token)
+        if page is not None:
+            return annotator_page_response(page)
+
+    context = get_annotator_context(token)
+    if not context:
+        current_app.logger.warning("Invalid or expired token, or no session, project or settings found for token: %s", token)
         return jsonify({"error": "Invalid or expired token"}), 400
 
     try: 
-        session_instance = participant_instance.session
-        if session_instance:
-            project_instance = Project.query.get(session_instance.project_id)
-        else:
-            current_app.logger.warning(f"Session not found for participant with token: {token}")
-            return jsonify({"error": "Session not found for this participant"}), 404
-
-        if not project_instance:
-            current_app.logger.warning(f"Project not found for participant with token: {token}")
-            return jsonify({"error": "Project not found for this participant"}), 404
-
-        if project_instance.settings:
-            method = project_instance.settings.method
-            bounding = project_instance.settings.bounding
-            granularity = project_instance.settings.granularity
-            slider_min = (granularity/2)*(-1)
-            slider_max = (granularity/2)
-            axis = project_instance.settings.axis
-            ceiling = project_instance.settings.ceiling
-            floor = project_instance.settings.floor
-        else:
-            current_app.logger.warning(f"Settings not found for project with ID: {project_instance.id}")
-            return jsonify({"error": "Settings not found. Consult your researcher."}), 404
+        settings = context["settings"]
+        method = settings["method"]
+        bounding = settings["bounding"]
+        granularity = settings["granularity"]
+        slider_min = (granularity/2)*(-1)
+        slider_max = (granularity/2)
+        axis = settings["axis"]
+        ceiling = settings["ceiling"]
+        floor = settings["floor"]
 
         if request.method == 'POST':
-            current_app.logger.info(f"Received data: {request.json}")
-            data = request.json
+            participant_instance = Participant.query.get(context["participant_id"])
+            data = request.get_json(silent=True)
+            current_app.logger.info("Received %s from participant ID: %s", PayloadSummary(data, current_app.config.get('LOG_PAYLOAD_LIMIT', 200)), context["participant_id"])
             if not data:
-                current_app.logger.error(f"No JSON data received in the request.")
+                current_app.logger.error("No JSON data received in the request.")
                 return jsonify({"error": "No data received. Please ensure you're sending JSON data."}), 400
 
-            annotations_data_map = data.get('annotations')
-            
-            for video_id_str, annotations_list in annotations_data_map.items():
-                video_id = int(video_id_str)
-                for annotation_data in annotations_list:
-                    annotation = Annotation(
-                        participant_id=participant_instance.id,
-                        video_id=video_id,
-                        timecode=annotation_data.get("timestamp"),
-                        frame_number=annotation_data.get("video_frame"),
-                        slider_position=annotation_data.get("slider_position"),
-                        trigger=annotation_data.get("trigger")
-                    )
-                    db.session.add(annotation)
-
             try:
-                save_annotations(request, participant_instance)
-                current_app.logger.info(f"Annotations saved successfully for participant with token: {token}")
+                save_annotations(data, participant_instance, granularity)
+                current_app.logger.info("Annotations saved successfully for participant with token: %s", token)
                 return jsonify({"message": "Annotations submitted successfully! Thank you for your participation."}), 200
             except Exception as e:
-                current_app.logger.error(f"Error saving annotations: {e}")
+                current_app.logger.error("Error saving annotations: %s", e)
                 return jsonify({"error": f"There was an error saving your annotations: {str(e)}"}), 500
 
         videos_data = []
-        for video_assoc in participant_instance.video_associations:
-            if project_instance.settings.coupling == "coupled" and video_assoc.owner:
+        for video in context["videos"]:
+            if settings["coupling"] == "coupled" and video["owner"]:
                 continue  # Skip this video if the participant is the owner in a coupled setting
             video_info = {
-                "id": video_assoc.video.id,
-                "url": url_for('participant.serve_video', project_id=project_instance.id, session_id=session_instance.id, filename=video_assoc.video.filename),
-                "frame_rate": video_assoc.video.frame_rate
+                "id": video["id"],
+                "url": url_for('participant.serve_video', project_id=context["project_id"], session_id=context["session_id"], filename=video["filename"]),
+                "type": video["type"],
+                "hls_url": url_for('participant.serve_hls', project_id=context["project_id"], session_id=context["session_id"], video_token=osp.splitext(video["filename"])[0], segment=HLS_PLAYLIST) if video["hls"] else None,
+                "frame_rate": video["frame_rate"],
+                "duration": video["duration"],
+                "size": video["size"]
             }
             videos_data.append(video_info)
 
-        current_app.logger.debug(f"videos_data: {videos_data}")
+        current_app.logger.debug("Rendering annotator with %s videos for token: %s", len(videos_data), token)
 
-        return render_template('annotator.html', title='Annotator', participant=participant_instance, videos_data=videos_data, video_type="video/mp4", method=method, bounding=bounding, slider_min=slider_min, slider_max=slider_max, slider_value=0, axis=axis, ceiling=ceiling, floor=floor)
+        body = render_template('annotator.html', title='Annotator', participant_token=token, videos_data=videos_data, method=method, bounding=bounding, slider_min=slider_min, slider_max=slider_max, slider_value=0, axis=axis, ceiling=ceiling, floor=floor, csrf_token=lambda: ANNOTATOR_CSRF_PLACEHOLDER)
+        return annotator_page_response(cache_annotator_page(token, body))
 
     except Exception as e:
-        current_app.logger.error(f"Error in annotator route: {e}")
+        current_app.logger.error("Error in annotator route: %s", e)
         return jsonify({"error": f"An unexpected error occurred: {str(e)}"}), 500
 
 @participant.route('/uploads/<int:project_id>/<int:session_id>/<filename>')
@@ -147,29 +166,46 @@ def serve_video(project_id, session_id, filename):
     - File Response: Sends the video file for download.
     - Response: Redirects to the core index in case of errors.
     """
-    current_app.logger.info(f"Serving video with filename: {filename} for project ID: {project_id} and session ID: {session_id}")
-    SESSION_FOLDER_PATH = osp.join(current_app.config.get('UPLOADS_FOLDER_PATH'), str(project_id), str(session_id))
-    
-    if not osp.exists(osp.join(SESSION_FOLDER_PATH, filename)):
-        current_app.logger.error(f"File {filename} not found in directory {SESSION_FOLDER_PATH}")
-        flash('Video file not found. Please contact the administrator.')
-        return redirect(url_for('core.index'))
-    
-    current_app.logger.debug(f"UPLOADS_FOLDER_PATH is set to: {current_app.config.get('UPLOADS_FOLDER_PATH')}")
-    
-    VIDEO_FILE_PATH = osp.join(SESSION_FOLDER_PATH, filename)
-    absolute_path = osp.abspath(VIDEO_FILE_PATH).replace("\\", "/")
+    current_app.logger.info("Serving video with filename: %s for project ID: %s and session ID: %s", filename, project_id, session_id)
+    video = get_session_video(project_id, session_id, osp.splitext(filename)[0])
+    if not video:
+        abort(404)
+    absolute_path = osp.abspath(video.filepath).replace("\\", "/")
 
-    current_app.logger.debug(f"Absolute path to video: {absolute_path}")
+    current_app.logger.debug("Absolute path to video: %s", absolute_path)
     
     if not osp.exists(absolute_path):
-        current_app.logger.error(f"File {filename} not found at path: {absolute_path}")
+        current_app.logger.error("File %s not found at path: %s", filename, absolute_path)
         flash('Video file not found. Please contact the administrator.')
         return redirect(url_for('core.index'))
 
+    rendition_path = get_best_rendition(absolute_path)
+    if rendition_path != absolute_path:
+        current_app.logger.debug("Serving rendition %s in place of %s", rendition_path, absolute_path)
+
     try:
-        return send_file(absolute_path, as_attachment=True, download_name=filename)
+        return send_file(rendition_path, mimetype=get_video_mimetype(absolute_path), as_attachment=True, download_name=osp.basename(rendition_path))
     except Exception as e:
-        current_app.logger.error(f"Error serving video: {e}")
+        current_app.logger.error("Error serving video: %s", e)
         flash('Error serving video. Please contact the administrator.')
         return redirect(url_for('core.index'))
+
+@participant.route('/uploads/<int:project_id>/<int:session_id>/<video_token>/hls/<segment>')
+def serve_hls(project_id, session_id, video_token, segment):
+    """
+    Serve the HLS playlist or a segment of a video for a given project and session.
+
+    Parameters:
+    - project_id (int): ID of the project.
+    - session_id (int): ID of the session.
+    - video_token (str): Token of the video.
+    - segment (str): Name of the playlist or segment file to serve.
+
+    Returns:
+    - File Response: Sends the playlist or segment.
+    """
+    video = get_session_video(project_id, session_id, video_token)
+    if not video:
+        abort(404)
+    HLS_FOLDER_PATH = osp.abspath(get_hls_folder_path(video.filepath))
+    return send_from_directory(HLS_FOLDER_PATH, segment)
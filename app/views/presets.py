@@ -4,6 +4,7 @@ from flask_login import current_user, login_required
 
 from ..forms import DeleteForm, PresetCreateForm
 from ..models import Preset, Settings, db
+from ..utils.functions.cache import invalidate_annotator_cache
 from ..utils.functions.common import load_settings, parse_json_attributes
 
 presets = Blueprint('presets', __name__)
@@ -34,7 +35,7 @@ def new_preset():
     form = PresetCreateForm()
     
     if form.validate_on_submit():
-        preset = Preset(name=form.name.data, description=form.description.data, researcher=current_user)
+        preset = Preset(name=form.name.data, description=form.description.data, researcher_id=current_user.id)
         preset_settings = Settings()
         for key, default_value in Settings.default_values().items():
             setattr(preset_settings, key, form.settings.data.get(key, default_value))
@@ -79,6 +80,7 @@ def edit_preset(preset_id):
 
             preset.settings = parse_json_attributes(preset_settings)
             db.session.commit()
+            invalidate_annotator_cache()
 
             flash('Preset updated successfully!')
             return redirect(url_for('dashboard.dash'))
@@ -95,6 +97,7 @@ def edit_preset(preset_id):
     delete_form = DeleteForm()
     if delete_form.validate_on_submit():
         preset.delete_from_db()
+        invalidate_annotator_cache()
         flash('Preset deleted successfully.')
         return redirect(url_for('dashboard.dash'))
     
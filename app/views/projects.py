@@ -1,10 +1,16 @@
-from flask import (Blueprint, current_app, flash, redirect, render_template,
-                   request, url_for)
+from flask import (Blueprint, abort, current_app, flash, redirect,
+                   render_template, request, send_file, url_for)
 from flask_login import current_user, login_required
 
-from ..forms import ArchiveForm, DeleteForm, ProjectCreateForm
-from ..models import Preset, Project, Session, Settings, db
+from ..forms import (AnalysisForm, ArchiveForm, DeleteForm, ExportForm,
+                     ProjectCreateForm)
+from ..models import Analysis, Export, Preset, Project, Session, Settings, db
+from ..utils.functions.analysis import ANALYSIS_DEFAULTS, create_analysis
+from ..utils.functions.cache import (invalidate_annotator_cache,
+                                     invalidate_researcher_cache)
 from ..utils.functions.common import parse_json_attributes, toggle_item_status
+from ..utils.functions.export import create_export
+from ..utils.functions.listing import get_session_listing, parse_date_arg
 
 projects = Blueprint('projects', __name__)
 
@@ -23,7 +29,7 @@ def new_project():
     form.preset.choices = [('new', 'New Configuration')] + [(p.id, p.name) for p in current_user.presets]
 
     if form.validate_on_submit():
-        project = Project(name=form.name.data, description=form.description.data, researcher=current_user)
+        project = Project(name=form.name.data, description=form.description.data, researcher_id=current_user.id)
         project.tokenize()
         db.session.add(project)
         db.session.commit()
@@ -43,6 +49,7 @@ def new_project():
 
         db.session.add(project)
         db.session.commit()
+        invalidate_researcher_cache(current_user.id)
         current_app.logger.info(f"Project ID: {project.id} created successfully")
         flash('Project created successfully!')
         return redirect(url_for('dashboard.dash', project_id=project.id))
@@ -64,13 +71,15 @@ def view_project(project_id):
     """
     current_app.logger.info(f"Viewing project ID: {project_id} for user ID: {current_user.id}")
     project = Project.query.get_or_404(project_id)
-    sessions = project.sessions.all()
+    if not current_user.owns_project(project_id):
+        abort(403)
 
     delete_form = DeleteForm()
     if delete_form.validate_on_submit():
         session_to_delete = Session.query.get_or_404(request.form.get('session_id'))
         current_app.logger.info(f"Deleting session ID: {session_to_delete.id} for project ID: {project_id}")
-        session_to_delete.delete_from_db()
+        session_to_delete.delete()
+        invalidate_annotator_cache()
         flash('Session deleted successfully.')
         return redirect(url_for('dashboard.dash'))
     
@@ -80,6 +89,123 @@ def view_project(project_id):
         current_app.logger.info(f"Toggling status for session ID: {session_to_toggle.id} for project ID: {project_id}")
         toggle_item_status('session', session_to_toggle.id)
 
-    for session in sessions:
-        current_app.logger.debug(f"Session {session.id} has participants: {', '.join([p.name for p in session.participants])}")
-    return render_template('admin/projects/view_project.html', title=project.name, header='Project', subheader=project.name, project=project, delete_form=delete_form, archive_form=archive_form, sessions=sessions)
\ No newline at end of file
+    filters = {
+        'status': request.args.get('status', ''),
+        'submission': request.args.get('submission', ''),
+        'since': request.args.get('since', ''),
+        'until': request.args.get('until', '')
+    }
+    sessions, next_cursor = get_session_listing(
+        project.id,
+        cursor=request.args.get('cursor', type=int),
+        per_page=current_app.config.get('ADMIN_PAGE_SIZE', 20),
+        status=filters['status'],
+        submission=filters['submission'],
+        since=parse_date_arg(filters['since']),
+        until=parse_date_arg(filters['until'])
+    )
+    export_form = ExportForm()
+    exports = project.exports.order_by(Export.created_at.desc()).limit(5).all()
+    analysis_form = AnalysisForm()
+    analyses = project.analyses.filter(Analysis.session_id.is_(None)).order_by(Analysis.created_at.desc()).limit(5).all()
+    return render_template('admin/projects/view_project.html', title=project.name, header='Project', subheader=project.name, project=project, delete_form=delete_form, archive_form=archive_form, export_form=export_form, exports=exports, analysis_form=analysis_form, analyses=analyses, sessions=sessions, filters=filters, next_cursor=next_cursor)
+
+
+@projects.route('/projects/<int:project_id>/export', methods=['POST'])
+@login_required
+def export_project(project_id):
+    """
+    Queue an export of a project's sessions, participants, videos and annotations into a single compressed archive.
+
+    Parameters:
+    - project_id (int): ID of the project to export.
+
+    Returns:
+    - Response: Redirects to the project page, where the export can be downloaded once ready.
+    """
+    if not current_user.owns_project(project_id):
+        abort(403)
+    project = Project.query.get_or_404(project_id)
+
+    form = ExportForm()
+    if form.validate_on_submit():
+        export = create_export(project, form.format.data)
+        current_app.logger.info(f"Queued export {export.token} of project ID: {project_id}")
+        flash('Export started. It will be available for download on this page once ready.')
+    else:
+        flash('Invalid export format.')
+    return redirect(url_for('projects.view_project', project_id=project_id))
+
+
+@projects.route('/projects/<int:project_id>/exports/<token>')
+@login_required
+def download_export(project_id, token):
+    """
+    Download a finished project export.
+
+    Parameters:
+    - project_id (int): ID of the exported project.
+    - token (str): Token of the export.
+
+    Returns:
+    - Response: The export archive.
+    """
+    if not current_user.owns_project(project_id):
+        abort(403)
+    export = Export.query.filter_by(project_id=project_id, token=token).first_or_404()
+    if export.status != 'ready' or not export.filepath:
+        flash('This export is not ready yet.')
+        return redirect(url_for('projects.view_project', project_id=project_id))
+    current_app.logger.info(f"Downloading export {export.token} of project ID: {project_id}")
+    return send_file(export.filepath, as_attachment=True, download_name=export.filename)
+
+
+@projects.route('/projects/<int:project_id>/analyses', methods=['POST'])
+@login_required
+def analyze_project(project_id):
+    """
+    Queue an analysis of the annotation traces of every session in a project.
+
+    Parameters:
+    - project_id (int): ID of the project to analyse.
+
+    Returns:
+    - Response: Redirects to the project page, where the analysis can be downloaded once ready.
+    """
+    if not current_user.owns_project(project_id):
+        abort(403)
+    project = Project.query.get_or_404(project_id)
+
+    form = AnalysisForm()
+    if form.validate_on_submit():
+        analysis = create_analysis(project, config={key: getattr(form, key).data for key in ANALYSIS_DEFAULTS})
+        current_app.logger.info(f"Queued analysis {analysis.token} of project ID: {project_id}")
+        flash('Analysis started. It will be available for download on this page once ready.')
+    else:
+        flash('Invalid analysis settings.')
+    return redirect(url_for('projects.view_project', project_id=project_id))
+
+
+@projects.route('/projects/<int:project_id>/analyses/<token>')
+@login_required
+def download_analysis(project_id, token):
+    """
+    Download the results of a finished analysis of a project or one of its sessions.
+
+    Parameters:
+    - project_id (int): ID of the analysed project.
+    - token (str): Token of the analysis.
+
+    Returns:
+    - Response: The zip archive of the analysis.
+    """
+    if not current_user.owns_project(project_id):
+        abort(403)
+    analysis = Analysis.query.filter_by(project_id=project_id, token=token).first_or_404()
+    if analysis.status != 'ready' or not analysis.filepath:
+        flash('This analysis is not ready yet.')
+        if analysis.session_id:
+            return redirect(url_for('sessions.view_session', project_id=project_id, session_id=analysis.session_id))
+        return redirect(url_for('projects.view_project', project_id=project_id))
+    current_app.logger.info(f"Downloading analysis {analysis.token} of project ID: {project_id}")
+    return send_file(analysis.filepath, as_attachment=True, download_name=analysis.filename)
@@ -1,19 +1,24 @@
-import json
-
-from flask import (Blueprint, current_app, flash, jsonify, redirect,
-                   render_template, request, url_for, make_response)
+from flask import (Blueprint, Response, abort, current_app, flash, jsonify,
+                   make_response, redirect, render_template, request,
+                   stream_with_context, url_for)
 from flask_login import current_user, login_required
 from sqlalchemy.exc import SQLAlchemyError
 
-from ..forms import SessionCreateForm
-from ..models import (Participant, Project, Session, Video,
+from ..forms import AnalysisForm, SessionCreateForm
+from ..models import (Analysis, Participant, Project, Session, Video,
                       participant_video_association)
 from ..utils.extensions import db
+from ..utils.functions.analysis import ANALYSIS_DEFAULTS, create_analysis
 from ..utils.functions.annotator import (assign_and_order_videos,
+                                         get_library_videos,
                                          get_or_create_association,
                                          participant_annotations_to_json,
                                          save_video_to_disk)
+from ..utils.functions.archive import load_packed_annotations
+from ..utils.functions.codec import dumps
 from ..utils.functions.common import toggle_item_status
+from ..utils.functions.monitor import (get_session_progress,
+                                       stream_session_progress)
 from ..utils.functions.validation import validate_project_owner
 
 sessions = Blueprint('sessions', __name__)
@@ -36,9 +41,31 @@ def new_session(project_id):
         form = SessionCreateForm(capacity=project.settings.capacity)
         
         if request.method == 'GET':
-            return render_template('admin/sessions/new_session.html', title='New Session', header=project.name, subheader='New Session', form=form, coupling=project.settings.coupling)
+            library = current_user.library.order_by(Video.created_at.desc()).all()
+            return render_template('admin/sessions/new_session.html', title='New Session', header=project.name, subheader='New Session', form=form, coupling=project.settings.coupling, library=library)
 
         if form.validate_on_submit():
+            # Each participant of a coupled project needs either an uploaded video or one picked from the library.
+            participant_videos = []
+            if project.settings.coupling == "coupled":
+                missing_videos = []
+                for idx, field in enumerate(form.participants):
+                    library_video_id = request.form.get(f'library_videos-{idx}', type=int)
+                    video_file = request.files.get(f'videos-{idx}')
+                    if library_video_id:
+                        video = next(iter(get_library_videos(current_user, [library_video_id])), None)
+                        if video is None:
+                            flash(f"The library video chosen for {field.data} could not be found.", 'error')
+                            return redirect(url_for('projects.view_project', project_id=project_id))
+                        participant_videos.append(video)
+                    elif video_file and video_file.filename:
+                        participant_videos.append(video_file)
+                    else:
+                        missing_videos.append(field.data)
+                if missing_videos:
+                    flash(f"A video is required for: {', '.join(missing_videos)}", 'error')
+                    return redirect(url_for('projects.view_project', project_id=project_id))
+
             new_session = Session(project_id=project_id, description="New Session")
             new_session.tokenize()
             db.session.add(new_session)
@@ -50,10 +77,10 @@ def new_session(project_id):
                 new_session.participants.append(participant_instance)
             uploaded_videos = []
             if project.settings.coupling == "coupled":
-                for idx, participant in enumerate(form.participants):
-                    video_file = form.videos[idx].data
-                    filename = save_video_to_disk(video_file, project_id, new_session.id)
-                    video = Video.query.filter_by(filename=filename).first()
+                for idx, video in enumerate(participant_videos):
+                    if not isinstance(video, Video):
+                        filename = save_video_to_disk(video, project_id, new_session.id)
+                        video = Video.query.filter_by(filename=filename).first()
                     uploaded_videos.append(video)
                     
                     assoc = get_or_create_association(new_session.participants[idx], video)
@@ -63,8 +90,11 @@ def new_session(project_id):
             elif project.settings.coupling == "decoupled":
                 uploaded_files = request.files.getlist('general_videos')
                 for video_file in uploaded_files:
+                    if not video_file.filename:
+                        continue
                     filename = save_video_to_disk(video_file, project_id, new_session.id)
                     uploaded_videos.append(Video.query.filter_by(filename=filename).first())
+                uploaded_videos.extend(get_library_videos(current_user, request.form.getlist('library_videos', type=int)))
 
             assign_and_order_videos(new_session.participants, uploaded_videos, project.settings.coupling, project.settings.ordering)
 
@@ -110,6 +140,7 @@ def view_session(project_id, session_id):
     Returns:
     - Rendered Template: Displays the session details.
     """
+    validate_project_owner(project_id)
     session = Session.query.get_or_404(session_id)
     project = Project.query.get_or_404(project_id)
     
@@ -119,11 +150,13 @@ def view_session(project_id, session_id):
 
     participants = Participant.query.filter_by(session_id=session.id).all()
 
-    participant_videos = {}
-    for participant in participants:
-        participant_videos[participant.id] = db.session.query(Video).join(
-            participant_video_association, Video.id == participant_video_association.c.video_id
-        ).filter(participant_video_association.c.participant_id == participant.id).all()
+    participant_videos = {participant.id: [] for participant in participants}
+    assigned_videos = db.session.query(participant_video_association.c.participant_id, Video).join(
+        Video, Video.id == participant_video_association.c.video_id
+    ).filter(participant_video_association.c.participant_id.in_(participant_videos.keys()))
+    for participant_id, video in assigned_videos:
+        participant_videos[participant_id].append(video)
+    progress = get_session_progress(session.id)
 
     form = SessionCreateForm(capacity=len(participants))
     
@@ -135,7 +168,58 @@ def view_session(project_id, session_id):
         if participant_videos[participant.id]:
             form.videos[i].data = participant_videos[participant.id][0].filename
 
-    return render_template('admin/sessions/view_session.html', title='Session', header=project.name, session=session, form=form, participants=participants, participant_videos=participant_videos, project_id=project_id)
+    analysis_form = AnalysisForm()
+    analyses = session.analyses.order_by(Analysis.created_at.desc()).limit(5).all()
+    return render_template('admin/sessions/view_session.html', title='Session', header=project.name, session=session, form=form, participants=participants, participant_videos=participant_videos, progress=progress, analysis_form=analysis_form, analyses=analyses, project_id=project_id)
+
+@sessions.route('/sessions/<int:project_id>/<int:session_id>/analyses', methods=['POST'])
+@login_required
+def analyze_session(project_id, session_id):
+    """
+    Queue an analysis of the annotation traces of a session.
+
+    Parameters:
+    - project_id (int): ID of the project.
+    - session_id (int): ID of the session to analyse.
+
+    Returns:
+    - Response: Redirects to the session page, where the analysis can be downloaded once ready.
+    """
+    validate_project_owner(project_id)
+    session = Session.query.get_or_404(session_id)
+    if session.project_id != project_id:
+        abort(404)
+
+    form = AnalysisForm()
+    if form.validate_on_submit():
+        analysis = create_analysis(session.project, session, config={key: getattr(form, key).data for key in ANALYSIS_DEFAULTS})
+        current_app.logger.info(f"Queued analysis {analysis.token} of session ID: {session_id}")
+        flash('Analysis started. It will be available for download on this page once ready.')
+    else:
+        flash('Invalid analysis settings.')
+    return redirect(url_for('sessions.view_session', project_id=project_id, session_id=session_id))
+
+@sessions.route('/sessions/<int:project_id>/<int:session_id>/events', methods=['GET'])
+@login_required
+def session_events(project_id, session_id):
+    """
+    Stream live participant progress for a session as Server-Sent Events.
+
+    Parameters:
+    - project_id (int): ID of the project.
+    - session_id (int): ID of the session to monitor.
+
+    Returns:
+    - Response: An event stream of participant status changes and annotation counts.
+    """
+    validate_project_owner(project_id)
+    Session.query.filter_by(id=session_id, project_id=project_id).first_or_404()
+    current_app.logger.info(f"Monitoring session ID: {session_id} for user ID: {current_user.id}")
+    poll_seconds = current_app.config.get('MONITOR_POLL_SECONDS', 15)
+    response = Response(stream_with_context(stream_session_progress(session_id, poll_seconds)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @sessions.route('/sessions/<int:project_id>/<int:session_id>/archived', methods=['POST'])
 @login_required
@@ -192,9 +276,8 @@ def download_participant_data(session_id, token):
     current_app.logger.info(f"Downloading annotations for participant with token: {token} in session ID: {session_id}")
     participant_instance = Participant.query.filter_by(token=token).first_or_404()
     session = Session.query.get_or_404(session_id)
-    project_instance = session.project
 
-    if project_instance.researcher != current_user:
+    if not current_user.owns_project(session.project_id):
         flash('You do not have access to this session.', 'error')
         return redirect(url_for('dashboard.dash'))
 
@@ -202,9 +285,10 @@ def download_participant_data(session_id, token):
         flash('Mismatch between session and participant.', 'error')
         return redirect(url_for('dashboard.dash'))
 
-    annotation_data = participant_annotations_to_json(participant_instance)
+    packed_annotations = load_packed_annotations(session, participant_instance.id) if session.archive_path else None
+    annotation_data = participant_annotations_to_json(participant_instance, packed_annotations)
     
-    response = make_response(json.dumps(annotation_data, sort_keys=False))
+    response = make_response(dumps(annotation_data))
     response.headers.set('Content-Disposition', 'attachment', filename=f'participant-{participant_instance.id}_annotations.json')
     response.mimetype = 'application/json'
     return response
@@ -223,10 +307,14 @@ def download_aggregate_data(session_id):
     """
     current_app.logger.info(f"Downloading aggregate data for session ID: {session_id}")
     session = Session.query.get_or_404(session_id)
+    if not current_user.owns_project(session.project_id):
+        flash('You do not have access to this session.', 'error')
+        return redirect(url_for('dashboard.dash'))
     
+    packed_annotations = load_packed_annotations(session) if session.archive_path else None
     participants_data = []
     for participant in session.participants:
-        participants_data.append(participant_annotations_to_json(participant))
+        participants_data.append(participant_annotations_to_json(participant, packed_annotations))
     
     session_data = {
         'Session ID': session.id,
@@ -235,7 +323,7 @@ def download_aggregate_data(session_id):
         'Participants Data': participants_data
     }
     
-    response = make_response(json.dumps(session_data, sort_keys=False))
+    response = make_response(dumps(session_data))
     response.headers.set('Content-Disposition', 'attachment', filename=f'session-{session_id}_aggregate.json')
     response.mimetype = 'application/json'
     return response
\ No newline at end of file